@@ -5,6 +5,21 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'data', 'deals.db')}"
 
+# Applied to every new SQLite connection. WAL lets readers keep working while a
+# scrape or import holds the write lock.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-64000"))  # negative = KiB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+# Connection pool per uvicorn worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-abc123xyz")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
@@ -49,46 +64,65 @@ POPULAR_BRANDS = [
     'fitness time', 'gold gym', 'gym', 'fitness'
 ]
 
+PREMIUM_KEYWORDS = [
+    'roka', 'mr chow', 'ruya', 'black tap', 'anantara', 'raffles',
+    'turkish', 'hotel', 'resort', 'clinic', 'hospital'
+]
+
+LIFESTYLE_KEYWORDS = ['spa', 'salon', 'fitness', 'wellness', 'beauty']
+
+# Merchant-name keywords for guessing a category, checked in this order
+CATEGORY_KEYWORDS = [
+    ("dining", ['restaurant', 'cafe', 'coffee', 'food', 'kitchen', 'grill', 'burger', 'pizza', 'sushi', 'baretto',
+                'chow', 'ruya', 'crust', 'soul', 'assam', 'roastery', 'labate', 'key caf']),
+    ("lifestyle", ['spa', 'beauty', 'salon', 'clinic', 'medical', 'dental', 'savin']),
+    ("travel", ['hotel', 'resort', 'travel', 'flight', 'airline', 'anantara', 'vacation']),
+    ("shopping", ['shop', 'store', 'fashion', 'mall', 'glam', 'moda', 'boutique']),
+    ("lifestyle", ['gym', 'fitness', 'sport', 'round', 'health', 'garden', 'preschool']),
+]
+
+# Deal scoring rules, applied by app/services/scoring.py. Every rating stores
+# the version it was scored with: bump "version" whenever these rules or the
+# keyword lists above change, and rescore_deals.py rescores only stale ratings.
+SCORING_RULES = {
+    "version": 2,
+    "base_score": 5,
+    # (minimum discount %, points, reason), best first. A tier without a
+    # reason adds points silently.
+    "discount_tiers": [
+        (30, 4, "High discount"),
+        (20, 3, "Good discount"),
+        (10, 2, "Decent discount"),
+        (5, 1, None),
+    ],
+    "no_discount_points": -2,
+    # Merchant name keyword groups (see keyword_matcher.deal_keywords)
+    "keyword_points": [
+        ("brand", 3, "Popular brand"),
+        ("premium", 2, "Premium/quality merchant"),
+        ("lifestyle", 1, "Lifestyle deal"),
+    ],
+    "category_points": {
+        "travel": (1, "Rare category"),
+        "health": (1, "Rare category"),
+        "automotive": (1, "Rare category"),
+        "education": (1, "Rare category"),
+    },
+    "min_score": 1,
+    "max_score": 10,
+    # (minimum score, quality), best first
+    "quality_thresholds": [(7, "good"), (5, "mediocre")],
+    "default_quality": "bad",
+    "default_reason": "Standard deal",
+}
+
 def score_deal(merchant, discount, category):
-    import re
-    score = 5
-    reasons = []
-    
-    pct = 0
-    if discount:
-        match = re.search(r'(\d+)', str(discount))
-        if match:
-            pct = int(match.group(1))
-            if pct >= 30:
-                score += 4
-                reasons.append(f"High discount ({pct}%)")
-            elif pct >= 20:
-                score += 3
-                reasons.append(f"Good discount ({pct}%)")
-            elif pct >= 10:
-                score += 2
-                reasons.append(f"Decent discount ({pct}%)")
-            elif pct >= 5:
-                score += 1
-    
-    merchant_lower = merchant.lower() if merchant else ""
-    for brand in POPULAR_BRANDS:
-        if brand in merchant_lower:
-            score += 3
-            reasons.append(f"Popular brand")
-            break
-    
-    if pct == 0:
-        score -= 2
-    
-    score = min(10, max(1, score))
-    quality = 'good' if score >= 7 else ('mediocre' if score >= 5 else 'bad')
-    
-    return score, quality, "; ".join(reasons) if reasons else "Standard deal"
+    from app.services.scoring import score_deal as score
+    return score(merchant, discount, category)
 
 DEAL_STATUSES = ["new", "processing", "processed", "duplicate", "error"]
 
-BATCH_STATUSES = ["created", "processing", "completed"]
+BATCH_STATUSES = ["created", "processing", "completed", "failed"]
 
 SOURCES = {
     "alrajhi": {
@@ -111,6 +145,117 @@ SOURCES = {
     }
 }
 
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "3"))
+SCRAPE_SOURCE_TIMEOUT_SECONDS = int(os.getenv("SCRAPE_SOURCE_TIMEOUT_SECONDS", "300"))
+SCRAPE_JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", "2"))
+
+SCRAPE_JOB_STATUSES = ["queued", "running", "completed", "failed"]
+
+# Warm Playwright browsers shared by all scrapers (app/scrapers/browser_pool.py).
+# BROWSER_POOL_SIZE is also the number of browser scrapes that run at once.
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))  # relaunch a browser after this many pages
+BROWSER_MAX_MEMORY_MB = int(os.getenv("BROWSER_MAX_MEMORY_MB", "1024"))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() == "true"
+
+# Requests aborted in Playwright crawls (app/scrapers/interception.py). A source
+# in ROUTE_POLICIES can replace "block_types", add "block_domains", or "allow"
+# types it needs ("tracker" allows the tracker domains).
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+TRACKER_DOMAINS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "googlesyndication.com", "facebook.net", "connect.facebook.com", "hotjar.com", "clarity.ms",
+    "bat.bing.com", "ads.linkedin.com", "snap.licdn.com", "analytics.twitter.com", "sc-static.net",
+    "analytics.tiktok.com", "adsrvr.org", "criteo.com", "nr-data.net", "demdex.net", "omtrdc.net"
+]
+ROUTE_POLICIES = {}
+# Average size of a blocked request by type, for the bytes-saved estimate
+BLOCKED_BYTES_ESTIMATE = {"image": 60000, "media": 500000, "font": 40000, "tracker": 30000}
+
+# Shared HTTP client for scrapers (app/scrapers/http_client.py). HTTP/2 is
+# used when enabled and the h2 package is installed.
+HTTP_HEADERS = {
+    "User-Agent": os.getenv("HTTP_USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+HTTP_SOURCE_HEADERS = {}  # extra headers per source name
+HTTP_TIMEOUT_SECONDS = int(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "6"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+SCRAPE_DETAIL_PAGES = int(os.getenv("SCRAPE_DETAIL_PAGES", "100"))  # max offer pages fetched per scrape to fill missing fields
+
+# Direct JSON API mode (app/scrapers/api_capture.py) for sources whose offer
+# listing is loaded over XHR. "next" selects the control that loads a second
+# page, so the pagination parameter can be learned from two requests.
+API_CAPTURE_SOURCES = {
+    "Riyad Bank": {},
+    "SAB Bank": {"next": 'text="Next"'},
+}
+API_CAPTURE_MAX_PAGES = int(os.getenv("API_CAPTURE_MAX_PAGES", "50"))
+API_CAPTURE_RETRY_HOURS = float(os.getenv("API_CAPTURE_RETRY_HOURS", "24"))  # wait before capturing a source with no API again
+
+# Readiness conditions for Playwright crawls (app/scrapers/waits.py), by source
+# and stage. "selector": present once offers have rendered; "response": URL
+# substring of the request that delivers them; "load_state": used when there is
+# no selector (default networkidle). A stage inherits the source's "load"
+# condition and overrides it. Timeouts in milliseconds.
+WAIT_TIMEOUT_MS = int(os.getenv("WAIT_TIMEOUT_MS", "15000"))
+WAIT_STRATEGIES = {
+    "Alrajhi Bank": {
+        "load": {"selector": 'a[href*="/Offers/CardsOffers/"]'},
+    },
+    "Riyad Bank": {
+        "load": {"selector": '.offer-card, .card-offer, [class*="offer"]'},
+        "offer": {"selector": None, "load_state": "networkidle", "timeout": 10000},
+        "tab": {"timeout": 3000},
+    },
+    "SAB Bank": {
+        "load": {"selector": "text=/- KSA/"},
+    },
+}
+
+STATS_CACHE_TTL_SECONDS = int(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))
+
+# Near-duplicate detection: MinHash over title/merchant/discount words, with
+# LSH_BANDS * LSH_ROWS_PER_BAND permutations. Deals at or above the Jaccard
+# threshold are flagged. Titles are short, so two branches of one chain
+# ("Roka 1" / "Roka 2") already score ~0.7. With the default bands a
+# 0.8-similar pair becomes an LSH candidate >99.9% of the time, a 0.3 one ~12%.
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "16"))
+LSH_ROWS_PER_BAND = int(os.getenv("LSH_ROWS_PER_BAND", "4"))
+
+EXPORT_FORMATS = ["ndjson", "csv"]
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_MAX_ITEM_BYTES = int(os.getenv("IMPORT_MAX_ITEM_BYTES", str(1024 * 1024)))
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "5000"))
+
+# Automated structuring: "stub" is an offline deterministic provider, "openai"
+# is any OpenAI-compatible chat completions endpoint.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "stub")
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Token budget per LLM call: the estimated prompt plus
+# LLM_OUTPUT_TOKENS_PER_DEAL reserved for each deal's answer
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "8000"))
+LLM_OUTPUT_TOKENS_PER_DEAL = int(os.getenv("LLM_OUTPUT_TOKENS_PER_DEAL", "150"))
+LLM_MAX_FIELD_CHARS = int(os.getenv("LLM_MAX_FIELD_CHARS", "1500"))  # longer descriptions/terms are cut
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_REQUEST_TIMEOUT_SECONDS = int(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+
 LLM_PROMPT_TEMPLATE = """You are a data extraction specialist. Convert the following unstructured deal data into a structured JSON format.
 
 INPUT FORMAT:
@@ -146,6 +291,7 @@ RULES:
 3. Choose the most appropriate category
 4. Keep null for fields not found in the text
 5. Return ONLY valid JSON, no markdown
+6. raw_terms of "Same as temp_id N" means the terms are identical to deal N's
 
 DEALS TO PROCESS:
 {{deals_json}}
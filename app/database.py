@@ -1,13 +1,46 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, Enum
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, Enum, Index, Float, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool, StaticPool
 from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.config import DATABASE_URL
+from app.migrations import run_migrations
+from app.config import (
+    DATABASE_URL, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_TEMP_STORE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+)
+
+def get_pool_options(url: str) -> dict:
+    # An in-memory database only exists on its one connection
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return {"poolclass": StaticPool}
+    return {
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    **get_pool_options(DATABASE_URL)
+)
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA temp_store={SQLITE_TEMP_STORE}")
+    cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -20,6 +53,7 @@ def get_db():
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 class User(Base):
     __tablename__ = "users"
@@ -46,6 +80,11 @@ class Source(Base):
 
 class RawDeal(Base):
     __tablename__ = "raw_deals"
+    __table_args__ = (
+        Index("ix_raw_deals_status_scraped_at", "status", "scraped_at"),
+        Index("ix_raw_deals_source_id_scraped_at", "source_id", "scraped_at"),
+        Index("ix_raw_deals_source_id_status", "source_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     source_id = Column(Integer, ForeignKey("sources.id"))
@@ -58,19 +97,38 @@ class RawDeal(Base):
     raw_terms = Column(Text)
     scraped_url = Column(String)
     scraped_html = Column(Text)
-    scraped_at = Column(DateTime, default=datetime.utcnow)
-    content_hash = Column(String, index=True)
+    scraped_at = Column(DateTime, default=datetime.utcnow, index=True)
+    content_hash = Column(String, unique=True, index=True)
     status = Column(String, default="new")
+    near_duplicate_of = Column(Integer, ForeignKey("raw_deals.id"), index=True)
+    near_duplicate_score = Column(Float)
     
     source = relationship("Source", back_populates="raw_deals")
     structured_deal = relationship("StructuredDeal", back_populates="raw_deal", uselist=False)
     batch_deals = relationship("BatchDeal", back_populates="raw_deal")
 
+class RawDealSignature(Base):
+    __tablename__ = "raw_deal_signatures"
+    
+    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+
+class LSHBucket(Base):
+    __tablename__ = "lsh_buckets"
+    
+    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(Integer, nullable=False, index=True)  # hash of the band number and its rows
+
 class StructuredDeal(Base):
     __tablename__ = "structured_deals"
+    __table_args__ = (
+        Index("ix_structured_deals_category_created_at", "category", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"))
+    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"), index=True)
+    offer_group_id = Column(Integer, ForeignKey("offer_groups.id"), index=True)
     merchant_name = Column(String, nullable=False)
     offer_title = Column(String, nullable=False)
     description = Column(Text)
@@ -85,22 +143,47 @@ class StructuredDeal(Base):
     promo_code = Column(String)
     image_url = Column(String)
     source_url = Column(String)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    is_active = Column(Boolean, default=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     raw_deal = relationship("RawDeal", back_populates="structured_deal")
     rating = relationship("Rating", back_populates="deal", uselist=False)
+    offer_group = relationship("OfferGroup", back_populates="deals")
+
+class OfferGroup(Base):
+    __tablename__ = "offer_groups"
+    __table_args__ = (
+        Index("ix_offer_groups_merchant_key_discount_kind", "merchant_key", "discount_kind"),
+        Index("ix_offer_groups_banks_count_deals_count", "banks_count", "deals_count"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    merchant_key = Column(String, nullable=False)  # normalized merchant name
+    discount_kind = Column(String, nullable=False)
+    merchant_name = Column(String, nullable=False)
+    category = Column(String)
+    valid_from = Column(Date)  # earliest start of any member, null if open-ended
+    valid_until = Column(Date)
+    deals_count = Column(Integer, default=0)
+    banks_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    deals = relationship("StructuredDeal", back_populates="offer_group")
 
 class Rating(Base):
     __tablename__ = "ratings"
     
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(Integer, ForeignKey("structured_deals.id"))
-    quality_score = Column(String, nullable=False)
+    deal_id = Column(Integer, ForeignKey("structured_deals.id"), index=True)
+    quality_score = Column(String, nullable=False, index=True)
     reason = Column(Text)
     llm_score = Column(Integer)
     llm_reasoning = Column(Text)
+    rule_version = Column(Integer)  # SCORING_RULES version of an automatic score
+    inputs_hash = Column(String)  # hash of the deal fields it was scored from
+    source = Column(String, default="auto")  # "auto" (scoring rules) or "manual" (a reviewer)
     rated_at = Column(DateTime, default=datetime.utcnow)
     
     deal = relationship("StructuredDeal", back_populates="rating")
@@ -112,7 +195,7 @@ class ProcessingBatch(Base):
     name = Column(String, nullable=False)
     status = Column(String, default="created")
     deals_count = Column(Integer)
-    exported_at = Column(DateTime, default=datetime.utcnow)
+    exported_at = Column(DateTime, default=datetime.utcnow, index=True)
     imported_at = Column(DateTime)
     notes = Column(Text)
     
@@ -120,10 +203,44 @@ class ProcessingBatch(Base):
 
 class BatchDeal(Base):
     __tablename__ = "batch_deals"
+    __table_args__ = (
+        Index("ix_batch_deals_batch_id_temp_id", "batch_id", "temp_id"),
+    )
     
     batch_id = Column(Integer, ForeignKey("processing_batches.id"), primary_key=True)
-    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"), primary_key=True)
+    raw_deal_id = Column(Integer, ForeignKey("raw_deals.id"), primary_key=True, index=True)
+    temp_id = Column(Integer)  # position in the exported batch, echoed back by the LLM
     structured_deal_id = Column(Integer, ForeignKey("structured_deals.id"))
     
     batch = relationship("ProcessingBatch", back_populates="batch_deals")
     raw_deal = relationship("RawDeal", back_populates="batch_deals")
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(Integer, ForeignKey("sources.id"))
+    status = Column(String, default="queued", index=True)
+    sources_total = Column(Integer, default=0)
+    sources_done = Column(Integer, default=0)
+    total_found = Column(Integer, default=0)
+    new_deals = Column(Integer, default=0)
+    duplicates = Column(Integer, default=0)
+    error = Column(Text)
+    result_json = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    source = relationship("Source")
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True, nullable=False)
+    prompt_version = Column(String, nullable=False, index=True)
+    result_json = Column(Text, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = Column(DateTime)
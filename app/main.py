@@ -11,6 +11,10 @@ import os
 from app.config import SOURCES, SECRET_KEY
 from app.database import create_tables, get_db, SessionLocal, Source
 from app.auth import create_default_user, get_current_user
+from app.services.scrape_jobs import recover_jobs, shutdown_workers
+from app.services import llm_worker
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers.http_client import http_client
 from app.models import User
 
 from app.routers import dashboard, scrapers, raw_deals, llm_processing, structured_deals, ratings, auth
@@ -52,9 +56,18 @@ async def startup_event():
                 db.add(source)
         db.commit()
         print("Database initialized and sources seeded")
+        recover_jobs(db)
+        llm_worker.recover_batches(db)
     finally:
         db.close()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_workers()
+    llm_worker.shutdown_workers()
+    browser_pool.shutdown()
+    http_client.shutdown()
+
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
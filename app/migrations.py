@@ -0,0 +1,149 @@
+"""
+Schema migrations for existing data/deals.db files.
+
+Base.metadata.create_all only creates missing tables, so anything added to an
+existing table (indexes, columns, triggers) is applied here. The applied
+version is kept in SQLite's PRAGMA user_version. Every migration must be
+idempotent: new databases run them all right after create_all, and SQLite
+DDL is not always wrapped in the migration's transaction.
+"""
+
+def unique_content_hash(conn):
+    for index in conn.exec_driver_sql("PRAGMA index_list('raw_deals')").fetchall():
+        if index[1] == "ix_raw_deals_content_hash" and index[2]:
+            return
+    duplicate = conn.exec_driver_sql(
+        "SELECT content_hash FROM raw_deals WHERE content_hash IS NOT NULL "
+        "GROUP BY content_hash HAVING COUNT(*) > 1 LIMIT 1"
+    ).first()
+    if duplicate:
+        print("Warning: raw_deals has duplicate content hashes, keeping non-unique index")
+        return
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_raw_deals_content_hash")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX ix_raw_deals_content_hash ON raw_deals (content_hash)")
+
+def structured_deals_search_index(conn):
+    # External-content FTS5 index over structured_deals, kept in sync by triggers
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'structured_deals_fts'"
+    ).first()
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS structured_deals_fts USING fts5(
+            merchant_name, offer_title, description, terms_conditions,
+            content='structured_deals', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS structured_deals_fts_ai AFTER INSERT ON structured_deals BEGIN
+            INSERT INTO structured_deals_fts(rowid, merchant_name, offer_title, description, terms_conditions)
+            VALUES (new.id, new.merchant_name, new.offer_title, new.description, new.terms_conditions);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS structured_deals_fts_ad AFTER DELETE ON structured_deals BEGIN
+            INSERT INTO structured_deals_fts(structured_deals_fts, rowid, merchant_name, offer_title, description, terms_conditions)
+            VALUES ('delete', old.id, old.merchant_name, old.offer_title, old.description, old.terms_conditions);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS structured_deals_fts_au
+        AFTER UPDATE OF merchant_name, offer_title, description, terms_conditions ON structured_deals BEGIN
+            INSERT INTO structured_deals_fts(structured_deals_fts, rowid, merchant_name, offer_title, description, terms_conditions)
+            VALUES ('delete', old.id, old.merchant_name, old.offer_title, old.description, old.terms_conditions);
+            INSERT INTO structured_deals_fts(rowid, merchant_name, offer_title, description, terms_conditions)
+            VALUES (new.id, new.merchant_name, new.offer_title, new.description, new.terms_conditions);
+        END
+    """)
+    if not exists:
+        conn.exec_driver_sql("INSERT INTO structured_deals_fts(structured_deals_fts) VALUES ('rebuild')")
+
+def query_indexes(conn):
+    # Must match the Index/index=True declarations in app/database.py
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_raw_deals_scraped_at ON raw_deals (scraped_at)",
+        "CREATE INDEX IF NOT EXISTS ix_raw_deals_status_scraped_at ON raw_deals (status, scraped_at)",
+        "CREATE INDEX IF NOT EXISTS ix_raw_deals_source_id_scraped_at ON raw_deals (source_id, scraped_at)",
+        "CREATE INDEX IF NOT EXISTS ix_structured_deals_raw_deal_id ON structured_deals (raw_deal_id)",
+        "CREATE INDEX IF NOT EXISTS ix_structured_deals_created_at ON structured_deals (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_structured_deals_category_created_at ON structured_deals (category, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_structured_deals_is_active ON structured_deals (is_active)",
+        "CREATE INDEX IF NOT EXISTS ix_ratings_deal_id ON ratings (deal_id)",
+        "CREATE INDEX IF NOT EXISTS ix_ratings_quality_score ON ratings (quality_score)",
+        "CREATE INDEX IF NOT EXISTS ix_batch_deals_raw_deal_id ON batch_deals (raw_deal_id)",
+        "CREATE INDEX IF NOT EXISTS ix_processing_batches_exported_at ON processing_batches (exported_at)",
+        "CREATE INDEX IF NOT EXISTS ix_scrape_jobs_status ON scrape_jobs (status)",
+        "CREATE INDEX IF NOT EXISTS ix_scrape_jobs_created_at ON scrape_jobs (created_at)",
+    ]
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql("ANALYZE")
+
+def raw_deals_source_status_index(conn):
+    # Covers the per-source, per-status counts of the dashboard snapshot
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_raw_deals_source_id_status ON raw_deals (source_id, status)")
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.exec_driver_sql(f"PRAGMA table_info('{table}')").fetchall())
+
+def batch_deal_temp_ids(conn):
+    if not column_exists(conn, "batch_deals", "temp_id"):
+        conn.exec_driver_sql("ALTER TABLE batch_deals ADD COLUMN temp_id INTEGER")
+    # Batches exported before temp_id was stored numbered their deals by raw_deal_id
+    conn.exec_driver_sql("""
+        UPDATE batch_deals SET temp_id = (
+            SELECT COUNT(*) FROM batch_deals b
+            WHERE b.batch_id = batch_deals.batch_id AND b.raw_deal_id <= batch_deals.raw_deal_id
+        )
+        WHERE temp_id IS NULL
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_batch_deals_batch_id_temp_id ON batch_deals (batch_id, temp_id)")
+
+def raw_deal_near_duplicates(conn):
+    if not column_exists(conn, "raw_deals", "near_duplicate_of"):
+        conn.exec_driver_sql("ALTER TABLE raw_deals ADD COLUMN near_duplicate_of INTEGER REFERENCES raw_deals (id)")
+    if not column_exists(conn, "raw_deals", "near_duplicate_score"):
+        conn.exec_driver_sql("ALTER TABLE raw_deals ADD COLUMN near_duplicate_score FLOAT")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_raw_deals_near_duplicate_of ON raw_deals (near_duplicate_of)")
+
+def structured_deal_offer_groups(conn):
+    if not column_exists(conn, "structured_deals", "offer_group_id"):
+        conn.exec_driver_sql("ALTER TABLE structured_deals ADD COLUMN offer_group_id INTEGER REFERENCES offer_groups (id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_structured_deals_offer_group_id ON structured_deals (offer_group_id)")
+
+def rating_rule_versions(conn):
+    if not column_exists(conn, "ratings", "rule_version"):
+        conn.exec_driver_sql("ALTER TABLE ratings ADD COLUMN rule_version INTEGER")
+    if not column_exists(conn, "ratings", "inputs_hash"):
+        conn.exec_driver_sql("ALTER TABLE ratings ADD COLUMN inputs_hash VARCHAR")
+
+def rating_sources(conn):
+    if not column_exists(conn, "ratings", "source"):
+        conn.exec_driver_sql("ALTER TABLE ratings ADD COLUMN source VARCHAR DEFAULT 'auto'")
+    # Automatic scores always set llm_score; the rating page never sends one
+    conn.exec_driver_sql("UPDATE ratings SET source = 'manual' WHERE rule_version IS NULL AND llm_score IS NULL")
+    conn.exec_driver_sql("UPDATE ratings SET source = 'auto' WHERE source IS NULL")
+
+MIGRATIONS = [
+    (1, "unique content hash", unique_content_hash),
+    (2, "structured deals search index", structured_deals_search_index),
+    (3, "query indexes", query_indexes),
+    (4, "raw deals source/status index", raw_deals_source_status_index),
+    (5, "batch deal temp ids", batch_deal_temp_ids),
+    (6, "raw deal near duplicates", raw_deal_near_duplicates),
+    (7, "structured deal offer groups", structured_deal_offer_groups),
+    (8, "rating rule versions", rating_rule_versions),
+    (9, "rating sources", rating_sources),
+]
+
+def run_migrations(engine):
+    with engine.connect() as conn:
+        current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        print(f"Applied migration {version}: {name}")
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db, RawDeal, StructuredDeal, ProcessingBatch, BatchDeal
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session, joinedload
+from app.database import get_db, RawDeal, ProcessingBatch, BatchDeal
 from app.models import ImportBatch
+from app.services.stats import stats_cache
+from app.services.batch_import import (
+    import_batch_deals, batch_deal_export, raw_deal_export, create_processing_batch, resolve_cached_deals
+)
+from app.services import llm_cache
+from app.services.batch_planner import compact_deals, pack_deals, estimate_prompt_tokens
+from app.services.import_stream import import_stream
+from app.services.llm_worker import get_provider, enqueue_llm_batch
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import json
 import os
 
@@ -22,32 +30,83 @@ async def create_batch(
     if not deals:
         raise HTTPException(status_code=400, detail="No deals found")
     
-    batch_name = name or f"Batch {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+    deals, cached_count = resolve_cached_deals(db, deals)
+    batch = create_processing_batch(db, deals, name) if deals else None
+    db.commit()
+    stats_cache.invalidate()
     
-    batch = ProcessingBatch(
-        name=batch_name,
-        status='created',
-        deals_count=len(deals)
-    )
-    db.add(batch)
-    db.flush()
+    return {
+        "batch_id": batch.id if batch else None,
+        "name": batch.name if batch else None,
+        "deals_count": batch.deals_count if batch else 0,
+        "cached_deals": cached_count
+    }
+
+@router.post("/batches/plan")
+async def plan_batches(
+    token_budget: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    create: bool = False,
+    name: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    deals = db.query(RawDeal).options(joinedload(RawDeal.source)).filter(
+        RawDeal.status == 'new'
+    ).order_by(RawDeal.id).all()
+    new_count = len(deals)
     
-    for deal in deals:
-        batch_deal = BatchDeal(
-            batch_id=batch.id,
-            raw_deal_id=deal.id
-        )
-        db.add(batch_deal)
-        deal.status = 'processing'
+    if create:
+        deals, cached_count = resolve_cached_deals(db, deals)
+    else:
+        cached_keys = llm_cache.peek(db, (llm_cache.cache_key(d) for d in deals))
+        deals = [d for d in deals if llm_cache.cache_key(d) not in cached_keys]
+        cached_count = new_count - len(deals)
     
-    db.commit()
+    groups = pack_deals([raw_deal_export(d, d.id) for d in deals], token_budget)
+    if max_batches:
+        groups = groups[:max_batches]
+    
+    base_name = name or f"Batch {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+    planned = []
+    for number, group in enumerate(groups, 1):
+        group_deals = [deals[i] for i in group]
+        entry = {
+            "deals_count": len(group_deals),
+            "estimated_tokens": estimate_prompt_tokens(
+                [raw_deal_export(d, temp_id) for temp_id, d in enumerate(group_deals, 1)]
+            ),
+            "raw_deal_ids": [d.id for d in group_deals]
+        }
+        if create:
+            batch = create_processing_batch(db, group_deals, f"{base_name} ({number}/{len(groups)})")
+            db.flush()
+            entry["batch_id"] = batch.id
+        planned.append(entry)
+    
+    if create:
+        db.commit()
+        stats_cache.invalidate()
     
     return {
-        "batch_id": batch.id,
-        "name": batch.name,
-        "deals_count": batch.deals_count
+        "new_deals": new_count,
+        "cached_deals": cached_count,
+        "planned_deals": sum(entry["deals_count"] for entry in planned),
+        "batches": planned
     }
 
+@router.get("/cache/stats")
+async def get_cache_stats(db: Session = Depends(get_db)):
+    return llm_cache.cache_stats(db)
+
+@router.delete("/cache")
+async def evict_cache(
+    older_than_days: Optional[int] = None,
+    stale_versions: bool = False,
+    db: Session = Depends(get_db)
+):
+    deleted = llm_cache.evict(db, older_than_days, stale_versions)
+    return {"success": True, "deleted": deleted}
+
 @router.get("/batches")
 async def list_batches(db: Session = Depends(get_db)):
     batches = db.query(ProcessingBatch).order_by(ProcessingBatch.exported_at.desc()).all()
@@ -58,7 +117,8 @@ async def list_batches(db: Session = Depends(get_db)):
             "status": b.status,
             "deals_count": b.deals_count,
             "exported_at": b.exported_at.isoformat(),
-            "imported_at": b.imported_at.isoformat() if b.imported_at else None
+            "imported_at": b.imported_at.isoformat() if b.imported_at else None,
+            "notes": b.notes
         }
         for b in batches
     ]
@@ -69,30 +129,52 @@ async def get_batch(batch_id: int, db: Session = Depends(get_db)):
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    batch_deals = db.query(BatchDeal).filter(BatchDeal.batch_id == batch_id).all()
-    raw_deal_ids = [bd.raw_deal_id for bd in batch_deals]
-    raw_deals = db.query(RawDeal).filter(RawDeal.id.in_(raw_deal_ids)).all()
+    batch_deals = db.query(BatchDeal).options(
+        joinedload(BatchDeal.raw_deal).joinedload(RawDeal.source)
+    ).filter(BatchDeal.batch_id == batch_id).order_by(BatchDeal.temp_id).all()
     
     export_data = {
         "batch_id": batch_id,
         "export_date": batch.exported_at.isoformat(),
-        "deals": [
-            {
-                "temp_id": idx,
-                "raw_title": d.raw_title,
-                "raw_description": d.raw_description,
-                "raw_merchant": d.raw_merchant,
-                "raw_discount": d.raw_discount,
-                "raw_validity": d.raw_validity,
-                "raw_terms": d.raw_terms,
-                "source": d.source.name if d.source else "Unknown"
-            }
-            for idx, d in enumerate(raw_deals, 1)
-        ]
+        "deals": compact_deals([batch_deal_export(bd) for bd in batch_deals])
     }
     
     return export_data
 
+@router.post("/batches/{batch_id}/process")
+async def process_batch(
+    batch_id: int,
+    provider: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    batch = db.query(ProcessingBatch).filter(ProcessingBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.status == 'processing':
+        raise HTTPException(status_code=409, detail="Batch is already being processed")
+    
+    try:
+        llm_provider = get_provider(provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    pending = db.query(BatchDeal).filter(
+        BatchDeal.batch_id == batch_id,
+        BatchDeal.structured_deal_id.is_(None)
+    ).count()
+    if not pending:
+        raise HTTPException(status_code=400, detail="Batch has no deals left to structure")
+    
+    enqueue_llm_batch(db, batch, llm_provider.name)
+    
+    return {
+        "success": True,
+        "batch_id": batch_id,
+        "provider": llm_provider.name,
+        "pending_deals": pending,
+        "status": batch.status
+    }
+
 @router.post("/batches/{batch_id}/import")
 async def import_batch(
     batch_id: int,
@@ -103,62 +185,31 @@ async def import_batch(
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    batch_deals = db.query(BatchDeal).filter(BatchDeal.batch_id == batch_id).all()
-    raw_deal_map = {bd.raw_deal_id: bd for bd in batch_deals}
-    
-    imported_count = 0
-    for deal_data in import_data.deals:
-        batch_deal = list(raw_deal_map.values())[deal_data.temp_id - 1] if deal_data.temp_id <= len(batch_deals) else None
-        
-        if not batch_deal:
-            continue
-        
-        valid_from = None
-        if deal_data.valid_from:
-            try:
-                valid_from = datetime.strptime(deal_data.valid_from, '%Y-%m-%d').date()
-            except:
-                pass
-        
-        valid_until = None
-        if deal_data.valid_until:
-            try:
-                valid_until = datetime.strptime(deal_data.valid_until, '%Y-%m-%d').date()
-            except:
-                pass
-        
-        structured_deal = StructuredDeal(
-            raw_deal_id=batch_deal.raw_deal_id,
-            merchant_name=deal_data.merchant_name,
-            offer_title=deal_data.offer_title,
-            description=deal_data.description,
-            discount_value=deal_data.discount_value,
-            discount_type=deal_data.discount_type,
-            category=deal_data.category,
-            valid_from=valid_from,
-            valid_until=valid_until,
-            location=deal_data.location,
-            applicable_cards=deal_data.applicable_cards,
-            terms_conditions=deal_data.terms_conditions,
-            promo_code=deal_data.promo_code,
-            is_active=True
-        )
-        db.add(structured_deal)
-        db.flush()
-        
-        batch_deal.structured_deal_id = structured_deal.id
-        
-        raw_deal = db.query(RawDeal).filter(RawDeal.id == batch_deal.raw_deal_id).first()
-        if raw_deal:
-            raw_deal.status = 'processed'
-        
-        imported_count += 1
-    
-    batch.status = 'completed'
-    batch.imported_at = datetime.utcnow()
-    db.commit()
+    result = import_batch_deals(db, batch, import_data.deals)
+    stats_cache.invalidate()
+    
+    return {
+        "success": True,
+        "imported_count": result["imported_count"],
+        "skipped_temp_ids": result["skipped_temp_ids"]
+    }
+
+@router.post("/batches/{batch_id}/import/stream")
+async def import_batch_stream(
+    batch_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    batch = db.query(ProcessingBatch).filter(ProcessingBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    result = await import_stream(db, batch, request.stream())
+    stats_cache.invalidate()
     
     return {
         "success": True,
-        "imported_count": imported_count
+        "imported_count": result["imported_count"],
+        "error_count": result["error_count"],
+        "errors": result["errors"]
     }
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from app.database import get_db, StructuredDeal, Rating
 from app.models import RatingCreate
+from app.services.stats import stats_cache
 from datetime import datetime
 
 router = APIRouter()
@@ -56,6 +57,9 @@ async def rate_deal(
         existing_rating.reason = reason
         existing_rating.llm_score = llm_score
         existing_rating.llm_reasoning = llm_reasoning
+        existing_rating.source = "manual"
+        existing_rating.rule_version = None
+        existing_rating.inputs_hash = None
         existing_rating.rated_at = datetime.utcnow()
     else:
         rating = Rating(
@@ -63,19 +67,22 @@ async def rate_deal(
             quality_score=quality_score,
             reason=reason,
             llm_score=llm_score,
-            llm_reasoning=llm_reasoning
+            llm_reasoning=llm_reasoning,
+            source="manual"
         )
         db.add(rating)
     
     db.commit()
+    stats_cache.invalidate()
     
     return {"success": True, "message": "Rating saved"}
 
 @router.get("/stats")
 async def get_rating_stats(db: Session = Depends(get_db)):
-    total_good = db.query(Rating).filter(Rating.quality_score == 'good').count()
-    total_mediocre = db.query(Rating).filter(Rating.quality_score == 'mediocre').count()
-    total_bad = db.query(Rating).filter(Rating.quality_score == 'bad').count()
+    ratings = stats_cache.get(db)["ratings"]
+    total_good = ratings["good"]
+    total_mediocre = ratings["mediocre"]
+    total_bad = ratings["bad"]
     total_rated = total_good + total_mediocre + total_bad
     
     return {
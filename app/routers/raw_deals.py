@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, or_
 from typing import Optional, List
 from app.database import get_db, RawDeal, Source
 from app.models import ExportRequest
+from app.services.stats import stats_cache, estimate_raw_count
+from app.services.pagination import COUNT_MODES, apply_keyset, split_page
+from app.services.near_dupes import find_similar, rebuild_index
+from app.config import NEAR_DUP_THRESHOLD
 import json
 from datetime import datetime
 import uuid
@@ -16,8 +21,13 @@ async def list_raw_deals(
     status: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    count: str = "exact",
     db: Session = Depends(get_db)
 ):
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(COUNT_MODES)}")
+    
     query = db.query(RawDeal)
     
     if source_id:
@@ -25,11 +35,25 @@ async def list_raw_deals(
     if status:
         query = query.filter(RawDeal.status == status)
     
-    total = query.count()
-    deals = query.order_by(RawDeal.scraped_at.desc()).offset(offset).limit(limit).all()
+    total = None
+    if count == "exact":
+        total = query.count()
+    elif count == "estimated":
+        total = estimate_raw_count(stats_cache.get(db), source_id, status)
+    
+    try:
+        query = apply_keyset(query, RawDeal.scraped_at, RawDeal.id, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not cursor:
+        query = query.offset(offset)
+    
+    rows = query.options(joinedload(RawDeal.source)).limit(limit + 1).all()
+    deals, next_cursor = split_page(rows, limit, lambda d: (d.scraped_at, d.id))
     
     return {
         "total": total,
+        "next_cursor": next_cursor,
         "deals": [
             {
                 "id": d.id,
@@ -43,12 +67,81 @@ async def list_raw_deals(
                 "raw_image_url": d.raw_image_url,
                 "scraped_url": d.scraped_url,
                 "status": d.status,
+                "near_duplicate_of": d.near_duplicate_of,
                 "scraped_at": d.scraped_at.isoformat() if d.scraped_at else None
             }
             for d in deals
         ]
     }
 
+def near_duplicate_summary(deal: RawDeal, similarity: Optional[float] = None) -> dict:
+    return {
+        "id": deal.id,
+        "source_name": deal.source.name if deal.source else None,
+        "raw_title": deal.raw_title,
+        "raw_merchant": deal.raw_merchant,
+        "raw_discount": deal.raw_discount,
+        "status": deal.status,
+        "similarity": similarity if similarity is not None else deal.near_duplicate_score,
+        "scraped_at": deal.scraped_at.isoformat() if deal.scraped_at else None
+    }
+
+@router.get("/near-duplicates")
+async def list_near_duplicate_clusters(
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    size = func.count().label("size")
+    clusters = db.query(RawDeal.near_duplicate_of, size).filter(
+        RawDeal.near_duplicate_of.is_not(None)
+    ).group_by(RawDeal.near_duplicate_of).order_by(size.desc(), RawDeal.near_duplicate_of).offset(offset).limit(limit).all()
+    total = db.query(func.count(func.distinct(RawDeal.near_duplicate_of))).scalar()
+    
+    root_ids = [root_id for root_id, _ in clusters]
+    deals = db.query(RawDeal).options(joinedload(RawDeal.source)).filter(
+        or_(RawDeal.id.in_(root_ids), RawDeal.near_duplicate_of.in_(root_ids))
+    ).order_by(RawDeal.id).all() if root_ids else []
+    roots = {d.id: d for d in deals if d.id in root_ids}
+    members = {}
+    for d in deals:
+        if d.near_duplicate_of in roots:
+            members.setdefault(d.near_duplicate_of, []).append(d)
+    
+    return {
+        "total": total,
+        "clusters": [
+            {
+                "root": near_duplicate_summary(roots[root_id], 1.0),
+                "size": count + 1,
+                "members": [near_duplicate_summary(d) for d in members.get(root_id, [])]
+            }
+            for root_id, count in clusters if root_id in roots
+        ]
+    }
+
+@router.post("/near-duplicates/rebuild")
+async def rebuild_near_duplicates(db: Session = Depends(get_db)):
+    result = rebuild_index(db)
+    return {"success": True, **result}
+
+@router.get("/{deal_id}/near-duplicates")
+async def get_near_duplicates(deal_id: int, threshold: Optional[float] = None, db: Session = Depends(get_db)):
+    deal = db.query(RawDeal).filter(RawDeal.id == deal_id).first()
+    if not deal:
+        raise HTTPException(status_code=404, detail="Deal not found")
+    
+    similar = find_similar(db, deal, NEAR_DUP_THRESHOLD if threshold is None else threshold)
+    others = {d.id: d for d in db.query(RawDeal).options(joinedload(RawDeal.source)).filter(
+        RawDeal.id.in_([raw_deal_id for raw_deal_id, _ in similar])
+    ).all()} if similar else {}
+    
+    return {
+        "deal_id": deal_id,
+        "near_duplicate_of": deal.near_duplicate_of,
+        "similar": [near_duplicate_summary(others[raw_deal_id], score) for raw_deal_id, score in similar if raw_deal_id in others]
+    }
+
 @router.get("/{deal_id}")
 async def get_raw_deal(deal_id: int, db: Session = Depends(get_db)):
     deal = db.query(RawDeal).filter(RawDeal.id == deal_id).first()
@@ -70,6 +163,8 @@ async def get_raw_deal(deal_id: int, db: Session = Depends(get_db)):
         "scraped_html": deal.scraped_html,
         "status": deal.status,
         "content_hash": deal.content_hash,
+        "near_duplicate_of": deal.near_duplicate_of,
+        "near_duplicate_score": deal.near_duplicate_score,
         "scraped_at": deal.scraped_at.isoformat() if deal.scraped_at else None
     }
 
@@ -81,11 +176,12 @@ async def mark_duplicate(deal_id: int, db: Session = Depends(get_db)):
     
     deal.status = 'duplicate'
     db.commit()
+    stats_cache.invalidate()
     return {"success": True, "message": "Deal marked as duplicate"}
 
 @router.post("/export")
 async def export_deals(request: ExportRequest, db: Session = Depends(get_db)):
-    deals = db.query(RawDeal).filter(RawDeal.id.in_(request.deal_ids)).all()
+    deals = db.query(RawDeal).options(joinedload(RawDeal.source)).filter(RawDeal.id.in_(request.deal_ids)).all()
     
     export_data = {
         "batch_id": str(uuid.uuid4()),
@@ -108,5 +204,6 @@ async def export_deals(request: ExportRequest, db: Session = Depends(get_db)):
     for deal in deals:
         deal.status = 'processing'
     db.commit()
+    stats_cache.invalidate()
     
     return export_data
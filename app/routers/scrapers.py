@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db, Source
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session, joinedload
+from typing import Optional
+from app.database import get_db, Source, ScrapeJob
 from app.models import Source as SourceModel
-from app.scrapers.runner import ScraperRunner
+from app.services.scrape_jobs import enqueue_scrape_job, job_to_dict
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers.waits import wait_metrics
+from app.scrapers.interception import route_metrics
+from app.scrapers.http_client import http_client
 
 router = APIRouter()
 
@@ -21,6 +26,31 @@ async def list_sources(db: Session = Depends(get_db)):
         for s in sources
     ]
 
+@router.post("/scrape-all")
+async def run_scrape_all(
+    max_workers: Optional[int] = None,
+    timeout: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    job = enqueue_scrape_job(db, max_workers=max_workers, timeout=timeout)
+    return {"success": True, "job_id": job.id, "status": job.status}
+
+@router.get("/jobs")
+async def list_jobs(limit: int = 20, db: Session = Depends(get_db)):
+    jobs = db.query(ScrapeJob).options(joinedload(ScrapeJob.source)).order_by(ScrapeJob.created_at.desc()).limit(limit).all()
+    return [job_to_dict(job) for job in jobs]
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@router.get("/browser/stats")
+async def get_browser_stats():
+    return {"pool": browser_pool.status(), "waits": wait_metrics.snapshot(), "interception": route_metrics.snapshot(), "http": http_client.status()}
+
 @router.get("/{source_id}")
 async def get_source(source_id: int, db: Session = Depends(get_db)):
     source = db.query(Source).filter(Source.id == source_id).first()
@@ -37,6 +67,9 @@ async def get_source(source_id: int, db: Session = Depends(get_db)):
 
 @router.post("/{source_id}/scrape")
 async def run_scrape(source_id: int, db: Session = Depends(get_db)):
-    runner = ScraperRunner(db)
-    result = runner.run_scraper(source_id)
-    return result
+    source = db.query(Source).filter(Source.id == source_id).first()
+    if not source:
+        return {"success": False, "error": "Source not found"}
+    
+    job = enqueue_scrape_job(db, source_id)
+    return {"success": True, "job_id": job.id, "status": job.status}
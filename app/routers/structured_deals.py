@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
 from typing import Optional
-from app.database import get_db, StructuredDeal, Rating
+from app.database import get_db, StructuredDeal, Rating, OfferGroup
 from app.models import StructuredDeal as StructuredDealModel, StructuredDealCreate
-from datetime import datetime
+from app.services.search import build_match_query, search_subquery, snippet_html
+from app.services.stats import stats_cache, estimate_structured_count
+from app.services.pagination import COUNT_MODES, apply_keyset, split_page
+from app.services.export import build_export_query, stream_export
+from app.services.offer_groups import merchant_key, best_by_bank, regroup_deal, remove_from_group, rebuild_groups
+from app.config import EXPORT_FORMATS, QUALITY_SCORES
+from datetime import datetime, date
 import json
 
 router = APIRouter()
@@ -15,23 +21,50 @@ async def list_deals(
     search: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    count: str = "exact",
     db: Session = Depends(get_db)
 ):
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(COUNT_MODES)}")
+    
     query = db.query(StructuredDeal)
     
     if category:
         query = query.filter(StructuredDeal.category == category)
-    if search:
-        query = query.filter(
-            (StructuredDeal.merchant_name.ilike(f'%{search}%')) |
-            (StructuredDeal.offer_title.ilike(f'%{search}%'))
-        )
     
-    total = query.count()
-    deals = query.order_by(StructuredDeal.created_at.desc()).offset(offset).limit(limit).all()
+    total = None
+    next_cursor = None
+    match_query = build_match_query(search) if search else None
+    if match_query:
+        # Search results are ranked by relevance, so they page by offset only
+        matches = search_subquery(match_query)
+        query = query.join(matches, matches.c.deal_id == StructuredDeal.id)
+        if count != "none":
+            total = query.count()
+        rows = query.options(joinedload(StructuredDeal.rating)).add_columns(matches.c.snippet).order_by(
+            matches.c.rank, StructuredDeal.created_at.desc()
+        ).offset(offset).limit(limit).all()
+    else:
+        if count == "exact":
+            total = query.count()
+        elif count == "estimated":
+            total = estimate_structured_count(stats_cache.get(db), category)
+        
+        try:
+            query = apply_keyset(query, StructuredDeal.created_at, StructuredDeal.id, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not cursor:
+            query = query.offset(offset)
+        
+        query = query.options(joinedload(StructuredDeal.rating))
+        deals, next_cursor = split_page(query.limit(limit + 1).all(), limit, lambda d: (d.created_at, d.id))
+        rows = [(d, None) for d in deals]
     
     return {
         "total": total,
+        "next_cursor": next_cursor,
         "deals": [
             {
                 "id": d.id,
@@ -50,9 +83,82 @@ async def list_deals(
                 "image_url": d.image_url,
                 "source_url": d.source_url,
                 "is_active": d.is_active,
+                "offer_group_id": d.offer_group_id,
                 "has_rating": d.rating is not None if hasattr(d, 'rating') else False,
+                "snippet": snippet_html(snippet),
                 "created_at": d.created_at.isoformat()
             }
+            for d, snippet in rows
+        ]
+    }
+
+def offer_group_summary(group: OfferGroup, banks: list) -> dict:
+    return {
+        "id": group.id,
+        "merchant_name": group.merchant_name,
+        "category": group.category,
+        "discount_kind": group.discount_kind,
+        "valid_from": group.valid_from.isoformat() if group.valid_from else None,
+        "valid_until": group.valid_until.isoformat() if group.valid_until else None,
+        "deals_count": group.deals_count,
+        "banks_count": group.banks_count,
+        "best_by_bank": banks
+    }
+
+@router.get("/groups")
+async def list_offer_groups(
+    category: Optional[str] = None,
+    merchant: Optional[str] = None,
+    min_banks: int = 1,
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    query = db.query(OfferGroup)
+    if category:
+        query = query.filter(OfferGroup.category == category)
+    if merchant:
+        query = query.filter(OfferGroup.merchant_key.startswith(merchant_key(merchant)))
+    if min_banks > 1:
+        query = query.filter(OfferGroup.banks_count >= min_banks)
+    
+    total = query.count()
+    groups = query.order_by(
+        OfferGroup.banks_count.desc(), OfferGroup.deals_count.desc(), OfferGroup.id.desc()
+    ).offset(offset).limit(limit).all()
+    banks = best_by_bank(db, [g.id for g in groups])
+    
+    return {
+        "total": total,
+        "groups": [offer_group_summary(g, banks.get(g.id, [])) for g in groups]
+    }
+
+@router.post("/groups/rebuild")
+async def rebuild_offer_groups(db: Session = Depends(get_db)):
+    result = rebuild_groups(db)
+    return {"success": True, **result}
+
+@router.get("/groups/{group_id}")
+async def get_offer_group(group_id: int, db: Session = Depends(get_db)):
+    group = db.query(OfferGroup).filter(OfferGroup.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="Offer group not found")
+    
+    deals = db.query(StructuredDeal).filter(StructuredDeal.offer_group_id == group_id).order_by(StructuredDeal.id).all()
+    return {
+        **offer_group_summary(group, best_by_bank(db, [group_id]).get(group_id, [])),
+        "deals": [
+            {
+                "id": d.id,
+                "raw_deal_id": d.raw_deal_id,
+                "merchant_name": d.merchant_name,
+                "offer_title": d.offer_title,
+                "discount_value": d.discount_value,
+                "valid_from": d.valid_from.isoformat() if d.valid_from else None,
+                "valid_until": d.valid_until.isoformat() if d.valid_until else None,
+                "applicable_cards": d.applicable_cards,
+                "is_active": d.is_active
+            }
             for d in deals
         ]
     }
@@ -80,6 +186,7 @@ async def get_deal(deal_id: int, db: Session = Depends(get_db)):
         "image_url": deal.image_url,
         "source_url": deal.source_url,
         "is_active": deal.is_active,
+        "offer_group_id": deal.offer_group_id,
         "created_at": deal.created_at.isoformat(),
         "updated_at": deal.updated_at.isoformat()
     }
@@ -122,7 +229,10 @@ async def update_deal(
         deal.is_active = is_active
     
     deal.updated_at = datetime.utcnow()
+    if merchant_name is not None or discount_value is not None:
+        regroup_deal(db, deal)
     db.commit()
+    stats_cache.invalidate()
     
     return {"success": True, "message": "Deal updated"}
 
@@ -132,11 +242,40 @@ async def delete_deal(deal_id: int, db: Session = Depends(get_db)):
     if not deal:
         raise HTTPException(status_code=404, detail="Deal not found")
     
+    remove_from_group(db, deal)
     db.delete(deal)
     db.commit()
+    stats_cache.invalidate()
     
     return {"success": True, "message": "Deal deleted"}
 
+@router.get("/export/stream")
+async def stream_export_deals(
+    format: str = "ndjson",
+    gzip: bool = False,
+    category: Optional[str] = None,
+    valid_from: Optional[date] = None,
+    valid_until: Optional[date] = None,
+    quality_score: Optional[str] = None
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if quality_score and quality_score not in QUALITY_SCORES:
+        raise HTTPException(status_code=400, detail=f"quality_score must be one of: {', '.join(QUALITY_SCORES)}")
+    
+    query = build_export_query(category, valid_from, valid_until, quality_score)
+    filename = f"deals-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        stream_export(query, format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.post("/export")
 async def export_deals(
     category: str = None,
@@ -1,5 +1,4 @@
 from typing import List, Dict
-import requests
 from bs4 import BeautifulSoup
 from .base import BaseScraper
 
@@ -13,8 +12,7 @@ class AlrajhiScraper(BaseScraper):
     
     def scrape(self) -> List[Dict]:
         try:
-            response = requests.get(self.source_url, timeout=30)
-            response.raise_for_status()
+            response = self.fetch(self.source_url)
             soup = BeautifulSoup(response.content, 'lxml')
             deals = []
             offer_cards = soup.find_all('div', class_='offer-card') or soup.find_all('div', class_='card')
@@ -30,7 +28,7 @@ class AlrajhiScraper(BaseScraper):
             if not deals:
                 deals = self.parse_offers_alternative(soup)
             
-            return deals
+            return self.fetch_details(deals)
         except Exception as e:
             print(f"Error scraping Alrajhi Bank: {e}")
             return []
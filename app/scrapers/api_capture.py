@@ -0,0 +1,388 @@
+"""
+Direct JSON API mode for JS-rendered offer pages.
+
+The bank sites fill their offer grids from JSON endpoints. A capture session
+loads the listing once in a pooled browser, records the XHR/fetch JSON
+responses, and learns from them which response carries the offers (the
+largest list of offer-like objects), which query or body parameter pages
+through them, how many pages there are, and which item keys hold the title,
+merchant, discount and so on. The learned endpoint is kept in the source's
+config_json, so later scrapes fetch every page straight over HTTP through
+the shared http_client, concurrently, without a browser. An endpoint that
+stops returning offers is learned again. A source with no usable endpoint
+falls back to its DOM scrape, and a marker in config_json skips the capture
+session until API_CAPTURE_RETRY_HOURS have passed.
+"""
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, urljoin
+from datetime import datetime, timedelta
+import httpx
+import html
+import json
+import math
+import re
+from app.config import API_CAPTURE_SOURCES, API_CAPTURE_MAX_PAGES, API_CAPTURE_RETRY_HOURS, HTTP_PER_HOST_LIMIT
+from app.database import Source
+from .browser_pool import browser_pool
+from .http_client import http_client
+from . import waits
+
+PAGE_PARAMS = {"page", "pagenumber", "pageindex", "pageno", "currentpage", "p"}
+OFFSET_PARAMS = {"offset", "start", "skip", "from"}
+TOTAL_KEYS = {
+    "total": "items", "totalcount": "items", "totalitems": "items", "totalrecords": "items", "totalresults": "items",
+    "totalpages": "pages", "pagecount": "pages", "pages": "pages"
+}
+
+# Item keys tried for each deal field in order, compared lowercased without separators
+FIELD_KEYS = {
+    "raw_title": ["title", "offertitle", "heading", "headline", "name"],
+    "raw_merchant": ["merchant", "merchantname", "brand", "brandname", "partner", "partnername", "store", "vendor", "name"],
+    "raw_description": ["description", "shortdescription", "summary", "details", "desc", "body", "text"],
+    "raw_discount": ["discount", "discountvalue", "discounttext", "offer", "benefit", "percentage", "value"],
+    "raw_validity": ["validity", "validtill", "validuntil", "validto", "enddate", "expirydate", "expiry", "todate"],
+    "raw_image_url": ["image", "imageurl", "img", "logo", "logourl", "thumbnail", "banner"],
+    "raw_terms": ["terms", "termsandconditions", "tnc", "conditions"],
+    "scraped_url": ["url", "link", "detailurl", "href"],
+    "category": ["category", "categoryname", "categorytitle"]
+}
+URL_FIELDS = {"raw_image_url", "scraped_url"}
+
+# Request headers worth replaying; cookies and browser-managed headers are left out
+REPLAY_HEADERS = {"accept", "accept-language", "content-type", "user-agent", "referer", "origin", "x-requested-with"}
+
+def normalize_key(key: Any) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+def as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        return None
+
+def get_path(data: Any, path: List) -> Any:
+    for key in path:
+        data = data[key]
+    return data
+
+def set_path(data: Dict, path: List, value: Any):
+    for key in path[:-1]:
+        data = data[key]
+    data[path[-1]] = value
+
+def find_lists(data: Any, path: Tuple = ()) -> Iterator[Tuple[Tuple, List[Dict]]]:
+    """Every list of objects in a JSON document, with its key path."""
+    if isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            yield path, data
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            yield from find_lists(value, path + (key,))
+
+def flatten(item: Dict, prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in item.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, list):
+            if value and all(isinstance(v, (str, int, float)) for v in value):
+                flat[name] = ", ".join(str(v) for v in value)
+        elif value is not None:
+            flat[name] = value
+    return flat
+
+def guess_fields(items: List[Dict]) -> Dict[str, str]:
+    """Item key for each deal field, matching the key's last segment or its last two joined ("image.url")."""
+    names = {}
+    for item in items[:20]:
+        for key, value in flatten(item).items():
+            if isinstance(value, (str, int, float)) and str(value).strip() and key not in names:
+                segments = [normalize_key(segment) for segment in key.split(".")]
+                names[key] = {segments[-1], "".join(segments[-2:])}
+    fields = {}
+    for field, candidates in FIELD_KEYS.items():
+        for candidate in candidates:
+            match = next((key for key, key_names in names.items() if candidate in key_names and key not in fields.values()), None)
+            if match:
+                fields[field] = match
+                break
+    return fields
+
+def offer_score(items: List[Dict]) -> int:
+    fields = guess_fields(items)
+    if "raw_title" not in fields and "raw_merchant" not in fields:
+        return 0
+    return len(items) * len(fields)
+
+def text(value: Any) -> str:
+    return " ".join(html.unescape(re.sub(r"<[^>]+>", " ", str(value))).split())
+
+def item_to_deal(item: Dict, fields: Dict[str, str], base_url: str) -> Dict:
+    flat = flatten(item)
+    deal = {}
+    for field, key in fields.items():
+        value = text(flat.get(key, ""))
+        if value:
+            deal[field] = urljoin(base_url, value) if field in URL_FIELDS else value
+    if not deal.get("raw_title") and deal.get("raw_merchant"):
+        deal["raw_title"] = deal["raw_merchant"]
+    if not deal.get("raw_merchant") and deal.get("raw_title"):
+        deal["raw_merchant"] = deal["raw_title"]
+    return deal
+
+def request_params(captured: Dict) -> Dict[Tuple[str, str], Any]:
+    """Scalar request parameters, keyed by ("query" | "json" | "form", name or dotted path)."""
+    params = {("query", name): value for name, value in parse_qsl(urlsplit(captured["url"]).query)}
+    if captured.get("json") is not None:
+        params.update({("json", name): value for name, value in flatten(captured["json"]).items()})
+    for name, value in (captured.get("form") or {}).items():
+        params[("form", name)] = value
+    return params
+
+def learn_pagination(responses: List[Dict], page_size: int) -> Optional[Dict]:
+    """The parameter that pages through the listing, from two captured pages or from its name."""
+    first = request_params(responses[0])
+    changed = []
+    for other in responses[1:]:
+        for key, value in request_params(other).items():
+            a, b = as_int(first.get(key)), as_int(value)
+            # Cache busters and timestamps also change between requests
+            if a is not None and b is not None and 0 <= a < 100000 and 0 < b - a <= 1000:
+                changed.append((key, a, b - a))
+    named = [c for c in changed if normalize_key(c[0][1].rsplit(".", 1)[-1]) in PAGE_PARAMS | OFFSET_PARAMS]
+    if named or changed:
+        (location, name), start, step = (named or changed)[0]
+        return {"in": location, "name": name, "start": start, "step": step}
+
+    for (location, name), value in first.items():
+        short = normalize_key(name.rsplit(".", 1)[-1])
+        if as_int(value) is not None and short in PAGE_PARAMS | OFFSET_PARAMS:
+            return {"in": location, "name": name, "start": as_int(value), "step": page_size if short in OFFSET_PARAMS else 1}
+    return None
+
+def find_total(body: Any, items_path: Tuple) -> Optional[Dict]:
+    """A total item or page count beside the items, in a block next to them, or further up."""
+    for depth in range(len(items_path) - 1, -1, -1):
+        prefix = list(items_path[:depth])
+        scope = get_path(body, prefix)
+        if not isinstance(scope, dict):
+            continue
+        for key, value in flatten(scope).items():
+            kind = TOTAL_KEYS.get(normalize_key(key.rsplit(".", 1)[-1]))
+            if kind and key.count(".") <= 1 and as_int(value) is not None:
+                return {"path": prefix + key.split("."), "kind": kind}
+    return None
+
+def learn_endpoint(captured: List[Dict]) -> Optional[Dict]:
+    candidates = []
+    for i, response in enumerate(captured):
+        for path, items in find_lists(response["body"]):
+            score = offer_score(items)
+            if score:
+                candidates.append((score, i, path))
+    if not candidates:
+        return None
+    # Highest score, earliest response on a tie
+    _, i, items_path = max(candidates, key=lambda c: (c[0], -c[1]))
+    best = captured[i]
+    items = get_path(best["body"], list(items_path))
+    if len(items) < 2:
+        return None
+
+    def endpoint_key(response):
+        parts = urlsplit(response["url"])
+        return response["method"], parts.scheme, parts.netloc, parts.path
+
+    def has_items(response):
+        try:
+            return isinstance(get_path(response["body"], list(items_path)), list)
+        except (KeyError, IndexError, TypeError):
+            return False
+
+    pages = [r for r in captured if endpoint_key(r) == endpoint_key(best) and has_items(r)]
+    return {
+        "url": best["url"],
+        "method": best["method"],
+        "json": best.get("json"),
+        "form": best.get("form"),
+        "headers": {k: v for k, v in best["headers"].items() if k.lower() in REPLAY_HEADERS},
+        "items_path": list(items_path),
+        "page": learn_pagination(pages, len(items)),
+        "total": find_total(best["body"], items_path),
+        "fields": guess_fields(items),
+        "learned_at": datetime.utcnow().isoformat()
+    }
+
+def page_request(endpoint: Dict, value: Optional[int] = None) -> Dict:
+    """http_client request for one page of the endpoint."""
+    url = endpoint["url"]
+    body = json.loads(json.dumps(endpoint["json"])) if endpoint.get("json") is not None else None
+    form = dict(endpoint["form"]) if endpoint.get("form") is not None else None
+    page = endpoint.get("page")
+    if page and value is not None:
+        if page["in"] == "query":
+            parts = urlsplit(url)
+            query = [(k, str(value) if k == page["name"] else v) for k, v in parse_qsl(parts.query)]
+            url = urlunsplit(parts._replace(query=urlencode(query)))
+        elif page["in"] == "json":
+            set_path(body, page["name"].split("."), value)
+        else:
+            form[page["name"]] = str(value)
+    return {"method": endpoint["method"], "url": url, "json": body, "data": form, "headers": endpoint["headers"]}
+
+def fetch_pages(requests: List[Dict]) -> List[Any]:
+    bodies = []
+    for response in http_client.fetch_many(requests):
+        if isinstance(response, Exception):
+            raise response
+        response.raise_for_status()
+        bodies.append(response.json())
+    return bodies
+
+def fetch_items(endpoint: Dict) -> List[Dict]:
+    """Every item the endpoint lists: the first page, then the rest concurrently."""
+    items_path = endpoint["items_path"]
+    page = endpoint.get("page")
+    seen = set()
+    items = []
+
+    def add(body) -> int:
+        added = 0
+        for item in get_path(body, items_path):
+            key = json.dumps(item, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+                added += 1
+        return added
+
+    first = fetch_pages([page_request(endpoint, page["start"] if page else None)])[0]
+    page_size = add(first)
+    if not page or not page_size:
+        return items
+
+    pages = None
+    total = endpoint.get("total")
+    if total:
+        count = as_int(get_path(first, total["path"]))
+        if count is not None:
+            pages = count if total["kind"] == "pages" else math.ceil(count / page_size)
+    requests = [
+        page_request(endpoint, page["start"] + page["step"] * n)
+        for n in range(1, min(pages or API_CAPTURE_MAX_PAGES, API_CAPTURE_MAX_PAGES))
+    ]
+
+    if pages is not None:
+        for body in fetch_pages(requests):
+            add(body)
+    else:
+        # Unknown page count: fetch a batch at a time until a page adds nothing new
+        for i in range(0, len(requests), HTTP_PER_HOST_LIMIT):
+            if min(add(body) for body in fetch_pages(requests[i:i + HTTP_PER_HOST_LIMIT])) == 0:
+                break
+    return items
+
+def capture_responses(context, source: str, url: str, next_selector: Optional[str] = None) -> List[Dict]:
+    """Load the listing (and its second page, if next_selector is given) and record the JSON XHR/fetch responses."""
+    page = context.new_page()
+    responses = []
+
+    def record(response):
+        if response.request.resource_type in ("xhr", "fetch") and "json" in response.headers.get("content-type", ""):
+            responses.append(response)
+
+    page.on("response", record)
+    waits.goto(page, url, source)
+    if next_selector:
+        button = page.query_selector(next_selector)
+        if button:
+            waits.after(page, source, "next page", button.click)
+
+    captured = []
+    for response in responses:
+        try:
+            body = response.json()
+        except Exception:
+            continue
+        request = response.request
+        content_type = request.headers.get("content-type", "")
+        post_data = request.post_data
+        captured.append({
+            "url": response.url,
+            "method": request.method,
+            "headers": request.headers,
+            "json": json.loads(post_data) if post_data and "json" in content_type else None,
+            "form": dict(parse_qsl(post_data)) if post_data and "form" in content_type else None,
+            "body": body
+        })
+    return captured
+
+def load_endpoint(source: Source) -> Optional[Dict]:
+    try:
+        return json.loads(source.config_json or "{}").get("api")
+    except ValueError:
+        return None
+
+def store_endpoint(source: Source, endpoint: Dict):
+    try:
+        config = json.loads(source.config_json or "{}")
+    except ValueError:
+        config = {}
+    config["api"] = endpoint
+    source.config_json = json.dumps(config)
+
+def capture_due(marker: Dict) -> bool:
+    """Whether a source marked as having no API should be captured again."""
+    try:
+        failed_at = datetime.fromisoformat(marker["unavailable_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.utcnow() - failed_at >= timedelta(hours=API_CAPTURE_RETRY_HOURS)
+
+def mark_unavailable(scraper):
+    scraper.api_endpoint = {"unavailable_at": datetime.utcnow().isoformat()}
+    scraper.api_endpoint_learned = True
+
+def scrape_via_api(scraper) -> Optional[List[Dict]]:
+    """
+    Deals for a scraper's source from its JSON API: the stored endpoint while
+    it still returns offers, otherwise one learned in a capture session.
+    None if the source has no usable API, so the scraper falls back to the DOM.
+    """
+    options = API_CAPTURE_SOURCES.get(scraper.source_name)
+    if options is None:
+        return None
+
+    items = []
+    endpoint = scraper.api_endpoint
+    if endpoint and "unavailable_at" in endpoint:
+        if not capture_due(endpoint):
+            return None
+        endpoint = None
+    if endpoint:
+        try:
+            items = fetch_items(endpoint)
+        except (httpx.HTTPError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"{scraper.source_name}: stored API endpoint failed ({e}), capturing again")
+
+    if not items:
+        try:
+            captured = browser_pool.run(
+                capture_responses, scraper.source_name, scraper.source_url, options.get("next"), source=scraper.source_name
+            )
+            endpoint = learn_endpoint(captured)
+            items = fetch_items(endpoint) if endpoint else []
+        except Exception as e:
+            print(f"{scraper.source_name}: API capture failed: {e}")
+            mark_unavailable(scraper)
+            return None
+        if not items:
+            print(f"{scraper.source_name}: no JSON offer listing found")
+            mark_unavailable(scraper)
+            return None
+        scraper.api_endpoint = endpoint
+        scraper.api_endpoint_learned = True
+
+    deals = [item_to_deal(item, endpoint["fields"], endpoint["url"]) for item in items]
+    return [scraper.prepare_deal(deal) for deal in deals if deal.get("raw_title")] or None
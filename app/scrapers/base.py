@@ -1,12 +1,21 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
+from bs4 import BeautifulSoup
 import hashlib
+import httpx
+from app.config import HTTP_SOURCE_HEADERS, SCRAPE_DETAIL_PAGES
+from .http_client import http_client
+
+DETAIL_FIELDS = ('raw_description', 'raw_discount', 'raw_validity')
 
 class BaseScraper(ABC):
     def __init__(self, source_id: int, source_name: str, source_url: str):
         self.source_id = source_id
         self.source_name = source_name
         self.source_url = source_url
+        # JSON endpoint (or "no API" marker) for api_capture.scrape_via_api; the runner stores it when learned
+        self.api_endpoint: Optional[Dict] = None
+        self.api_endpoint_learned = False
     
     @abstractmethod
     def scrape(self) -> List[Dict]:
@@ -25,3 +34,60 @@ class BaseScraper(ABC):
         if 'scraped_url' not in deal:
             deal['scraped_url'] = self.source_url
         return deal
+    
+    def fetch(self, url: str, **kwargs) -> httpx.Response:
+        """GET url through the shared http_client with this source's headers."""
+        headers = {**HTTP_SOURCE_HEADERS.get(self.source_name, {}), **kwargs.pop('headers', {})}
+        response = http_client.fetch(url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+    
+    def fetch_many(self, urls: List[str]) -> List[Optional[httpx.Response]]:
+        """Fetch urls concurrently; None for each that failed."""
+        responses = http_client.fetch_many(urls, headers=HTTP_SOURCE_HEADERS.get(self.source_name, {}))
+        results = []
+        for url, response in zip(urls, responses):
+            if isinstance(response, Exception) or response.is_error:
+                print(f"Error fetching {url}: {response if isinstance(response, Exception) else response.status_code}")
+                response = None
+            results.append(response)
+        return results
+    
+    def fetch_details(self, deals: List[Dict]) -> List[Dict]:
+        """
+        Fill missing description, discount and validity from each deal's own
+        offer page, fetched concurrently. Call after prepare_deal so the
+        content hash stays based on the listing.
+        """
+        pending = [
+            deal for deal in deals
+            if deal.get('scraped_url') and deal['scraped_url'] != self.source_url
+            and not all(deal.get(field) for field in DETAIL_FIELDS)
+        ][:SCRAPE_DETAIL_PAGES]
+        if not pending:
+            return deals
+        responses = self.fetch_many([deal['scraped_url'] for deal in pending])
+        for deal, response in zip(pending, responses):
+            if response is not None:
+                self.parse_detail(BeautifulSoup(response.content, 'lxml'), deal)
+        print(f"{self.source_name}: fetched {sum(r is not None for r in responses)} of {len(pending)} offer pages")
+        return deals
+    
+    def parse_detail(self, soup, deal: Dict):
+        for tag in soup(['script', 'style', 'noscript']):
+            tag.decompose()
+        lines = [line.strip() for line in soup.get_text('\n').splitlines() if line.strip()]
+        if not deal.get('raw_description'):
+            meta = soup.find('meta', attrs={'name': 'description'})
+            paragraph = soup.find('p')
+            description = (meta.get('content') if meta else None) or (paragraph.get_text(strip=True) if paragraph else None)
+            if description:
+                deal['raw_description'] = description
+        if not deal.get('raw_discount'):
+            discount = next((line for line in lines if '%' in line), None)
+            if discount:
+                deal['raw_discount'] = discount
+        if not deal.get('raw_validity'):
+            validity = next((line for line in lines if 'valid' in line.lower()), None)
+            if validity:
+                deal['raw_validity'] = validity
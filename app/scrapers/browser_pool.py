@@ -0,0 +1,202 @@
+"""
+Shared pool of warm Playwright Chromium browsers.
+
+Playwright's sync API objects only work on the thread that created them, so
+the pool owns its worker threads. Each worker keeps one browser running, and
+scrapes are submitted to the pool and run on a worker, each in a fresh
+browser context. At most BROWSER_POOL_SIZE scrapes run at once. A browser is
+relaunched after BROWSER_MAX_PAGES pages, once its processes use more than
+BROWSER_MAX_MEMORY_MB, or if it crashes.
+
+Scrapes submitted with a source get that source's request interception
+policy (app/scrapers/interception.py). Scrape functions must not submit to
+the pool themselves: with every worker busy waiting on the pool, nothing
+would run.
+"""
+from typing import Callable, Optional, Any, Dict, List, Iterable
+from concurrent.futures import Future
+from playwright.sync_api import sync_playwright, BrowserContext
+import threading
+import queue
+import atexit
+import os
+from app.scrapers.interception import block_resources, route_metrics
+from app.config import BROWSER_POOL_SIZE, BROWSER_MAX_PAGES, BROWSER_MAX_MEMORY_MB, BROWSER_HEADLESS
+
+class WarmBrowser:
+    def __init__(self, headless: bool):
+        self.playwright = sync_playwright().start()
+        try:
+            self.browser = self.playwright.chromium.launch(headless=headless)
+        except Exception:
+            self.playwright.stop()
+            raise
+        self.pages = 0
+
+    def new_context(self, **options) -> BrowserContext:
+        context = self.browser.new_context(**options)
+        context.on("page", lambda page: self.count_page())
+        return context
+
+    def count_page(self):
+        self.pages += 1
+
+    def memory_mb(self) -> Optional[float]:
+        """Resident memory of all the browser's processes, None where /proc is unavailable."""
+        try:
+            session = self.browser.new_browser_cdp_session()
+            try:
+                processes = session.send("SystemInfo.getProcessInfo").get("processInfo", [])
+            finally:
+                session.detach()
+        except Exception:
+            return None
+
+        total = 0
+        readable = False
+        for process in processes:
+            try:
+                with open(f"/proc/{process['id']}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+                readable = True
+            except (OSError, ValueError, IndexError, KeyError):
+                continue  # exited since the listing, or not Linux
+        return total / (1024 * 1024) if readable else None
+
+    def close(self):
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        finally:
+            self.playwright.stop()
+
+class BrowserPool:
+    def __init__(self, size: int, max_pages: int, max_memory_mb: int, headless: bool = True):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+        self._tasks = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.stats = {"launches": 0, "recycles": 0, "scrapes": 0, "failures": 0}
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                thread = threading.Thread(target=self._work, name=f"browser-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self,
+        scrape: Callable[..., Any],
+        *args,
+        context_options: Optional[Dict] = None,
+        source: Optional[str] = None,
+        allow: Iterable[str] = ()
+    ) -> Future:
+        """
+        Run scrape(context, *args) on a warm browser. context_options go to
+        browser.new_context(); with a source, requests are filtered by its
+        interception policy, except for the resource types in allow.
+        """
+        self._start()
+        future = Future()
+        self._tasks.put((scrape, args, context_options or {}, source, tuple(allow), future))
+        return future
+
+    def run(
+        self,
+        scrape: Callable[..., Any],
+        *args,
+        context_options: Optional[Dict] = None,
+        source: Optional[str] = None,
+        allow: Iterable[str] = ()
+    ) -> Any:
+        return self.submit(scrape, *args, context_options=context_options, source=source, allow=allow).result()
+
+    def launch(self) -> WarmBrowser:
+        browser = WarmBrowser(self.headless)
+        with self._lock:
+            self.stats["launches"] += 1
+        return browser
+
+    def recycle_reason(self, browser: WarmBrowser) -> Optional[str]:
+        if not browser.browser.is_connected():
+            return "disconnected"
+        if browser.pages >= self.max_pages:
+            return f"{browser.pages} pages"
+        memory = browser.memory_mb()
+        if memory is not None and memory >= self.max_memory_mb:
+            return f"{memory:.0f} MB"
+        return None
+
+    def _work(self):
+        browser = None
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            scrape, args, context_options, source, allow, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                if browser is None:
+                    browser = self.launch()
+                if source:
+                    # Requests from service workers would bypass the routes
+                    context_options = {"service_workers": "block", **context_options}
+                context = browser.new_context(**context_options)
+                routes = block_resources(context, source, allow) if source else None
+                try:
+                    result = scrape(context, *args)
+                finally:
+                    try:
+                        context.close()
+                    except Exception:
+                        pass
+                    if routes:
+                        route_metrics.record(routes)
+                        print(routes.summary())
+            except BaseException as e:
+                with self._lock:
+                    self.stats["failures"] += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.stats["scrapes"] += 1
+                future.set_result(result)
+
+            if browser is not None:
+                reason = self.recycle_reason(browser)
+                if reason:
+                    print(f"Recycling browser on {threading.current_thread().name} ({reason})")
+                    browser.close()
+                    browser = None
+                    with self._lock:
+                        self.stats["recycles"] += 1
+
+        if browser is not None:
+            browser.close()
+
+    def shutdown(self, timeout: float = 30):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._tasks.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, workers=len(self._threads), queued=self._tasks.qsize())
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE, BROWSER_MAX_PAGES, BROWSER_MAX_MEMORY_MB, BROWSER_HEADLESS)
+
+# Scripts exit without calling shutdown; close their browsers on the way out
+atexit.register(browser_pool.shutdown)
@@ -0,0 +1,125 @@
+"""
+Shared async HTTP client for the scrapers.
+
+One httpx.AsyncClient runs on a background event loop thread, so every
+scraper thread shares its keep-alive connection pools, over HTTP/2 when the
+h2 package is installed. At most HTTP_PER_HOST_LIMIT requests run against one
+host at a time. Connection errors and 429/5xx responses are retried with
+exponential backoff, honouring Retry-After. Scrapers are synchronous, so they
+call fetch() and fetch_many(), which run the requests on the loop and block
+for the results.
+"""
+from typing import Dict, List, Optional, Union
+import importlib.util
+import threading
+import asyncio
+import atexit
+import random
+import httpx
+from app.config import (
+    HTTP_HEADERS, HTTP_TIMEOUT_SECONDS, HTTP_MAX_CONNECTIONS, HTTP_PER_HOST_LIMIT,
+    HTTP_RETRIES, HTTP_BACKOFF_SECONDS, HTTP2_ENABLED
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return min(float(response.headers.get("retry-after", "")), 60.0)
+    except ValueError:
+        return None
+
+class HttpClient:
+    def __init__(self, headers: Dict[str, str], per_host: int, retries: int, backoff: float):
+        self.headers = headers
+        self.per_host = max(1, per_host)
+        self.retries = retries
+        self.backoff = backoff
+        self.http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "errors": 0}
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="http-client", daemon=True)
+                thread.start()
+                self._client = httpx.AsyncClient(
+                    headers=self.headers,
+                    http2=self.http2,
+                    timeout=HTTP_TIMEOUT_SECONDS,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+                )
+                self._host_limits = {}
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # Only touched on the loop thread, so no lock is needed
+        host = httpx.URL(url).host
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        for attempt in range(self.retries + 1):
+            async with limit:
+                self.stats["requests"] += 1
+                try:
+                    response = await self._client.request(method, url, **kwargs)
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        self.stats["errors"] += 1
+                        raise
+                    delay = None
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        return response
+                    delay = retry_after(response)
+            self.stats["retries"] += 1
+            # Backoff sleeps outside the host limit so other requests can use the slot
+            await asyncio.sleep(delay if delay is not None else self.backoff * 2 ** attempt * (1 + random.random() / 4))
+
+    def fetch(self, url: str, method: str = "GET", **kwargs) -> httpx.Response:
+        """Send one request (httpx.request keyword arguments) and wait for the response."""
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(self._request(method, url, **kwargs), loop).result()
+
+    def fetch_many(self, requests: List[Union[str, Dict]], **kwargs) -> List[Union[httpx.Response, Exception]]:
+        """
+        Send requests concurrently: each a URL, or a dict with "url" and
+        optionally "method" and httpx.request arguments. kwargs apply to all.
+        Failed requests come back as their exception, in request order.
+        """
+        loop = self._start()
+        requests = [{"url": r} if isinstance(r, str) else r for r in requests]
+
+        async def gather():
+            return await asyncio.gather(*(
+                self._request(r.get("method", "GET"), r["url"], **{**kwargs, **{k: v for k, v in r.items() if k not in ("url", "method")}})
+                for r in requests
+            ), return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(gather(), loop).result()
+
+    def shutdown(self, timeout: float = 10):
+        with self._lock:
+            loop, client, thread = self._loop, self._client, self._thread
+            self._loop = self._client = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+
+    def status(self) -> Dict:
+        return dict(self.stats, http2=self.http2, hosts=len(self._host_limits))
+
+http_client = HttpClient(HTTP_HEADERS, HTTP_PER_HOST_LIMIT, HTTP_RETRIES, HTTP_BACKOFF_SECONDS)
+
+atexit.register(http_client.shutdown)
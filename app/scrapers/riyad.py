@@ -1,7 +1,8 @@
 from typing import List, Dict
-from playwright.sync_api import sync_playwright
 from .base import BaseScraper
-import time
+from .browser_pool import browser_pool
+from . import waits
+from .api_capture import scrape_via_api
 
 class RiyadBankScraper(BaseScraper):
     def __init__(self, source_id: int):
@@ -12,30 +13,33 @@ class RiyadBankScraper(BaseScraper):
         )
     
     def scrape(self) -> List[Dict]:
-        deals = []
+        deals = scrape_via_api(self)
+        if deals:
+            return deals
+        
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                page = browser.new_page()
-                page.goto(self.source_url, timeout=60000)
-                time.sleep(3)
-                page.wait_for_load_state('networkidle')
-                
-                offer_elements = page.query_selector_all('.offer-card, .card-offer, [class*="offer"]')
-                
-                for elem in offer_elements[:50]:
-                    deal = self.parse_offer(elem)
-                    if deal and deal.get('raw_title'):
-                        deal = self.prepare_deal(deal)
-                        deals.append(deal)
-                
-                browser.close()
+            deals = browser_pool.run(self.scrape_offers, source=self.source_name)
         except Exception as e:
             print(f"Error scraping Riyad Bank with Playwright: {e}")
             deals = self.scrape_fallback()
         
         return deals
     
+    def scrape_offers(self, context) -> List[Dict]:
+        deals = []
+        page = context.new_page()
+        waits.goto(page, self.source_url, self.source_name)
+        
+        offer_elements = page.query_selector_all('.offer-card, .card-offer, [class*="offer"]')
+        
+        for elem in offer_elements[:50]:
+            deal = self.parse_offer(elem)
+            if deal and deal.get('raw_title'):
+                deal = self.prepare_deal(deal)
+                deals.append(deal)
+        
+        return deals
+    
     def parse_offer(self, element) -> Dict:
         deal = {}
         try:
@@ -66,10 +70,9 @@ class RiyadBankScraper(BaseScraper):
     
     def scrape_fallback(self) -> List[Dict]:
         try:
-            import requests
             from bs4 import BeautifulSoup
             
-            response = requests.get(self.source_url, timeout=30)
+            response = self.fetch(self.source_url)
             soup = BeautifulSoup(response.content, 'lxml')
             deals = []
             
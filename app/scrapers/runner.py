@@ -1,10 +1,16 @@
-from typing import Dict, List
+from typing import List, Dict, Optional, Callable
 from sqlalchemy.orm import Session
 from datetime import datetime
-from app.database import RawDeal, Source
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+from app.config import SCRAPE_MAX_WORKERS, SCRAPE_SOURCE_TIMEOUT_SECONDS
+from app.database import Source
 from app.scrapers.alrajhi import AlrajhiScraper
 from app.scrapers.riyad import RiyadBankScraper
 from app.scrapers.sab import SABBankScraper
+from app.scrapers.api_capture import load_endpoint, store_endpoint
+from app.services.ingest import insert_raw_deals
+from app.services.stats import stats_cache
 
 class ScraperRunner:
     def __init__(self, db: Session):
@@ -18,9 +24,16 @@ class ScraperRunner:
         }
         scraper_class = scrapers.get(source.name)
         if scraper_class:
-            return scraper_class(source.id)
+            scraper = scraper_class(source.id)
+            scraper.api_endpoint = load_endpoint(source)
+            return scraper
         return None
     
+    def keep_api_endpoint(self, source: Source, scraper):
+        # Committed with the scrape's deals in save_deals
+        if scraper.api_endpoint_learned:
+            store_endpoint(source, scraper.api_endpoint)
+    
     def run_scraper(self, source_id: int) -> Dict:
         source = self.db.query(Source).filter(Source.id == source_id).first()
         if not source:
@@ -32,47 +45,113 @@ class ScraperRunner:
         
         try:
             deals_data = scraper.scrape()
-            
-            new_count = 0
-            duplicate_count = 0
-            error_count = 0
-            
-            for deal_data in deals_data:
-                content_hash = deal_data.get('content_hash')
-                existing = self.db.query(RawDeal).filter(
-                    RawDeal.content_hash == content_hash
-                ).first()
-                
-                if existing:
-                    duplicate_count += 1
-                    continue
-                
-                raw_deal = RawDeal(
-                    source_id=source.id,
-                    raw_title=deal_data.get('raw_title'),
-                    raw_description=deal_data.get('raw_description'),
-                    raw_discount=deal_data.get('raw_discount'),
-                    raw_validity=deal_data.get('raw_validity'),
-                    raw_merchant=deal_data.get('raw_merchant'),
-                    raw_image_url=deal_data.get('raw_image_url'),
-                    raw_terms=deal_data.get('raw_terms'),
-                    scraped_url=deal_data.get('scraped_url'),
-                    content_hash=content_hash,
-                    status='new'
-                )
-                self.db.add(raw_deal)
-                new_count += 1
-            
+        except Exception as e:
+            return {"success": False, "source": source.name, "error": str(e)}
+        
+        self.keep_api_endpoint(source, scraper)
+        return self.save_deals(source, deals_data)
+    
+    def save_deals(self, source: Source, deals_data: List[Dict]) -> Dict:
+        try:
+            result = insert_raw_deals(self.db, source.id, deals_data)
             source.last_scraped_at = datetime.utcnow()
             self.db.commit()
+            stats_cache.invalidate()
             
             return {
                 "success": True,
                 "source": source.name,
-                "total_found": len(deals_data),
-                "new_deals": new_count,
-                "duplicates": duplicate_count
+                "total_found": result["total_found"],
+                "new_deals": result["new_deals"],
+                "duplicates": result["duplicates"],
+                "near_duplicates": result["near_duplicates"]
             }
         except Exception as e:
             self.db.rollback()
-            return {"success": False, "error": str(e)}
+            return {"success": False, "source": source.name, "error": str(e)}
+    
+    def run_all_scrapers(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_result: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        max_workers = max_workers or SCRAPE_MAX_WORKERS
+        timeout = timeout or SCRAPE_SOURCE_TIMEOUT_SECONDS
+        sources = self.db.query(Source).filter(Source.is_active == True).all()
+        
+        results = {}
+        jobs = []
+        for source in sources:
+            scraper = self.get_scraper(source)
+            if scraper:
+                jobs.append((source, scraper))
+            else:
+                results[source.id] = {"success": False, "source": source.name, "error": f"No scraper for {source.name}"}
+                if on_result:
+                    on_result(results[source.id])
+        
+        started_at = {}
+        scrapers = {source.id: scraper for source, scraper in jobs}
+        
+        def scrape(source_id, scraper):
+            started_at[source_id] = time.monotonic()
+            return scraper.scrape()
+        
+        run_started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="scraper")
+        pending = {executor.submit(scrape, source.id, scraper): source for source, scraper in jobs}
+        
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                
+                # Scraping runs in worker threads, but the session is not thread-safe,
+                # so results are written to the database from this thread only.
+                for future in done:
+                    source = pending.pop(future)
+                    elapsed = time.monotonic() - started_at.get(source.id, run_started)
+                    try:
+                        deals_data = future.result()
+                    except Exception as e:
+                        result = {"success": False, "source": source.name, "error": str(e)}
+                    else:
+                        self.keep_api_endpoint(source, scrapers[source.id])
+                        result = self.save_deals(source, deals_data)
+                    result["elapsed_seconds"] = round(elapsed, 2)
+                    results[source.id] = result
+                    if on_result:
+                        on_result(result)
+                
+                # A timed-out thread cannot be killed; it is abandoned and its
+                # result is discarded when it eventually finishes.
+                now = time.monotonic()
+                for future, source in list(pending.items()):
+                    source_started = started_at.get(source.id)
+                    if source_started is not None and now - source_started > timeout:
+                        pending.pop(future)
+                        results[source.id] = {
+                            "success": False,
+                            "source": source.name,
+                            "error": f"Timed out after {timeout}s",
+                            "elapsed_seconds": round(now - source_started, 2)
+                        }
+                        if on_result:
+                            on_result(results[source.id])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        summary = [dict(results[source.id], source_id=source.id) for source in sources]
+        succeeded = [r for r in summary if r.get("success")]
+        
+        return {
+            "success": len(succeeded) == len(summary),
+            "elapsed_seconds": round(time.monotonic() - run_started, 2),
+            "sources_total": len(summary),
+            "sources_succeeded": len(succeeded),
+            "total_found": sum(r.get("total_found", 0) for r in succeeded),
+            "new_deals": sum(r.get("new_deals", 0) for r in succeeded),
+            "duplicates": sum(r.get("duplicates", 0) for r in succeeded),
+            "near_duplicates": sum(r.get("near_duplicates", 0) for r in succeeded),
+            "results": summary
+        }
@@ -1,7 +1,7 @@
 from typing import List, Dict
-import requests
 from bs4 import BeautifulSoup
 from .base import BaseScraper
+from .api_capture import scrape_via_api
 
 class SABBankScraper(BaseScraper):
     def __init__(self, source_id: int):
@@ -12,9 +12,12 @@ class SABBankScraper(BaseScraper):
         )
     
     def scrape(self) -> List[Dict]:
+        deals = scrape_via_api(self)
+        if deals:
+            return deals
+        
         try:
-            response = requests.get(self.source_url, timeout=30)
-            response.raise_for_status()
+            response = self.fetch(self.source_url)
             soup = BeautifulSoup(response.content, 'lxml')
             deals = []
             offer_cards = soup.find_all('div', class_=['offer', 'card', 'special-offer'])
@@ -31,7 +34,7 @@ class SABBankScraper(BaseScraper):
             if not deals:
                 deals = self.parse_offers_generic(soup)
             
-            return deals
+            return self.fetch_details(deals)
         except Exception as e:
             print(f"Error scraping SAB Bank: {e}")
             return []
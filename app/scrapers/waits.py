@@ -0,0 +1,125 @@
+"""
+Readiness waits for Playwright crawls.
+
+Instead of sleeping for a fixed worst-case time after navigating or clicking,
+scrapers wait for the condition in app.config.WAIT_STRATEGIES for their source
+and stage: a selector that appears once offers have rendered, a network
+response whose URL contains a given string, or a load state. Every wait is
+timed and recorded in wait_metrics; a timed-out wait returns False and the
+scraper carries on with whatever has rendered, as it did after a sleep.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
+import threading
+import time
+from app.config import WAIT_STRATEGIES, WAIT_TIMEOUT_MS
+
+class WaitMetrics:
+    def __init__(self):
+        self.waits: Dict[Tuple[str, str], Dict] = {}
+        self.listeners: List[Callable[[str, str, float, bool], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, str, float, bool], None]):
+        """listener(source, stage, seconds, timed_out) is called after every wait."""
+        self.listeners.append(listener)
+
+    def record(self, source: str, stage: str, seconds: float, timed_out: bool):
+        with self._lock:
+            entry = self.waits.setdefault((source, stage), {"count": 0, "timeouts": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["timeouts"] += int(timed_out)
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        for listener in self.listeners:
+            listener(source, stage, seconds, timed_out)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "source": source,
+                    "stage": stage,
+                    "count": entry["count"],
+                    "timeouts": entry["timeouts"],
+                    "total_seconds": round(entry["seconds"], 3),
+                    "avg_seconds": round(entry["seconds"] / entry["count"], 3),
+                    "max_seconds": round(entry["max_seconds"], 3)
+                }
+                for (source, stage), entry in sorted(self.waits.items())
+            ]
+
+# Per-process timings since startup
+wait_metrics = WaitMetrics()
+
+def condition(source: str, stage: str) -> Dict:
+    """The source's "load" condition, overridden by whatever its stage sets."""
+    stages = WAIT_STRATEGIES.get(source, {})
+    return {"timeout": WAIT_TIMEOUT_MS, **stages.get("load", {}), **stages.get(stage, {})}
+
+def _responded(page: Page, cond: Dict, action: Callable) -> bool:
+    pattern = cond.get("response")
+    expected = page.expect_response(lambda r: pattern in r.url, timeout=cond["timeout"]) if pattern else nullcontext()
+    try:
+        with expected:
+            action()
+        return True
+    except PlaywrightTimeoutError:
+        if not pattern:
+            raise
+        return False
+
+def _changed(page: Page, before: str, cond: Dict) -> bool:
+    try:
+        page.wait_for_function("before => document.body.innerText !== before", arg=before, timeout=cond["timeout"], polling=100)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+def _ready(page: Page, cond: Dict) -> bool:
+    try:
+        if cond.get("selector"):
+            page.wait_for_selector(cond["selector"], timeout=cond["timeout"])
+        else:
+            page.wait_for_load_state(cond.get("load_state", "networkidle"), timeout=cond["timeout"])
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+def _record(source: str, stage: str, started: float, ready: bool) -> bool:
+    wait_metrics.record(source, stage, time.monotonic() - started, not ready)
+    return ready
+
+def wait_ready(page: Page, source: str, stage: str = "load") -> bool:
+    started = time.monotonic()
+    return _record(source, stage, started, _ready(page, condition(source, stage)))
+
+def goto(page: Page, url: str, source: str, stage: str = "load", timeout: int = 60000) -> bool:
+    """Navigate to url and wait until the source's content is ready. Navigation errors still raise."""
+    cond = condition(source, stage)
+    started = time.monotonic()
+    ready = _responded(page, cond, lambda: page.goto(url, timeout=timeout, wait_until="domcontentloaded"))
+    return _record(source, stage, started, ready and _ready(page, cond))
+
+def after(page: Page, source: str, stage: str, action: Callable[[], None]) -> bool:
+    """
+    Run an action that re-renders the page in place (a category tab, a Next
+    button) and wait for the new content: the stage's response if it has one,
+    otherwise any change in the page text, then its readiness condition.
+    """
+    cond = condition(source, stage)
+    started = time.monotonic()
+    if cond.get("response"):
+        ready = _responded(page, cond, action)
+    else:
+        before = page.inner_text("body")
+        action()
+        ready = _changed(page, before, cond)
+    return _record(source, stage, started, ready and _ready(page, cond))
+
+def summary(source: Optional[str] = None) -> str:
+    return ", ".join(
+        f"{w['stage']} {w['count']}x avg {w['avg_seconds']}s" + (f" ({w['timeouts']} timed out)" if w["timeouts"] else "")
+        for w in wait_metrics.snapshot() if source is None or w["source"] == source
+    )
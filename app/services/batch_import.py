@@ -0,0 +1,191 @@
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import insert, update, select
+from sqlalchemy.orm import Session
+from datetime import datetime, date
+import re
+from app.database import RawDeal, StructuredDeal, ProcessingBatch, BatchDeal
+from app.models import ImportDeal
+from app.services import llm_cache
+from app.services.offer_groups import assign_groups
+
+# Written into raw_terms by the batch planner when a prompt repeats the same terms
+SAME_TERMS = re.compile(r"^Same as temp_id (\d+)$")
+
+def create_processing_batch(db: Session, deals: List[RawDeal], name: Optional[str] = None) -> ProcessingBatch:
+    deals = sorted(deals, key=lambda d: d.id)
+    batch = ProcessingBatch(
+        name=name or f"Batch {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
+        status='created',
+        deals_count=len(deals)
+    )
+    db.add(batch)
+    db.flush()
+    
+    for temp_id, deal in enumerate(deals, 1):
+        db.add(BatchDeal(batch_id=batch.id, raw_deal_id=deal.id, temp_id=temp_id))
+        deal.status = 'processing'
+    return batch
+
+def raw_deal_export(raw_deal: RawDeal, temp_id: int) -> Dict:
+    return {
+        "temp_id": temp_id,
+        "raw_title": raw_deal.raw_title,
+        "raw_description": raw_deal.raw_description,
+        "raw_merchant": raw_deal.raw_merchant,
+        "raw_discount": raw_deal.raw_discount,
+        "raw_validity": raw_deal.raw_validity,
+        "raw_terms": raw_deal.raw_terms,
+        "source": raw_deal.source.name if raw_deal.source else "Unknown"
+    }
+
+def batch_deal_export(batch_deal: BatchDeal) -> Dict:
+    return raw_deal_export(batch_deal.raw_deal, batch_deal.temp_id)
+
+def resolve_shared_terms(deals: List[ImportDeal], terms: Optional[Dict[int, str]] = None) -> List[ImportDeal]:
+    """
+    Replace "Same as temp_id N" with deal N's terms. Pass the same terms dict
+    for every chunk of a batch so references to earlier chunks resolve too.
+    """
+    terms = {} if terms is None else terms
+    terms.update({
+        deal.temp_id: deal.terms_conditions for deal in deals
+        if deal.terms_conditions and not SAME_TERMS.match(deal.terms_conditions)
+    })
+    for deal in deals:
+        match = SAME_TERMS.match(deal.terms_conditions or "")
+        if match and terms.get(int(match.group(1))):
+            deal.terms_conditions = terms[int(match.group(1))]
+            terms[deal.temp_id] = deal.terms_conditions
+    return deals
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def load_temp_id_map(db: Session, batch_id: int) -> Dict[int, int]:
+    rows = db.query(BatchDeal.temp_id, BatchDeal.raw_deal_id).filter(BatchDeal.batch_id == batch_id).all()
+    return {temp_id: raw_deal_id for temp_id, raw_deal_id in rows}
+
+def insert_structured_deals(db: Session, pairs: List[Tuple[int, ImportDeal]]) -> List[int]:
+    rows = [
+        {
+            "raw_deal_id": raw_deal_id,
+            "merchant_name": deal_data.merchant_name,
+            "offer_title": deal_data.offer_title,
+            "description": deal_data.description,
+            "discount_value": deal_data.discount_value,
+            "discount_type": deal_data.discount_type,
+            "category": deal_data.category,
+            "valid_from": parse_date(deal_data.valid_from),
+            "valid_until": parse_date(deal_data.valid_until),
+            "location": deal_data.location,
+            "applicable_cards": deal_data.applicable_cards,
+            "terms_conditions": deal_data.terms_conditions,
+            "promo_code": deal_data.promo_code,
+            "is_active": True
+        }
+        for raw_deal_id, deal_data in pairs
+    ]
+    if not rows:
+        return []
+    stmt = insert(StructuredDeal).returning(StructuredDeal.id, sort_by_parameter_order=True)
+    structured_ids = db.execute(stmt, rows).scalars().all()
+    assign_groups(db, structured_ids)
+    return structured_ids
+
+def fallback_raw_terms(db: Session, pairs: List[Tuple[int, ImportDeal]]):
+    """Deals still pointing at a temp_id missing from the upload keep their raw deal's own terms."""
+    unresolved = {}
+    for raw_deal_id, deal_data in pairs:
+        if SAME_TERMS.match(deal_data.terms_conditions or ""):
+            unresolved.setdefault(raw_deal_id, []).append(deal_data)
+    raw_deal_ids = list(unresolved)
+    for i in range(0, len(raw_deal_ids), llm_cache.LOOKUP_CHUNK_SIZE):
+        chunk = raw_deal_ids[i:i + llm_cache.LOOKUP_CHUNK_SIZE]
+        for raw_deal_id, raw_terms in db.query(RawDeal.id, RawDeal.raw_terms).filter(RawDeal.id.in_(chunk)).all():
+            for deal_data in unresolved[raw_deal_id]:
+                deal_data.terms_conditions = raw_terms
+
+def cache_results(db: Session, pairs: List[Tuple[int, ImportDeal]]):
+    raw_deal_ids = [raw_deal_id for raw_deal_id, _ in pairs]
+    raw_deals = {}
+    for i in range(0, len(raw_deal_ids), llm_cache.LOOKUP_CHUNK_SIZE):
+        chunk = raw_deal_ids[i:i + llm_cache.LOOKUP_CHUNK_SIZE]
+        raw_deals.update((d.id, d) for d in db.query(RawDeal).filter(RawDeal.id.in_(chunk)).all())
+    # A temp_id reference means nothing to later batches
+    llm_cache.store(db, {
+        llm_cache.cache_key(raw_deals[raw_deal_id]): deal_data.model_dump(exclude={"temp_id"})
+        for raw_deal_id, deal_data in pairs
+        if raw_deal_id in raw_deals and not SAME_TERMS.match(deal_data.terms_conditions or "")
+    })
+
+def resolve_cached_deals(db: Session, deals: List[RawDeal]) -> Tuple[List[RawDeal], int]:
+    """Structure deals that have a cached LLM result; returns the rest and the resolved count."""
+    keys = {deal.id: llm_cache.cache_key(deal) for deal in deals}
+    found = llm_cache.lookup(db, keys.values())
+    if not found:
+        return deals, 0
+
+    pairs = []
+    remaining = []
+    for deal in deals:
+        result = found.get(keys[deal.id])
+        if result is None:
+            remaining.append(deal)
+            continue
+        pairs.append((deal.id, ImportDeal.model_validate(dict(result, temp_id=0))))
+        deal.status = 'processed'
+    insert_structured_deals(db, pairs)
+    return remaining, len(pairs)
+
+def import_deals(
+    db: Session,
+    batch_id: int,
+    temp_id_map: Dict[int, int],
+    deals: List[ImportDeal],
+    cache: bool = True,
+    shared_terms: Optional[Dict[int, str]] = None
+) -> Dict:
+    pairs = []
+    skipped = []
+    for deal_data in resolve_shared_terms(deals, shared_terms):
+        raw_deal_id = temp_id_map.get(deal_data.temp_id)
+        if raw_deal_id is None:
+            skipped.append(deal_data.temp_id)
+            continue
+        pairs.append((raw_deal_id, deal_data))
+
+    if pairs:
+        fallback_raw_terms(db, pairs)
+        structured_ids = insert_structured_deals(db, pairs)
+
+        db.execute(update(BatchDeal), [
+            {"batch_id": batch_id, "raw_deal_id": raw_deal_id, "structured_deal_id": structured_id}
+            for (raw_deal_id, _), structured_id in zip(pairs, structured_ids)
+        ])
+
+        # One statement regardless of batch size, and no bound-parameter limit
+        imported = select(BatchDeal.raw_deal_id).where(
+            BatchDeal.batch_id == batch_id,
+            BatchDeal.structured_deal_id.is_not(None)
+        )
+        db.execute(
+            update(RawDeal).where(RawDeal.id.in_(imported)).values(status='processed'),
+            execution_options={"synchronize_session": False}
+        )
+
+        if cache:
+            cache_results(db, pairs)
+
+    return {"imported_count": len(pairs), "skipped_temp_ids": skipped}
+
+def import_batch_deals(db: Session, batch: ProcessingBatch, deals: List[ImportDeal]) -> Dict:
+    result = import_deals(db, batch.id, load_temp_id_map(db, batch.id), deals)
+    batch.status = 'completed'
+    batch.imported_at = datetime.utcnow()
+    db.commit()
+    return result
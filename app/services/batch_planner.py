@@ -0,0 +1,95 @@
+"""
+Packs raw deals into LLM prompts sized to a token budget.
+
+Token counts are estimated, not measured: roughly 4 bytes of UTF-8 per token,
+which over-counts English a little and keeps Arabic text (2 bytes per letter)
+from being badly under-counted.
+"""
+from typing import List, Dict, Optional
+import hashlib
+import json
+from app.config import LLM_PROMPT_TEMPLATE, LLM_PROMPT_TOKEN_BUDGET, LLM_OUTPUT_TOKENS_PER_DEAL, LLM_MAX_FIELD_CHARS
+
+BYTES_PER_TOKEN = 4
+LONG_FIELDS = ["raw_description", "raw_terms"]
+
+def build_prompt(deals: List[Dict]) -> str:
+    # The template escapes its braces for str.format, which leaves {deals_json}
+    return LLM_PROMPT_TEMPLATE.format().replace("{deals_json}", json.dumps(deals, ensure_ascii=False, indent=2))
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text.encode("utf-8")) // BYTES_PER_TOKEN)
+
+def prompt_overhead() -> int:
+    return estimate_tokens(build_prompt([]))
+
+def truncate_fields(deal: Dict, max_chars: int = LLM_MAX_FIELD_CHARS) -> Dict:
+    deal = dict(deal)
+    for field in LONG_FIELDS:
+        value = deal.get(field)
+        if value and len(value) > max_chars:
+            deal[field] = value[:max_chars].rstrip() + "…"
+    return deal
+
+def terms_key(deal: Dict) -> Optional[str]:
+    terms = (deal.get("raw_terms") or "").strip()
+    return hashlib.md5(terms.encode()).hexdigest() if terms else None
+
+def shared_terms_reference(temp_id) -> str:
+    return f"Same as temp_id {temp_id}"
+
+def compact_deals(deals: List[Dict]) -> List[Dict]:
+    """Truncate long text and replace terms already given earlier in the prompt with a reference."""
+    compacted = []
+    first_with_terms = {}
+    for deal in deals:
+        deal = truncate_fields(deal)
+        key = terms_key(deal)
+        if key in first_with_terms:
+            deal["raw_terms"] = shared_terms_reference(first_with_terms[key])
+        elif key:
+            first_with_terms[key] = deal["temp_id"]
+        compacted.append(deal)
+    return compacted
+
+def deal_cost(deal: Dict) -> int:
+    # Laid out as an element of build_prompt's indented array, plus room for the answer
+    return estimate_tokens(json.dumps([deal], ensure_ascii=False, indent=2)) + LLM_OUTPUT_TOKENS_PER_DEAL
+
+def pack_deals(deals: List[Dict], token_budget: Optional[int] = None) -> List[List[int]]:
+    """
+    First-fit decreasing bin packing of deals into prompts. Returns groups of
+    indexes into deals, each group in input order. A deal that repeats terms
+    already in a group costs less there, so deals sharing terms tend to land
+    together. A deal too big for any prompt gets a group of its own.
+    """
+    capacity = (token_budget or LLM_PROMPT_TOKEN_BUDGET) - prompt_overhead()
+    items = []
+    for index, deal in enumerate(deals):
+        deal = truncate_fields(deal)
+        key = terms_key(deal)
+        cost = deal_cost(deal)
+        saving = 0
+        if key:
+            saving = cost - deal_cost(dict(deal, raw_terms=shared_terms_reference(deal.get("temp_id") or 0)))
+        items.append((cost, saving, key, index))
+    items.sort(key=lambda item: (-item[0], item[3]))
+
+    groups = []
+    for cost, saving, key, index in items:
+        for group in groups:
+            needed = cost - saving if key and key in group["terms"] else cost
+            if needed <= group["remaining"]:
+                group["remaining"] -= needed
+                group["indexes"].append(index)
+                if key:
+                    group["terms"].add(key)
+                break
+        else:
+            groups.append({"remaining": capacity - cost, "indexes": [index], "terms": {key} if key else set()})
+
+    return sorted((sorted(group["indexes"]) for group in groups), key=lambda indexes: indexes[0])
+
+def estimate_prompt_tokens(deals: List[Dict]) -> int:
+    compacted = compact_deals(deals)
+    return estimate_tokens(build_prompt(compacted)) + LLM_OUTPUT_TOKENS_PER_DEAL * len(compacted)
@@ -0,0 +1,95 @@
+from typing import Dict, Iterator, Optional
+from sqlalchemy import select, or_
+from datetime import date
+import csv
+import io
+import json
+import zlib
+from app.config import EXPORT_CHUNK_SIZE
+from app.database import SessionLocal, StructuredDeal, Rating
+
+EXPORT_COLUMNS = [
+    StructuredDeal.id,
+    StructuredDeal.merchant_name,
+    StructuredDeal.offer_title,
+    StructuredDeal.description,
+    StructuredDeal.discount_value,
+    StructuredDeal.discount_type,
+    StructuredDeal.category,
+    StructuredDeal.valid_from,
+    StructuredDeal.valid_until,
+    StructuredDeal.location,
+    StructuredDeal.applicable_cards,
+    StructuredDeal.terms_conditions,
+    StructuredDeal.promo_code,
+    StructuredDeal.image_url,
+    StructuredDeal.source_url,
+    Rating.quality_score,
+]
+
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+def build_export_query(
+    category: Optional[str] = None,
+    valid_from: Optional[date] = None,
+    valid_until: Optional[date] = None,
+    quality_score: Optional[str] = None
+):
+    query = select(*EXPORT_COLUMNS).outerjoin(Rating, Rating.deal_id == StructuredDeal.id)
+    if category:
+        query = query.where(StructuredDeal.category == category)
+    # Deals whose validity overlaps the requested window; open ends always match
+    if valid_from:
+        query = query.where(or_(StructuredDeal.valid_until.is_(None), StructuredDeal.valid_until >= valid_from))
+    if valid_until:
+        query = query.where(or_(StructuredDeal.valid_from.is_(None), StructuredDeal.valid_from <= valid_until))
+    if quality_score:
+        query = query.where(Rating.quality_score == quality_score)
+    return query.order_by(StructuredDeal.id)
+
+def row_to_dict(row) -> Dict:
+    record = dict(zip(EXPORT_FIELDS, row))
+    for field in ("valid_from", "valid_until"):
+        if record[field]:
+            record[field] = record[field].isoformat()
+    return record
+
+def encode_ndjson(records) -> str:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+def encode_csv(records, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+def stream_export(query, export_format: str, compress: bool = False) -> Iterator[bytes]:
+    # Runs after the request's session is closed, so it opens its own. Rows are
+    # plain column tuples fetched EXPORT_CHUNK_SIZE at a time and encoded chunk
+    # by chunk; nothing accumulates in the identity map or in a response buffer.
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        first = True
+        for rows in result.partitions():
+            records = [row_to_dict(row) for row in rows]
+            if export_format == "csv":
+                text = encode_csv(records, header=first)
+            else:
+                text = encode_ndjson(records)
+            first = False
+            data = text.encode("utf-8")
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if export_format == "csv" and first:
+            data = encode_csv([], header=True).encode("utf-8")
+            yield compressor.compress(data) if compressor else data
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
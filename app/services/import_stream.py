@@ -0,0 +1,170 @@
+from typing import List, Dict, Iterator, Tuple, Optional, AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from datetime import datetime
+import codecs
+import json
+from app.config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ITEM_BYTES, IMPORT_MAX_REPORTED_ERRORS
+from app.database import ProcessingBatch
+from app.models import ImportDeal
+from app.services.batch_import import load_temp_id_map, import_deals
+
+def exceeds_bytes(text: str, limit: int) -> bool:
+    # UTF-8 takes 1 to 4 bytes per character, so most text is decided without encoding
+    if len(text) > limit:
+        return True
+    if len(text) * 4 <= limit:
+        return False
+    return len(text.encode("utf-8")) > limit
+
+class ImportStreamParser:
+    """
+    Incremental parser for LLM result uploads, either NDJSON (one deal per
+    line) or a single JSON array of deals. The format is picked from the first
+    non-whitespace character. feed() returns (position, value, error) for every
+    item completed by the data so far, where position is the line number for
+    NDJSON and the 1-based item index for arrays.
+    """
+
+    def __init__(self, max_item_size: int = IMPORT_MAX_ITEM_BYTES):
+        self.max_item_size = max_item_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.buffer = ""
+        self.format = None
+        self.position = 0
+        self.skipping = False
+        self.done = False
+
+    def feed(self, data: bytes, final: bool = False) -> List[Tuple[int, Optional[object], Optional[str]]]:
+        self.buffer += self.text_decoder.decode(data, final=final)
+        if self.format is None:
+            stripped = self.buffer.lstrip()
+            if not stripped:
+                return []
+            if stripped[0] == "[":
+                self.format = "array"
+                self.buffer = stripped[1:]
+            else:
+                self.format = "ndjson"
+        if self.format == "array":
+            return list(self._parse_array(final))
+        return list(self._parse_lines(final))
+
+    def _parse_lines(self, final: bool) -> Iterator[Tuple[int, Optional[object], Optional[str]]]:
+        lines = self.buffer.split("\n")
+        self.buffer = "" if final else lines.pop()
+        for line in lines:
+            self.position += 1
+            if self.skipping:
+                # Rest of an oversized line that was already reported
+                self.skipping = False
+                continue
+            if not line.strip():
+                continue
+            if exceeds_bytes(line, self.max_item_size):
+                yield self.position, None, f"Line exceeds {self.max_item_size} bytes"
+                continue
+            try:
+                yield self.position, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield self.position, None, f"Invalid JSON: {e.msg}"
+        if not self.skipping and exceeds_bytes(self.buffer, self.max_item_size):
+            self.skipping = True
+            self.buffer = ""
+            yield self.position + 1, None, f"Line exceeds {self.max_item_size} bytes"
+        elif self.skipping:
+            self.buffer = ""
+
+    def _parse_array(self, final: bool) -> Iterator[Tuple[int, Optional[object], Optional[str]]]:
+        while not self.done:
+            self.buffer = self.buffer.lstrip(" \t\r\n,")
+            if not self.buffer:
+                if final:
+                    self.done = True
+                    yield self.position + 1, None, "Unexpected end of input, missing ']'"
+                return
+            if self.buffer[0] == "]":
+                self.done = True
+                self.buffer = ""
+                return
+            try:
+                value, end = self.decoder.raw_decode(self.buffer)
+            except json.JSONDecodeError as e:
+                # Until the item outgrows max_item_size a decode error may just
+                # mean it is incomplete. A real syntax error inside an array
+                # cannot be skipped reliably, so it ends the parse.
+                if not final and not exceeds_bytes(self.buffer, self.max_item_size):
+                    return
+                self.done = True
+                self.buffer = ""
+                yield self.position + 1, None, f"Invalid JSON: {e.msg}"
+                return
+            if end == len(self.buffer) and not final:
+                return  # a bare number at the end could still be cut short
+            self.position += 1
+            self.buffer = self.buffer[end:]
+            yield self.position, value, None
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'deal'}: {e['msg']}" for e in error.errors()
+    )
+
+async def import_stream(db: Session, batch: ProcessingBatch, chunks: AsyncIterator[bytes]) -> Dict:
+    """Validate and import deals from an upload stream, committing every IMPORT_CHUNK_SIZE deals."""
+    temp_id_map = load_temp_id_map(db, batch.id)
+    # Terms seen so far, for "Same as temp_id N" references across chunks
+    shared_terms = {}
+    parser = ImportStreamParser()
+    pending = []
+    imported_count = 0
+    error_count = 0
+    errors = []
+
+    def add_error(position: int, message: str):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"item" if parser.format == "array" else "line": position, "error": message})
+
+    def flush():
+        nonlocal imported_count, pending
+        result = import_deals(db, batch.id, temp_id_map, [deal for _, deal in pending], shared_terms=shared_terms)
+        db.commit()
+        imported_count += result["imported_count"]
+        skipped = set(result["skipped_temp_ids"])
+        for position, deal in pending:
+            if deal.temp_id in skipped:
+                add_error(position, f"Unknown temp_id {deal.temp_id}")
+        pending = []
+
+    def handle(items):
+        for position, value, error in items:
+            if error:
+                add_error(position, error)
+                continue
+            try:
+                pending.append((position, ImportDeal.model_validate(value)))
+            except ValidationError as e:
+                add_error(position, format_validation_error(e))
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                flush()
+
+    async for data in chunks:
+        handle(parser.feed(data))
+        if parser.done:
+            break
+    handle(parser.feed(b"", final=True))
+    if pending:
+        flush()
+
+    batch.status = 'completed'
+    batch.imported_at = datetime.utcnow()
+    db.commit()
+
+    return {
+        "imported_count": imported_count,
+        "error_count": error_count,
+        "errors": errors
+    }
@@ -0,0 +1,71 @@
+from typing import List, Dict, Set, Iterable
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert
+from types import SimpleNamespace
+from app.database import RawDeal
+from app.services.near_dupes import index_deals
+
+# Stay well under SQLite's bound-parameter limit (999 on older builds)
+HASH_LOOKUP_CHUNK_SIZE = 500
+
+RAW_DEAL_FIELDS = [
+    'raw_title',
+    'raw_description',
+    'raw_discount',
+    'raw_validity',
+    'raw_merchant',
+    'raw_image_url',
+    'raw_terms',
+    'scraped_url',
+]
+
+def find_existing_hashes(db: Session, hashes: Iterable[str]) -> Set[str]:
+    hashes = [h for h in set(hashes) if h]
+    existing = set()
+    for i in range(0, len(hashes), HASH_LOOKUP_CHUNK_SIZE):
+        chunk = hashes[i:i + HASH_LOOKUP_CHUNK_SIZE]
+        rows = db.query(RawDeal.content_hash).filter(RawDeal.content_hash.in_(chunk)).all()
+        existing.update(row[0] for row in rows)
+    return existing
+
+def insert_raw_deals(db: Session, source_id: int, deals_data: List[Dict], status: str = 'new') -> Dict:
+    existing = find_existing_hashes(db, (d.get('content_hash') for d in deals_data))
+
+    seen = set()
+    rows = []
+    duplicate_count = 0
+    for deal_data in deals_data:
+        content_hash = deal_data.get('content_hash')
+        if content_hash and (content_hash in existing or content_hash in seen):
+            duplicate_count += 1
+            continue
+        if content_hash:
+            seen.add(content_hash)
+
+        row = {field: deal_data.get(field) for field in RAW_DEAL_FIELDS}
+        row['source_id'] = source_id
+        row['content_hash'] = content_hash
+        row['status'] = status
+        rows.append(row)
+
+    returned = []
+    if rows:
+        # Rows that lose a race with a concurrent ingest are skipped by the
+        # unique index on content_hash and simply not returned.
+        stmt = insert(RawDeal).on_conflict_do_nothing().returning(RawDeal.id, RawDeal.content_hash)
+        returned = db.execute(stmt, rows).all()
+
+    rows_by_hash = {row['content_hash']: row for row in rows if row['content_hash']}
+    near_duplicates = index_deals(db, [
+        SimpleNamespace(id=raw_deal_id, **rows_by_hash[content_hash])
+        for raw_deal_id, content_hash in returned if content_hash in rows_by_hash
+    ])
+
+    return {
+        "total_found": len(deals_data),
+        "new_deals": len(returned),
+        "duplicates": duplicate_count + len(rows) - len(returned),
+        "near_duplicates": len(near_duplicates),
+        "inserted": {content_hash: raw_deal_id for raw_deal_id, content_hash in returned if content_hash},
+        "inserted_ids": [raw_deal_id for raw_deal_id, _ in returned]
+    }
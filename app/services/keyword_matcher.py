@@ -0,0 +1,74 @@
+"""
+Multi-keyword substring matching with an Aho-Corasick automaton.
+
+All brand, premium and category keywords are compiled into one automaton at
+import, so finding every keyword in a merchant name is a single pass over
+the name however long the keyword lists get.
+"""
+from typing import Dict, List, Iterable, Hashable, Optional
+from collections import deque
+from app.config import POPULAR_BRANDS, PREMIUM_KEYWORDS, LIFESTYLE_KEYWORDS, CATEGORY_KEYWORDS
+
+class KeywordMatcher:
+    def __init__(self, groups: Dict[Hashable, Iterable[str]]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                if keyword:
+                    self._add(keyword.lower(), label)
+        self._link()
+
+    def _add(self, keyword: str, label: Hashable):
+        state = 0
+        for ch in keyword:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.output[state].append((label, keyword))
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                # A state also ends every keyword its fail state ends
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: Optional[str]) -> Dict[Hashable, List[str]]:
+        """Every keyword found in text (case-insensitive substrings), by label, in order of appearance."""
+        hits = {}
+        state = 0
+        for ch in (text or "").lower():
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for label, keyword in self.output[state]:
+                found = hits.setdefault(label, [])
+                if keyword not in found:
+                    found.append(keyword)
+        return hits
+
+deal_keywords = KeywordMatcher({
+    "brand": POPULAR_BRANDS,
+    "premium": PREMIUM_KEYWORDS,
+    "lifestyle": LIFESTYLE_KEYWORDS,
+    # The same category can appear twice in CATEGORY_KEYWORDS, so label by position
+    **{("category", i): keywords for i, (_, keywords) in enumerate(CATEGORY_KEYWORDS)},
+})
+
+def infer_category(merchant: Optional[str], hits: Optional[Dict] = None) -> str:
+    hits = deal_keywords.find(merchant) if hits is None else hits
+    for i, (category, _) in enumerate(CATEGORY_KEYWORDS):
+        if ("category", i) in hits:
+            return category
+    return "other"
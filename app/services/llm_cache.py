@@ -0,0 +1,131 @@
+"""
+Persistent cache of LLM structuring results, keyed by the normalized raw deal
+text plus a hash of the prompt template. The same offer scraped again, or
+listed by another bank, is structured once; editing LLM_PROMPT_TEMPLATE
+starts a new prompt version and older entries stop matching.
+"""
+from typing import Dict, Set, Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime, timedelta
+import threading
+import hashlib
+import json
+from app.config import LLM_PROMPT_TEMPLATE, LLM_CACHE_ENABLED
+from app.database import RawDeal, LLMCacheEntry
+
+PROMPT_VERSION = hashlib.sha256(LLM_PROMPT_TEMPLATE.encode()).hexdigest()[:16]
+
+# The fields the LLM sees, minus the source name so identical offers from
+# different banks share an entry
+CACHE_FIELDS = ['raw_title', 'raw_description', 'raw_merchant', 'raw_discount', 'raw_validity', 'raw_terms']
+
+LOOKUP_CHUNK_SIZE = 500
+
+def normalize(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+def cache_key(raw_deal: RawDeal, prompt_version: str = PROMPT_VERSION) -> str:
+    fields = [normalize(getattr(raw_deal, field)) for field in CACHE_FIELDS]
+    return hashlib.sha256(json.dumps([prompt_version] + fields).encode()).hexdigest()
+
+class CacheMetrics:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    def record(self, hits: int = 0, misses: int = 0, stores: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.stores += stores
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+# Per-process counters since startup; per-entry hit counts live in the table
+metrics = CacheMetrics()
+
+def lookup(db: Session, keys: Iterable[str]) -> Dict[str, Dict]:
+    keys = list(set(keys))
+    if not LLM_CACHE_ENABLED or not keys:
+        return {}
+
+    found = {}
+    now = datetime.utcnow()
+    for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+        rows = db.query(LLMCacheEntry.cache_key, LLMCacheEntry.result_json).filter(
+            LLMCacheEntry.cache_key.in_(chunk)
+        ).all()
+        if rows:
+            db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.cache_key.in_([key for key, _ in rows])
+            ).update(
+                {LLMCacheEntry.hits: LLMCacheEntry.hits + 1, LLMCacheEntry.last_hit_at: now},
+                synchronize_session=False
+            )
+        found.update((key, json.loads(result)) for key, result in rows)
+
+    metrics.record(hits=len(found), misses=len(keys) - len(found))
+    return found
+
+def peek(db: Session, keys: Iterable[str]) -> Set[str]:
+    keys = list(set(keys))
+    if not LLM_CACHE_ENABLED:
+        return set()
+    present = set()
+    for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+        present.update(row[0] for row in db.query(LLMCacheEntry.cache_key).filter(LLMCacheEntry.cache_key.in_(chunk)).all())
+    return present
+
+def store(db: Session, results: Dict[str, Dict]):
+    if not LLM_CACHE_ENABLED or not results:
+        return
+    now = datetime.utcnow()
+    stmt = insert(LLMCacheEntry)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LLMCacheEntry.cache_key],
+        set_={"result_json": stmt.excluded.result_json, "created_at": stmt.excluded.created_at}
+    )
+    db.execute(stmt, [
+        {"cache_key": key, "prompt_version": PROMPT_VERSION, "result_json": json.dumps(result), "hits": 0, "created_at": now}
+        for key, result in results.items()
+    ])
+    metrics.record(stores=len(results))
+
+def evict(db: Session, older_than_days: Optional[int] = None, stale_versions: bool = False) -> int:
+    query = db.query(LLMCacheEntry)
+    if older_than_days is not None:
+        query = query.filter(LLMCacheEntry.created_at < datetime.utcnow() - timedelta(days=older_than_days))
+    if stale_versions:
+        query = query.filter(LLMCacheEntry.prompt_version != PROMPT_VERSION)
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def cache_stats(db: Session) -> Dict:
+    rows = db.query(
+        LLMCacheEntry.prompt_version, func.count(), func.coalesce(func.sum(LLMCacheEntry.hits), 0)
+    ).group_by(LLMCacheEntry.prompt_version).all()
+    current = next(((count, hits) for version, count, hits in rows if version == PROMPT_VERSION), (0, 0))
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "prompt_version": PROMPT_VERSION,
+        "entries": sum(count for _, count, _ in rows),
+        "current_version_entries": current[0],
+        "stale_entries": sum(count for version, count, _ in rows if version != PROMPT_VERSION),
+        "total_hits": sum(hits for _, _, hits in rows),
+        "process": metrics.snapshot()
+    }
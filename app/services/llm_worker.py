@@ -0,0 +1,331 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, joinedload
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import threading
+import requests
+import json
+import time
+import re
+from app.config import (
+    LLM_PROVIDER, LLM_API_URL, LLM_API_KEY, LLM_MODEL, LLM_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE, LLM_MAX_RETRIES, LLM_REQUEST_TIMEOUT_SECONDS, LLM_WORKERS
+)
+from app.database import SessionLocal, ProcessingBatch, BatchDeal, RawDeal
+from app.models import ImportDeal
+from app.services.batch_import import batch_deal_export, load_temp_id_map, import_deals
+from app.services.batch_planner import build_prompt, compact_deals, pack_deals
+from app.services.stats import stats_cache
+from app.services import llm_cache
+
+MAX_REPORTED_ERRORS = 50
+
+class LLMError(Exception):
+    pass
+
+class LLMProvider(ABC):
+    name = ""
+    cacheable = True  # whether results go into the LLM response cache
+
+    @abstractmethod
+    def complete(self, prompt: str) -> str:
+        pass
+
+class StubProvider(LLMProvider):
+    """Offline provider that structures deals with fixed rules, for tests and local runs."""
+    name = "stub"
+    cacheable = False
+
+    CATEGORY_KEYWORDS = {
+        "dining": ["restaurant", "cafe", "coffee", "food", "burger", "pizza", "dining"],
+        "travel": ["hotel", "flight", "airline", "travel", "resort"],
+        "shopping": ["store", "shop", "fashion", "mall", "electronics"],
+        "entertainment": ["cinema", "movie", "tickets", "games"],
+        "health": ["clinic", "pharmacy", "gym", "fitness", "spa"],
+        "automotive": ["car", "fuel", "tyre", "tire", "auto"],
+        "education": ["school", "course", "academy", "university"],
+    }
+
+    def complete(self, prompt: str) -> str:
+        deals = json.loads(prompt.rsplit("DEALS TO PROCESS:", 1)[1])
+        return json.dumps([self.structure(deal) for deal in deals])
+
+    def structure(self, deal: Dict) -> Dict:
+        text = " ".join(str(deal.get(field) or "") for field in ("raw_title", "raw_description", "raw_discount"))
+        discount_value, discount_type = None, "other"
+        match = re.search(r"(\d+)\s*%", text)
+        if match:
+            discount_value, discount_type = f"{match.group(1)}%", "percentage"
+        else:
+            match = re.search(r"SAR\s*(\d+)", text, re.IGNORECASE)
+            if match:
+                discount_value, discount_type = f"SAR {match.group(1)}", "fixed_amount"
+
+        lowered = text.lower()
+        category = next(
+            (name for name, words in self.CATEGORY_KEYWORDS.items() if any(w in lowered for w in words)),
+            "other"
+        )
+        dates = re.findall(r"\d{4}-\d{2}-\d{2}", deal.get("raw_validity") or "")
+
+        return {
+            "temp_id": deal["temp_id"],
+            "merchant_name": (deal.get("raw_merchant") or deal.get("raw_title") or "Unknown").strip(),
+            "offer_title": (deal.get("raw_title") or "").strip(),
+            "description": deal.get("raw_description"),
+            "discount_value": discount_value,
+            "discount_type": discount_type,
+            "category": category,
+            "valid_from": dates[0] if len(dates) > 1 else None,
+            "valid_until": dates[-1] if dates else None,
+            "location": None,
+            "applicable_cards": None,
+            "terms_conditions": deal.get("raw_terms"),
+            "promo_code": None
+        }
+
+class OpenAICompatibleProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_url: str = LLM_API_URL, api_key: str = LLM_API_KEY, model: str = LLM_MODEL):
+        if not api_key:
+            raise ValueError("LLM_API_KEY is not set")
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+
+    def complete(self, prompt: str) -> str:
+        try:
+            response = requests.post(
+                f"{self.api_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0
+                },
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS
+            )
+        except requests.RequestException as e:
+            raise LLMError(f"Request failed: {e}")
+        if response.status_code != 200:
+            raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError):
+            raise LLMError("Unexpected response shape")
+
+PROVIDERS = {
+    StubProvider.name: StubProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+}
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    name = name or LLM_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    return PROVIDERS[name]()
+
+class TokenBucket:
+    """Blocking rate limiter shared by the request threads of one run."""
+
+    def __init__(self, rate_per_minute: int, capacity: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, rate_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def parse_response(text: str) -> List:
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```[a-zA-Z]*\s*|\s*```$", "", text)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise LLMError(f"Response is not valid JSON: {e.msg}")
+    if isinstance(data, dict):
+        data = data.get("deals")
+    if not isinstance(data, list):
+        raise LLMError("Response is not a JSON array of deals")
+    return data
+
+def structure_chunk(
+    provider: LLMProvider,
+    bucket: TokenBucket,
+    deals: List[Dict],
+    max_retries: int = LLM_MAX_RETRIES
+) -> Tuple[List[ImportDeal], List[str]]:
+    prompt = build_prompt(deals)
+    last_error = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(2 ** (attempt - 1))
+        bucket.acquire()
+        try:
+            items = parse_response(provider.complete(prompt))
+            break
+        except LLMError as e:
+            last_error = e
+    else:
+        raise LLMError(f"Gave up after {max_retries + 1} attempts: {last_error}")
+
+    expected = {deal["temp_id"] for deal in deals}
+    structured = []
+    errors = []
+    for item in items:
+        try:
+            deal = ImportDeal.model_validate(item)
+        except ValidationError as e:
+            errors.append(f"temp_id {item.get('temp_id') if isinstance(item, dict) else '?'}: {e.errors()[0]['msg']}")
+            continue
+        if deal.temp_id not in expected:
+            errors.append(f"temp_id {deal.temp_id}: not in this chunk")
+            continue
+        expected.discard(deal.temp_id)
+        structured.append(deal)
+    errors.extend(f"temp_id {temp_id}: missing from response" for temp_id in sorted(expected))
+    return structured, errors
+
+def run_llm_batch(
+    batch_id: int,
+    provider_name: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    concurrency: Optional[int] = None
+) -> Dict:
+    """
+    Structure every not-yet-imported deal of a batch through an LLM provider.
+    Prompts go out concurrently; their results are imported in this thread as
+    they arrive, so a failed chunk leaves the others imported and the failed
+    deals can be retried by running the batch again.
+    """
+    concurrency = concurrency or LLM_CONCURRENCY
+    started = time.time()
+    db = SessionLocal()
+    batch = None
+    try:
+        batch = db.query(ProcessingBatch).filter(ProcessingBatch.id == batch_id).first()
+        if not batch:
+            raise ValueError(f"Batch {batch_id} not found")
+        provider = get_provider(provider_name)
+
+        pending = db.query(BatchDeal).options(
+            joinedload(BatchDeal.raw_deal).joinedload(RawDeal.source)
+        ).filter(
+            BatchDeal.batch_id == batch_id,
+            BatchDeal.structured_deal_id.is_(None)
+        ).order_by(BatchDeal.temp_id).all()
+        temp_id_map = load_temp_id_map(db, batch_id)
+
+        # Deals structured before (in any batch) are imported straight from the cache
+        keys = {bd.temp_id: llm_cache.cache_key(bd.raw_deal) for bd in pending}
+        found = llm_cache.lookup(db, keys.values())
+        cached = [
+            ImportDeal.model_validate(dict(found[keys[bd.temp_id]], temp_id=bd.temp_id))
+            for bd in pending if keys[bd.temp_id] in found
+        ]
+        imported_count = 0
+        if cached:
+            imported_count = import_deals(db, batch_id, temp_id_map, cached, cache=False)["imported_count"]
+            db.commit()
+
+        deals = [batch_deal_export(bd) for bd in pending if keys[bd.temp_id] not in found]
+        chunks = [compact_deals([deals[i] for i in group]) for group in pack_deals(deals, token_budget)]
+        bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+
+        failed_chunks = 0
+        errors = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(structure_chunk, provider, bucket, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    structured, chunk_errors = future.result()
+                except Exception as e:
+                    failed_chunks += 1
+                    errors.append(f"temp_ids {chunk[0]['temp_id']}-{chunk[-1]['temp_id']}: {e}")
+                    continue
+                result = import_deals(db, batch_id, temp_id_map, structured, cache=provider.cacheable)
+                db.commit()
+                imported_count += result["imported_count"]
+                errors.extend(chunk_errors)
+
+        summary = {
+            "success": not errors,
+            "batch_id": batch_id,
+            "provider": provider.name,
+            "pending_deals": len(pending),
+            "cached_deals": len(cached),
+            "chunks_total": len(chunks),
+            "chunks_failed": failed_chunks,
+            "imported_count": imported_count,
+            "error_count": len(errors),
+            "errors": errors[:MAX_REPORTED_ERRORS],
+            "elapsed_seconds": round(time.time() - started, 2)
+        }
+        batch.status = 'failed' if pending and not imported_count else 'completed'
+        if imported_count:
+            batch.imported_at = datetime.utcnow()
+        batch.notes = json.dumps(summary)
+        db.commit()
+        print(f"LLM batch {batch_id}: imported {imported_count}/{len(pending)} deals in {summary['elapsed_seconds']}s")
+        return summary
+    except Exception as e:
+        db.rollback()
+        if batch is not None:
+            batch.status = 'failed'
+            batch.notes = json.dumps({"success": False, "batch_id": batch_id, "errors": [str(e)]})
+            db.commit()
+        raise
+    finally:
+        stats_cache.invalidate()
+        db.close()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm-batch")
+        return _executor
+
+def shutdown_workers():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def run_llm_batch_safely(batch_id: int, provider_name: Optional[str] = None):
+    try:
+        run_llm_batch(batch_id, provider_name)
+    except Exception as e:
+        print(f"LLM batch {batch_id} failed: {e}")
+
+def enqueue_llm_batch(db: Session, batch: ProcessingBatch, provider_name: Optional[str] = None):
+    batch.status = 'processing'
+    db.commit()
+    get_executor().submit(run_llm_batch_safely, batch.id, provider_name)
+
+def recover_batches(db: Session):
+    interrupted = db.query(ProcessingBatch).filter(ProcessingBatch.status == 'processing').all()
+    for batch in interrupted:
+        batch.status = 'failed'
+        batch.notes = json.dumps({"success": False, "batch_id": batch.id, "errors": ["Interrupted by server restart"]})
+    db.commit()
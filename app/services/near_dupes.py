@@ -0,0 +1,191 @@
+"""
+Near-duplicate detection for raw deals.
+
+Each deal gets a MinHash signature over the words of its title, merchant and
+discount, so "20% off at Roka" and "Roka - 20% OFF" hash alike. Signatures
+are split into LSH bands and every band is stored as one row in lsh_buckets;
+deals sharing any bucket are candidates, and only candidates are compared.
+A new deal is never compared against the whole table.
+"""
+from typing import List, Dict, Tuple, Set, Optional, Iterable
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from array import array
+import hashlib
+import random
+import zlib
+import re
+from app.config import NEAR_DUP_THRESHOLD, LSH_BANDS, LSH_ROWS_PER_BAND
+from app.database import RawDeal, RawDealSignature, LSHBucket
+
+NUM_PERMUTATIONS = LSH_BANDS * LSH_ROWS_PER_BAND
+MERSENNE_PRIME = (1 << 31) - 1
+LOOKUP_CHUNK_SIZE = 500
+REBUILD_CHUNK_SIZE = 1000
+
+STOPWORDS = {"a", "an", "and", "at", "for", "from", "in", "of", "on", "the", "to", "with", "get", "enjoy"}
+
+_rng = random.Random(20240229)  # fixed seed: stored signatures must stay comparable
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+def shingles(title: Optional[str], merchant: Optional[str], discount: Optional[str]) -> Set[str]:
+    text = " ".join(value or "" for value in (title, merchant, discount)).lower()
+    return {word for word in re.findall(r"\w+", text) if word not in STOPWORDS}
+
+def minhash(tokens: Set[str]) -> array:
+    signature = array("I", [MERSENNE_PRIME] * NUM_PERMUTATIONS)
+    for token in tokens:
+        x = zlib.crc32(token.encode()) & MERSENNE_PRIME
+        for i, (a, b) in enumerate(PERMUTATIONS):
+            value = (a * x + b) % MERSENNE_PRIME
+            if value < signature[i]:
+                signature[i] = value
+    return signature
+
+def signature_for(deal) -> Optional[array]:
+    tokens = shingles(deal.raw_title, deal.raw_merchant, deal.raw_discount)
+    return minhash(tokens) if tokens else None
+
+def band_buckets(signature: array) -> List[int]:
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS_PER_BAND:(band + 1) * LSH_ROWS_PER_BAND]
+        digest = hashlib.blake2b(band.to_bytes(2, "little") + rows.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+def similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+def load_signatures(db: Session, raw_deal_ids: Iterable[int]) -> Dict[int, array]:
+    raw_deal_ids = list(raw_deal_ids)
+    signatures = {}
+    for i in range(0, len(raw_deal_ids), LOOKUP_CHUNK_SIZE):
+        chunk = raw_deal_ids[i:i + LOOKUP_CHUNK_SIZE]
+        for raw_deal_id, blob in db.query(RawDealSignature.raw_deal_id, RawDealSignature.signature).filter(
+            RawDealSignature.raw_deal_id.in_(chunk)
+        ).all():
+            signatures[raw_deal_id] = array("I", blob)
+    return signatures
+
+def find_bucket_matches(db: Session, buckets: Iterable[int]) -> Dict[int, Set[int]]:
+    buckets = list(set(buckets))
+    matches = {}
+    for i in range(0, len(buckets), LOOKUP_CHUNK_SIZE):
+        chunk = buckets[i:i + LOOKUP_CHUNK_SIZE]
+        for raw_deal_id, bucket in db.query(LSHBucket.raw_deal_id, LSHBucket.bucket).filter(LSHBucket.bucket.in_(chunk)).all():
+            matches.setdefault(bucket, set()).add(raw_deal_id)
+    return matches
+
+def load_roots(db: Session, raw_deal_ids: Iterable[int]) -> Dict[int, int]:
+    raw_deal_ids = list(raw_deal_ids)
+    roots = {}
+    for i in range(0, len(raw_deal_ids), LOOKUP_CHUNK_SIZE):
+        chunk = raw_deal_ids[i:i + LOOKUP_CHUNK_SIZE]
+        for raw_deal_id, root in db.query(RawDeal.id, RawDeal.near_duplicate_of).filter(RawDeal.id.in_(chunk)).all():
+            roots[raw_deal_id] = root or raw_deal_id
+    return roots
+
+def index_deals(db: Session, deals: List, threshold: float = NEAR_DUP_THRESHOLD) -> Dict[int, Tuple[int, float]]:
+    """
+    Sign and index newly inserted raw deals (anything with id, raw_title,
+    raw_merchant and raw_discount) and flag each one that is at least
+    `threshold` similar to an earlier deal. Flags point at the earlier
+    deal's cluster root, so clusters stay one level deep. Returns
+    {raw_deal_id: (near_duplicate_of, score)} for the flagged deals.
+    """
+    signatures = {deal.id: signature_for(deal) for deal in deals}
+    # A deal with no words has nothing to compare
+    deals = sorted((deal for deal in deals if signatures[deal.id] is not None), key=lambda d: d.id)
+    if not deals:
+        return {}
+    signatures = {deal.id: signatures[deal.id] for deal in deals}
+    buckets = {raw_deal_id: band_buckets(signature) for raw_deal_id, signature in signatures.items()}
+
+    db_matches = find_bucket_matches(db, (b for deal_buckets in buckets.values() for b in deal_buckets))
+    db_candidates = {raw_deal_id for ids in db_matches.values() for raw_deal_id in ids} - set(signatures)
+    known_signatures = load_signatures(db, db_candidates)
+    roots = load_roots(db, db_candidates)
+
+    flagged = {}
+    batch_matches = {}
+    for deal in deals:
+        signature = signatures[deal.id]
+        candidates = set()
+        for bucket in buckets[deal.id]:
+            candidates.update(db_matches.get(bucket, ()))
+            candidates.update(batch_matches.get(bucket, ()))
+            batch_matches.setdefault(bucket, set()).add(deal.id)
+        candidates.discard(deal.id)
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            other = known_signatures.get(candidate)
+            if other is None:
+                continue
+            score = similarity(signature, other)
+            if score > best_score or (score == best_score and best is not None and candidate < best):
+                best, best_score = candidate, score
+
+        known_signatures[deal.id] = signature
+        roots[deal.id] = deal.id
+        if best is not None and best_score >= threshold:
+            roots[deal.id] = roots.get(best, best)
+            flagged[deal.id] = (roots[deal.id], round(best_score, 3))
+
+    db.bulk_insert_mappings(RawDealSignature, [
+        {"raw_deal_id": raw_deal_id, "signature": signature.tobytes()}
+        for raw_deal_id, signature in signatures.items()
+    ])
+    db.bulk_insert_mappings(LSHBucket, [
+        {"raw_deal_id": raw_deal_id, "band": band, "bucket": bucket}
+        for raw_deal_id, deal_buckets in buckets.items()
+        for band, bucket in enumerate(deal_buckets)
+    ])
+    if flagged:
+        db.execute(update(RawDeal), [
+            {"id": raw_deal_id, "near_duplicate_of": root, "near_duplicate_score": score}
+            for raw_deal_id, (root, score) in flagged.items()
+        ])
+    return flagged
+
+def find_similar(db: Session, deal: RawDeal, threshold: float = 0.0) -> List[Tuple[int, float]]:
+    """Live LSH lookup of the deals similar to one deal, best first."""
+    signature = signature_for(deal)
+    if signature is None:
+        return []
+    matches = find_bucket_matches(db, band_buckets(signature))
+    candidates = {raw_deal_id for ids in matches.values() for raw_deal_id in ids} - {deal.id}
+    scored = [
+        (raw_deal_id, round(similarity(signature, other), 3))
+        for raw_deal_id, other in load_signatures(db, candidates).items()
+    ]
+    return sorted((item for item in scored if item[1] >= threshold), key=lambda item: (-item[1], item[0]))
+
+def rebuild_index(db: Session) -> Dict:
+    """Re-sign every raw deal and recompute all flags, oldest first."""
+    db.query(LSHBucket).delete(synchronize_session=False)
+    db.query(RawDealSignature).delete(synchronize_session=False)
+    db.query(RawDeal).filter(RawDeal.near_duplicate_of.is_not(None)).update(
+        {RawDeal.near_duplicate_of: None, RawDeal.near_duplicate_score: None},
+        synchronize_session=False
+    )
+    db.commit()
+
+    indexed = 0
+    flagged = 0
+    last_id = 0
+    while True:
+        chunk = db.query(RawDeal.id, RawDeal.raw_title, RawDeal.raw_merchant, RawDeal.raw_discount).filter(
+            RawDeal.id > last_id
+        ).order_by(RawDeal.id).limit(REBUILD_CHUNK_SIZE).all()
+        if not chunk:
+            break
+        flagged += len(index_deals(db, chunk))
+        db.commit()
+        indexed += len(chunk)
+        last_id = chunk[-1].id
+    return {"indexed": indexed, "flagged": flagged}
@@ -0,0 +1,231 @@
+"""
+Cross-bank offer groups.
+
+The same merchant often runs an offer at several banks at once. Structured
+deals are grouped by normalized merchant name and kind of discount
+(percentage, fixed amount, ...), and a deal joins a group only if its
+validity overlaps the group's. Groups are maintained as deals are inserted:
+only the groups a new deal can join are loaded, and a deal that bridges two
+groups merges them.
+"""
+from typing import List, Dict, Optional, Iterable
+from sqlalchemy import update, select, func
+from sqlalchemy.orm import Session
+from datetime import date
+import unicodedata
+import re
+from app.config import DISCOUNT_TYPES
+from app.database import StructuredDeal, RawDeal, Source, OfferGroup
+
+LOOKUP_CHUNK_SIZE = 500
+REBUILD_CHUNK_SIZE = 1000
+
+# Words that vary between banks' listings of the same merchant
+MERCHANT_STOPWORDS = {"the", "restaurant", "restaurants", "cafe", "ksa", "saudi", "arabia", "llc", "co", "company"}
+
+def merchant_key(name: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    # Joined without spaces so "Al Baik" and "AlBaik" match
+    return "".join(word for word in re.findall(r"[a-z0-9]+", text.replace("&", " and ")) if word not in MERCHANT_STOPWORDS)
+
+def discount_kind(value: Optional[str], discount_type: Optional[str] = None) -> str:
+    if discount_type in DISCOUNT_TYPES and discount_type != "other":
+        return discount_type
+    text = (value or "").lower()
+    if "%" in text or "percent" in text:
+        return "percentage"
+    if re.search(r"\bbuy\b.*\bget\b", text):
+        return "buy_x_get_y"
+    if re.search(r"\d", text) and re.search(r"\b(sar|sr|riyals?)\b", text):
+        return "fixed_amount"
+    return "other"
+
+def discount_amount(value: Optional[str]) -> Optional[float]:
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", value or "")]
+    return max(numbers) if numbers else None
+
+def overlaps(a_from: Optional[date], a_until: Optional[date], b_from: Optional[date], b_until: Optional[date]) -> bool:
+    # A missing date is open-ended
+    return (a_from is None or b_until is None or a_from <= b_until) and (b_from is None or a_until is None or b_from <= a_until)
+
+def widen(group: OfferGroup, valid_from: Optional[date], valid_until: Optional[date]):
+    group.valid_from = None if group.valid_from is None or valid_from is None else min(group.valid_from, valid_from)
+    group.valid_until = None if group.valid_until is None or valid_until is None else max(group.valid_until, valid_until)
+
+def load_deals(db: Session, deal_ids: List[int]) -> List:
+    deals = []
+    for i in range(0, len(deal_ids), LOOKUP_CHUNK_SIZE):
+        chunk = deal_ids[i:i + LOOKUP_CHUNK_SIZE]
+        deals.extend(db.query(
+            StructuredDeal.id, StructuredDeal.merchant_name, StructuredDeal.discount_value, StructuredDeal.discount_type,
+            StructuredDeal.category, StructuredDeal.valid_from, StructuredDeal.valid_until
+        ).filter(StructuredDeal.id.in_(chunk), StructuredDeal.offer_group_id.is_(None)).all())
+    return sorted(deals, key=lambda d: d.id)
+
+def load_groups(db: Session, merchant_keys: Iterable[str]) -> Dict[tuple, List[OfferGroup]]:
+    merchant_keys = list(set(merchant_keys))
+    groups = {}
+    for i in range(0, len(merchant_keys), LOOKUP_CHUNK_SIZE):
+        chunk = merchant_keys[i:i + LOOKUP_CHUNK_SIZE]
+        for group in db.query(OfferGroup).filter(OfferGroup.merchant_key.in_(chunk)).order_by(OfferGroup.id).all():
+            groups.setdefault((group.merchant_key, group.discount_kind), []).append(group)
+    return groups
+
+def refresh_counts(db: Session, group_ids: Iterable[int]):
+    group_ids = list(group_ids)
+    deals_count = select(func.count(StructuredDeal.id)).where(
+        StructuredDeal.offer_group_id == OfferGroup.id
+    ).scalar_subquery()
+    banks_count = select(func.count(func.distinct(RawDeal.source_id))).select_from(StructuredDeal).join(
+        RawDeal, RawDeal.id == StructuredDeal.raw_deal_id
+    ).where(StructuredDeal.offer_group_id == OfferGroup.id).scalar_subquery()
+    for i in range(0, len(group_ids), LOOKUP_CHUNK_SIZE):
+        chunk = group_ids[i:i + LOOKUP_CHUNK_SIZE]
+        db.execute(
+            update(OfferGroup).where(OfferGroup.id.in_(chunk)).values(deals_count=deals_count, banks_count=banks_count),
+            execution_options={"synchronize_session": False}
+        )
+
+def assign_groups(db: Session, deal_ids: Iterable[int]) -> Dict:
+    """Put ungrouped structured deals into offer groups, creating or merging groups as needed."""
+    deals = [d for d in load_deals(db, list(deal_ids)) if merchant_key(d.merchant_name)]
+    if not deals:
+        return {"grouped": 0, "groups_created": 0, "groups_merged": 0}
+
+    keys = {d.id: (merchant_key(d.merchant_name), discount_kind(d.discount_value, d.discount_type)) for d in deals}
+    groups = load_groups(db, (key[0] for key in keys.values()))
+    absorbed = {}
+    created = []
+    assigned = {}
+
+    for deal in deals:
+        key = keys[deal.id]
+        candidates = [g for g in groups.get(key, []) if overlaps(g.valid_from, g.valid_until, deal.valid_from, deal.valid_until)]
+        if not candidates:
+            target = OfferGroup(
+                merchant_key=key[0],
+                discount_kind=key[1],
+                merchant_name=deal.merchant_name,
+                category=deal.category,
+                valid_from=deal.valid_from,
+                valid_until=deal.valid_until,
+                deals_count=0,
+                banks_count=0
+            )
+            created.append(target)
+            groups.setdefault(key, []).append(target)
+        else:
+            # Groups keep creation order, so the oldest group survives a merge
+            target = candidates[0]
+            for other in candidates[1:]:
+                widen(target, other.valid_from, other.valid_until)
+                absorbed[other] = target
+                groups[key].remove(other)
+            widen(target, deal.valid_from, deal.valid_until)
+        assigned[deal.id] = target
+
+    def resolve(group):
+        while group in absorbed:
+            group = absorbed[group]
+        return group
+
+    db.add_all([group for group in created if group not in absorbed])
+    db.flush()
+
+    merged = [group for group in absorbed if group.id is not None]
+    for group in merged:
+        db.execute(
+            update(StructuredDeal).where(StructuredDeal.offer_group_id == group.id).values(offer_group_id=resolve(group).id),
+            execution_options={"synchronize_session": False}
+        )
+        db.delete(group)
+
+    db.execute(update(StructuredDeal), [
+        {"id": deal_id, "offer_group_id": resolve(group).id}
+        for deal_id, group in assigned.items()
+    ])
+    db.flush()
+    refresh_counts(db, {resolve(group).id for group in assigned.values()})
+
+    return {
+        "grouped": len(assigned),
+        "groups_created": len([group for group in created if group not in absorbed]),
+        "groups_merged": len(merged)
+    }
+
+def remove_from_group(db: Session, deal: StructuredDeal):
+    """Take a deal out of its group, shrinking or dropping the group."""
+    group = deal.offer_group
+    if group is None:
+        return
+    deal.offer_group_id = None
+    db.flush()
+
+    spans = db.query(StructuredDeal.valid_from, StructuredDeal.valid_until).filter(
+        StructuredDeal.offer_group_id == group.id
+    ).all()
+    if not spans:
+        db.delete(group)
+        return
+    group.valid_from, group.valid_until = spans[0]
+    for valid_from, valid_until in spans[1:]:
+        widen(group, valid_from, valid_until)
+    db.flush()
+    refresh_counts(db, [group.id])
+
+def regroup_deal(db: Session, deal: StructuredDeal):
+    remove_from_group(db, deal)
+    db.flush()
+    assign_groups(db, [deal.id])
+
+def rebuild_groups(db: Session) -> Dict:
+    db.query(StructuredDeal).filter(StructuredDeal.offer_group_id.is_not(None)).update(
+        {StructuredDeal.offer_group_id: None}, synchronize_session=False
+    )
+    db.query(OfferGroup).delete(synchronize_session=False)
+    db.commit()
+
+    grouped = 0
+    last_id = 0
+    while True:
+        chunk = [row[0] for row in db.query(StructuredDeal.id).filter(
+            StructuredDeal.id > last_id
+        ).order_by(StructuredDeal.id).limit(REBUILD_CHUNK_SIZE).all()]
+        if not chunk:
+            break
+        grouped += assign_groups(db, chunk)["grouped"]
+        db.commit()
+        last_id = chunk[-1]
+    return {"grouped": grouped, "groups": db.query(func.count(OfferGroup.id)).scalar()}
+
+def best_by_bank(db: Session, group_ids: List[int]) -> Dict[int, List[Dict]]:
+    """The best active deal each bank has in each group, best discount first."""
+    rows = db.query(
+        StructuredDeal.offer_group_id, StructuredDeal.id, StructuredDeal.offer_title, StructuredDeal.discount_value,
+        StructuredDeal.valid_until, StructuredDeal.is_active, Source.name
+    ).outerjoin(RawDeal, RawDeal.id == StructuredDeal.raw_deal_id).outerjoin(
+        Source, Source.id == RawDeal.source_id
+    ).filter(StructuredDeal.offer_group_id.in_(group_ids)).order_by(StructuredDeal.id).all() if group_ids else []
+
+    best = {}
+    # is_active is checked here: filtering on it in SQL can steer SQLite to the
+    # is_active index and away from offer_group_id
+    for group_id, deal_id, offer_title, discount_value, valid_until, is_active, bank in rows:
+        if not is_active:
+            continue
+        bank = bank or "Unknown"
+        amount = discount_amount(discount_value)
+        current = best.setdefault(group_id, {}).get(bank)
+        if current is None or (amount or 0) > (current["discount_amount"] or 0):
+            best[group_id][bank] = {
+                "bank": bank,
+                "deal_id": deal_id,
+                "offer_title": offer_title,
+                "discount_value": discount_value,
+                "discount_amount": amount,
+                "valid_until": valid_until.isoformat() if valid_until else None
+            }
+    return {
+        group_id: sorted(banks.values(), key=lambda b: (-(b["discount_amount"] or 0), b["bank"]))
+        for group_id, banks in best.items()
+    }
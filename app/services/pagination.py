@@ -0,0 +1,36 @@
+from typing import List, Tuple, Optional
+from sqlalchemy import tuple_
+from datetime import datetime
+import base64
+import binascii
+import json
+
+COUNT_MODES = ["exact", "estimated", "none"]
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    payload = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(payload)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+def apply_keyset(query, timestamp_column, id_column, cursor: Optional[str]):
+    # Newest first. The row-value comparison lets SQLite seek straight to the
+    # cursor position in the (timestamp, rowid) index instead of skipping rows.
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    return query.order_by(timestamp_column.desc(), id_column.desc())
+
+def split_page(rows: List, limit: int, key) -> Tuple[List, Optional[str]]:
+    # Callers fetch limit + 1 rows; the extra one only says whether a next page exists
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    timestamp, row_id = key(rows[-1])
+    return rows, encode_cursor(timestamp, row_id)
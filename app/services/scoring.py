@@ -0,0 +1,220 @@
+"""
+Deal scoring from the declarative rules in app.config.SCORING_RULES.
+
+Scores whole chunks at once with NumPy. Discounts, merchant names and
+categories repeat a lot, so the regex and keyword work is done once per
+distinct value and spread back over the chunk. Every automatic rating stores
+the rule version and a hash of the fields it was scored from, so a rescore
+only rewrites ratings that are stale. Manual ratings are left alone unless
+the rescore is a full one.
+"""
+from typing import List, Dict, Tuple, Sequence, Optional, Callable
+from sqlalchemy import insert, update, or_, and_
+from sqlalchemy.orm import Session
+from datetime import datetime
+import numpy as np
+import hashlib
+import re
+from app.config import RESCORE_CHUNK_SIZE, QUALITY_SCORES, SCORING_RULES
+from app.database import StructuredDeal, Rating
+from app.services.keyword_matcher import deal_keywords
+
+RULE_VERSION = SCORING_RULES["version"]
+
+DISCOUNT_NUMBER = re.compile(r"(\d+)")
+
+def inputs_hash(merchant: Optional[str], discount: Optional[str], category: Optional[str]) -> str:
+    return hashlib.md5(f"{merchant or ''}|{discount or ''}|{category or ''}".encode()).hexdigest()
+
+def distinct_values(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    strings = np.array(["" if v is None else str(v) for v in values], dtype=object)
+    return np.unique(strings, return_inverse=True)
+
+def spread(per_value: List, inverse: np.ndarray, dtype) -> np.ndarray:
+    return np.array(per_value, dtype=dtype)[inverse] if per_value else np.zeros(len(inverse), dtype=dtype)
+
+def discount_percentages(discounts: Sequence[Optional[str]]) -> np.ndarray:
+    unique, inverse = distinct_values(discounts)
+    return spread([
+        int(match.group(1)) if (match := DISCOUNT_NUMBER.search(value)) else 0
+        for value in unique
+    ], inverse, np.int64)
+
+def keyword_flags(merchants: Sequence[Optional[str]], rules: Dict = SCORING_RULES) -> np.ndarray:
+    """Boolean matrix: one row per merchant, one column per keyword_points rule."""
+    labels = [label for label, _, _ in rules["keyword_points"]]
+    unique, inverse = distinct_values(merchants)
+    hits = [deal_keywords.find(value) for value in unique]
+    return spread([[label in found for label in labels] for found in hits], inverse, bool).reshape(len(inverse), len(labels))
+
+def category_indexes(categories: Sequence[Optional[str]], rules: Dict = SCORING_RULES) -> np.ndarray:
+    """Index into rules["category_points"] for each category, -1 for none."""
+    names = list(rules["category_points"])
+    unique, inverse = distinct_values(categories)
+    return spread([names.index(value.lower()) if value.lower() in names else -1 for value in unique], inverse, np.int64)
+
+def score_arrays(pct: np.ndarray, keywords: np.ndarray, category: np.ndarray, rules: Dict = SCORING_RULES) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    tiers = rules["discount_tiers"]
+    tier = np.select([pct >= minimum for minimum, _, _ in tiers], list(range(len(tiers))), -1)
+    tier_points = np.array([points for _, points, _ in tiers] + [0])
+    keyword_points = np.array([points for _, points, _ in rules["keyword_points"]], dtype=np.int64)
+    category_rules = list(rules["category_points"].values())
+    category_points = np.array([points for points, _ in category_rules] + [0])
+
+    scores = rules["base_score"] + tier_points[tier] + (pct == 0) * rules["no_discount_points"]
+    if len(keyword_points):
+        scores = scores + keywords.astype(np.int64) @ keyword_points
+    scores = scores + category_points[category]
+    scores = np.clip(scores, rules["min_score"], rules["max_score"])
+
+    thresholds = rules["quality_thresholds"]
+    qualities = np.array([quality for _, quality in thresholds] + [rules["default_quality"]], dtype=object)[
+        np.select([scores >= minimum for minimum, _ in thresholds], list(range(len(thresholds))), len(thresholds))
+    ]
+
+    reasons = {}
+    def reason(p, t, k, c):
+        key = (p, t, k, c)
+        if key not in reasons:
+            parts = []
+            if t >= 0 and tiers[t][2]:
+                parts.append(f"{tiers[t][2]} ({p}%)")
+            parts.extend(label for hit, (_, _, label) in zip(k, rules["keyword_points"]) if hit and label)
+            if c >= 0 and category_rules[c][1]:
+                parts.append(category_rules[c][1])
+            reasons[key] = "; ".join(parts) if parts else rules["default_reason"]
+        return reasons[key]
+
+    return scores, qualities, [
+        reason(p, t, tuple(k), c)
+        for p, t, k, c in zip(pct.tolist(), tier.tolist(), keywords.tolist(), category.tolist())
+    ]
+
+def score_deals(
+    merchants: Sequence[Optional[str]],
+    discounts: Sequence[Optional[str]],
+    categories: Sequence[Optional[str]],
+    rules: Dict = SCORING_RULES
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """(scores, qualities, reasons) for parallel lists of merchants, discounts and categories."""
+    return score_arrays(
+        discount_percentages(discounts), keyword_flags(merchants, rules), category_indexes(categories, rules), rules
+    )
+
+def score_deal(merchant: Optional[str], discount: Optional[str], category: Optional[str]) -> Tuple[int, str, str]:
+    scores, qualities, reasons = score_deals([merchant], [discount], [category])
+    return int(scores[0]), qualities[0], reasons[0]
+
+def rating_fields(merchant: Optional[str], discount: Optional[str], category: Optional[str]) -> Dict:
+    """Column values for a new automatic Rating of one deal."""
+    score, quality, reason = score_deal(merchant, discount, category)
+    return {
+        "quality_score": quality,
+        "reason": reason,
+        "llm_score": score,
+        "llm_reasoning": reason,
+        "rule_version": RULE_VERSION,
+        "inputs_hash": inputs_hash(merchant, discount, category),
+        "source": "auto"
+    }
+
+def upsert_ratings(db: Session, rows: List[Dict], rating_ids: Dict[int, int]) -> Dict:
+    updates = []
+    inserts = []
+    for row in rows:
+        if row["deal_id"] in rating_ids:
+            updates.append({"id": rating_ids[row["deal_id"]], **{k: v for k, v in row.items() if k != "deal_id"}})
+        else:
+            inserts.append(row)
+    if updates:
+        db.execute(update(Rating), updates)
+    if inserts:
+        db.execute(insert(Rating), inserts)
+    return {"updated": len(updates), "inserted": len(inserts)}
+
+def rescore(
+    db: Session,
+    full: bool = False,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    Rescore deals whose automatic rating is missing, was scored with other
+    rules, or was scored from different merchant/discount/category values.
+    full=True rescores every deal, replacing manual ratings too. Commits each
+    chunk.
+    """
+    totals = {"checked": 0, "rescored": 0, "updated": 0, "inserted": 0}
+    totals.update({quality: 0 for quality in QUALITY_SCORES})
+    query = db.query(
+        StructuredDeal.id, StructuredDeal.merchant_name, StructuredDeal.discount_value, StructuredDeal.category,
+        Rating.id, Rating.rule_version, Rating.inputs_hash
+    ).outerjoin(Rating, Rating.deal_id == StructuredDeal.id)
+    if not full:
+        # Cheap candidate filter in SQL; inputs_hash decides for edited deals
+        query = query.filter(or_(
+            Rating.id.is_(None),
+            and_(Rating.source.is_distinct_from("manual"), or_(
+                Rating.rule_version.is_(None),
+                Rating.rule_version != RULE_VERSION,
+                StructuredDeal.updated_at > Rating.rated_at
+            ))
+        ))
+    last_id = 0
+    while True:
+        rows = query.filter(StructuredDeal.id > last_id).order_by(StructuredDeal.id, Rating.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        seen = set()
+        rating_ids = {}
+        stale = []
+        unchanged = []
+        for deal_id, merchant, discount, category, rating_id, rule_version, scored_hash in rows:
+            # A deal with several ratings is rated by its oldest one
+            if deal_id in seen:
+                continue
+            seen.add(deal_id)
+            if rating_id is not None:
+                rating_ids[deal_id] = rating_id
+            current_hash = inputs_hash(merchant, discount, category)
+            if full or rating_id is None or rule_version != RULE_VERSION or scored_hash != current_hash:
+                stale.append((deal_id, merchant, discount, category, current_hash))
+            else:
+                # Edited, but not in a scored field: mark checked so it leaves the candidates
+                unchanged.append(rating_id)
+        totals["checked"] += len(seen)
+
+        if unchanged:
+            db.execute(update(Rating), [{"id": rating_id, "rated_at": datetime.utcnow()} for rating_id in unchanged])
+            db.commit()
+
+        if stale:
+            deal_ids, merchants, discounts, categories, hashes = (list(column) for column in zip(*stale))
+            scores, qualities, reasons = score_deals(merchants, discounts, categories)
+            rated_at = datetime.utcnow()
+            result = upsert_ratings(db, [
+                {
+                    "deal_id": deal_id,
+                    "quality_score": quality,
+                    "reason": reason,
+                    "llm_score": score,
+                    "llm_reasoning": reason,
+                    "rule_version": RULE_VERSION,
+                    "inputs_hash": current_hash,
+                    "source": "auto",
+                    "rated_at": rated_at
+                }
+                for deal_id, score, quality, reason, current_hash in zip(deal_ids, scores.tolist(), qualities.tolist(), reasons, hashes)
+            ], rating_ids)
+            db.commit()
+
+            totals["rescored"] += len(stale)
+            totals["updated"] += result["updated"]
+            totals["inserted"] += result["inserted"]
+            for quality, count in zip(*np.unique(qualities, return_counts=True)):
+                totals[quality] += int(count)
+        if progress:
+            progress(totals)
+    return totals
@@ -0,0 +1,119 @@
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import json
+from app.config import SCRAPE_JOB_WORKERS
+from app.database import SessionLocal, ScrapeJob, Source
+from app.scrapers.runner import ScraperRunner
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SCRAPE_JOB_WORKERS, thread_name_prefix="scrape-job")
+        return _executor
+
+def shutdown_workers():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def enqueue_scrape_job(
+    db: Session,
+    source_id: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[int] = None
+) -> ScrapeJob:
+    job = ScrapeJob(source_id=source_id, status='queued')
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    get_executor().submit(run_scrape_job, job.id, max_workers, timeout)
+    return job
+
+def recover_jobs(db: Session):
+    interrupted = db.query(ScrapeJob).filter(ScrapeJob.status == 'running').all()
+    for job in interrupted:
+        job.status = 'failed'
+        job.error = "Interrupted by server restart"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+
+    queued = db.query(ScrapeJob).filter(ScrapeJob.status == 'queued').all()
+    for job in queued:
+        get_executor().submit(run_scrape_job, job.id)
+
+def run_scrape_job(job_id: int, max_workers: Optional[int] = None, timeout: Optional[int] = None):
+    db = SessionLocal()
+    job = None
+    try:
+        queued_job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+        if not queued_job or queued_job.status != 'queued':
+            return
+        job = queued_job
+
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        if job.source_id:
+            job.sources_total = 1
+        else:
+            job.sources_total = db.query(Source).filter(Source.is_active == True).count()
+        db.commit()
+
+        results = []
+
+        def on_result(result: Dict):
+            results.append(result)
+            job.sources_done = len(results)
+            if result.get("success"):
+                job.total_found += result.get("total_found", 0)
+                job.new_deals += result.get("new_deals", 0)
+                job.duplicates += result.get("duplicates", 0)
+            db.commit()
+
+        runner = ScraperRunner(db)
+        if job.source_id:
+            on_result(runner.run_scraper(job.source_id))
+        else:
+            runner.run_all_scrapers(max_workers=max_workers, timeout=timeout, on_result=on_result)
+
+        errors = [f"{r.get('source', 'Unknown')}: {r['error']}" for r in results if not r.get("success")]
+        job.result_json = json.dumps(results)
+        job.error = "; ".join(errors) if errors else None
+        job.status = 'failed' if errors else 'completed'
+    except Exception as e:
+        db.rollback()
+        if job is not None:
+            job.status = 'failed'
+            job.error = str(e)
+    finally:
+        if job is not None:
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        db.close()
+
+def job_to_dict(job: ScrapeJob) -> Dict:
+    return {
+        "id": job.id,
+        "source_id": job.source_id,
+        "source_name": job.source.name if job.source else None,
+        "status": job.status,
+        "progress": round(job.sources_done / job.sources_total * 100, 1) if job.sources_total else 0,
+        "sources_total": job.sources_total,
+        "sources_done": job.sources_done,
+        "total_found": job.total_found,
+        "new_deals": job.new_deals,
+        "duplicates": job.duplicates,
+        "error": job.error,
+        "results": json.loads(job.result_json) if job.result_json else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
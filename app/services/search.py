@@ -0,0 +1,40 @@
+from typing import Optional
+from sqlalchemy import text, Integer, Float, String
+import html
+import re
+
+# Column weights for bm25(), in index column order:
+# merchant_name, offer_title, description, terms_conditions
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 0.5)
+
+SNIPPET_TOKENS = 12
+
+# Control characters never found in scraped text, swapped for <mark> only
+# after the snippet has been HTML-escaped
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+def build_match_query(search: str) -> Optional[str]:
+    # Every word must match, and the last one may be partially typed.
+    # Words are quoted so user input never reaches FTS5 query syntax.
+    tokens = re.findall(r'\w+', search.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def search_subquery(match_query: str):
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return text(
+        f"SELECT rowid AS deal_id, "
+        f"bm25(structured_deals_fts, {weights}) AS rank, "
+        f"snippet(structured_deals_fts, -1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM structured_deals_fts WHERE structured_deals_fts MATCH :match_query"
+    ).bindparams(match_query=match_query).columns(
+        deal_id=Integer, rank=Float, snippet=String
+    ).subquery("search")
+
+def snippet_html(snippet: Optional[str]) -> Optional[str]:
+    """Escape a search snippet for innerHTML, keeping the match highlights."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
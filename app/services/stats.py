@@ -0,0 +1,96 @@
+from typing import Dict, Optional
+from sqlalchemy import select, literal, func, union_all, Integer
+from sqlalchemy.orm import Session
+from datetime import datetime
+import threading
+import time
+from app.config import STATS_CACHE_TTL_SECONDS, QUALITY_SCORES
+from app.database import RawDeal, StructuredDeal, Rating, Source
+
+def compute_snapshot(db: Session) -> Dict:
+    # Every counter the dashboard needs, from one grouped statement
+    counts = union_all(
+        select(
+            literal("raw").label("kind"), RawDeal.source_id.label("source_id"),
+            RawDeal.status.label("key"), func.count().label("count")
+        ).group_by(RawDeal.source_id, RawDeal.status),
+        select(
+            literal("structured"), literal(None, Integer),
+            StructuredDeal.category, func.count()
+        ).group_by(StructuredDeal.category),
+        select(
+            literal("rating"), literal(None, Integer),
+            Rating.quality_score, func.count()
+        ).group_by(Rating.quality_score),
+    )
+
+    raw = {"total": 0, "by_status": {}, "by_source": {}}
+    structured = {"total": 0, "by_category": {}}
+    ratings = {"total": 0}
+    ratings.update({quality: 0 for quality in QUALITY_SCORES})
+
+    for kind, source_id, key, count in db.execute(counts).all():
+        if kind == "raw":
+            raw["total"] += count
+            raw["by_status"][key] = raw["by_status"].get(key, 0) + count
+            by_source = raw["by_source"].setdefault(source_id, {"total": 0, "by_status": {}})
+            by_source["total"] += count
+            by_source["by_status"][key] = count
+        elif kind == "structured":
+            structured["total"] += count
+            structured["by_category"][key] = count
+        else:
+            ratings["total"] += count
+            ratings[key] = ratings.get(key, 0) + count
+
+    sources = [
+        {
+            "id": s.id,
+            "name": s.name,
+            "type": s.type,
+            "last_scraped": s.last_scraped_at.isoformat() if s.last_scraped_at else None,
+            "deal_count": raw["by_source"].get(s.id, {}).get("total", 0),
+            "is_active": s.is_active
+        }
+        for s in db.query(Source).all()
+    ]
+
+    return {
+        "raw": raw,
+        "structured": structured,
+        "ratings": ratings,
+        "sources": sources,
+        "computed_at": datetime.utcnow().isoformat()
+    }
+
+def estimate_raw_count(snapshot: Dict, source_id: Optional[int] = None, status: Optional[str] = None) -> int:
+    raw = snapshot["raw"]
+    if source_id:
+        raw = raw["by_source"].get(source_id, {"total": 0, "by_status": {}})
+    return raw["by_status"].get(status, 0) if status else raw["total"]
+
+def estimate_structured_count(snapshot: Dict, category: Optional[str] = None) -> int:
+    structured = snapshot["structured"]
+    return structured["by_category"].get(category, 0) if category else structured["total"]
+
+class StatsCache:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Dict:
+        with self._lock:
+            if self._snapshot is None or time.monotonic() >= self._expires_at:
+                self._snapshot = compute_snapshot(db)
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+# Per-process: with several uvicorn workers, writes made by another worker
+# show up once the TTL runs out.
+stats_cache = StatsCache(STATS_CACHE_TTL_SECONDS)
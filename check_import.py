@@ -0,0 +1,104 @@
+"""
+Stream LLM result uploads of more than one IMPORT_CHUNK_SIZE chunk into
+scratch databases and check what was imported: every deal, with "Same as
+temp_id N" terms resolved even when deal N was committed in an earlier chunk,
+the raw deal's own terms when deal N is missing from the upload, and no
+temp_id reference stored in the LLM cache.
+
+Usage: python check_import.py
+"""
+import sys
+import os
+import json
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import IMPORT_CHUNK_SIZE
+from app.database import Source, RawDeal, StructuredDeal, LLMCacheEntry
+from app.services.batch_import import create_processing_batch
+from app.services.batch_planner import shared_terms_reference
+from app.services.import_stream import import_stream
+from check_queries import create_scratch_session
+
+OPTIONAL_FIELDS = [
+    "description", "discount_value", "discount_type", "category", "valid_from",
+    "valid_until", "location", "applicable_cards", "promo_code"
+]
+TERMS = "Valid on all credit cards. Not valid with other offers."
+
+def raw_terms(temp_id):
+    return f"Scraped terms of offer {temp_id}"
+
+def seed(db, count):
+    source = Source(name="Alrajhi Bank", type="website", url="https://alrajhi.example")
+    db.add(source)
+    db.flush()
+    # create_processing_batch numbers deals by id, so deal i gets temp_id i
+    raw = [
+        RawDeal(source_id=source.id, raw_title=f"Offer {i}", raw_merchant=f"Merchant {i}", raw_terms=raw_terms(i), content_hash=f"hash-{i}")
+        for i in range(1, count + 1)
+    ]
+    db.add_all(raw)
+    db.flush()
+    batch = create_processing_batch(db, raw, name="Check import")
+    db.commit()
+    return batch
+
+def upload(temp_ids):
+    # Shaped like an LLM answer to a compacted export: only deal 1 spells out the terms
+    lines = [
+        json.dumps({
+            "temp_id": temp_id,
+            "merchant_name": f"Merchant {temp_id}",
+            "offer_title": f"Offer {temp_id}",
+            **{field: None for field in OPTIONAL_FIELDS},
+            "terms_conditions": TERMS if temp_id == 1 else shared_terms_reference(1)
+        })
+        for temp_id in temp_ids
+    ]
+    data = ("\n".join(lines) + "\n").encode()
+
+    async def chunks():
+        for start in range(0, len(data), 64 * 1024):
+            yield data[start:start + 64 * 1024]
+    return chunks()
+
+def check(name, count, temp_ids, expected_terms) -> int:
+    engine, db = create_scratch_session()
+    batch = seed(db, count)
+
+    result = asyncio.run(import_stream(db, batch, upload(temp_ids)))
+    wrong_terms = sum(
+        terms != expected_terms(offer_title)
+        for offer_title, terms in db.query(StructuredDeal.offer_title, StructuredDeal.terms_conditions).all()
+    )
+    cached_references = db.query(LLMCacheEntry).filter(LLMCacheEntry.result_json.like("%Same as temp_id%")).count()
+    db.close()
+
+    problems = []
+    if result["imported_count"] != len(temp_ids) or result["error_count"]:
+        problems.append(f"imported {result['imported_count']} of {len(temp_ids)} deals, {result['error_count']} errors")
+    if wrong_terms:
+        problems.append(f"{wrong_terms} deals have the wrong terms")
+    if cached_references:
+        problems.append(f"{cached_references} cached results hold a temp_id reference")
+
+    print(f"{'FAIL' if problems else 'ok  '} {name} ({len(temp_ids)} deals, chunks of {IMPORT_CHUNK_SIZE})")
+    for problem in problems:
+        print(f"       {problem}")
+    return bool(problems)
+
+def main():
+    count = IMPORT_CHUNK_SIZE * 2 + 200
+    failures = check("import_stream", count, range(1, count + 1), lambda title: TERMS)
+    failures += check(
+        "import_stream[referenced deal missing]", count, range(2, count + 1),
+        lambda title: raw_terms(int(title.split()[-1]))
+    )
+    if failures:
+        print(f"\n{failures} check(s) failed")
+        sys.exit(1)
+    print("\nAll checks passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Run the API's read endpoints against a seeded scratch database and check the
+SQL they issue with EXPLAIN QUERY PLAN. Fails if any query does a full table
+scan that is not explicitly allowed, or if a listing endpoint issues more
+statements for a bigger page or a bigger table (lazy relationship loads per
+row).
+
+Usage: python check_queries.py [-v]
+"""
+import sys
+import os
+import re
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.database import (
+    Base, Source, RawDeal, StructuredDeal, Rating, ProcessingBatch, BatchDeal, ScrapeJob
+)
+from app.migrations import run_migrations
+from app.routers import dashboard, scrapers, raw_deals, llm_processing, structured_deals, ratings
+from app.services.stats import stats_cache
+from app.services.pagination import encode_cursor
+from app.services.near_dupes import rebuild_index
+from app.services.offer_groups import rebuild_groups
+
+# Lookup tables with a handful of rows; scanning them is cheaper than an index
+SMALL_TABLES = {"sources", "users"}
+
+# Endpoints that read a whole table on purpose
+ALLOWED_SCANS = {
+    "structured_deals.export_deals": {"structured_deals"},
+}
+
+# Page sizes compared by the statement-count check. A page of one row touches
+# one source, so a per-row lazy load shows up even though sources are few.
+PAGE_SIZES = [1, 50]
+
+# Raw deal counts seeded for endpoints with a fixed page size, which are
+# compared across scratch databases instead of page sizes
+SEED_SIZES = [1, 50]
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+def create_scratch_session():
+    path = os.path.join(tempfile.mkdtemp(), "check.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    return engine, sessionmaker(bind=engine)()
+
+def seed(db, raw_count=300):
+    sources = [Source(name=name, type="website", url=f"https://{name.lower()}.example") for name in ["Alrajhi Bank", "Riyad Bank", "SAB Bank"]]
+    db.add_all(sources)
+    db.flush()
+
+    now = datetime.utcnow()
+    statuses = ["new", "processing", "processed", "duplicate"]
+    categories = ["dining", "shopping", "travel", "lifestyle"]
+    qualities = ["good", "mediocre", "bad"]
+    raw = []
+    for i in range(raw_count):
+        deal = RawDeal(
+            source_id=sources[i % 3].id,
+            raw_title=f"{10 + i % 40}% off at Merchant {i}",
+            raw_merchant=f"Merchant {i}",
+            raw_discount=f"{10 + i % 40}%",
+            content_hash=f"hash-{i}",
+            status=statuses[i % 4],
+            scraped_at=now - timedelta(minutes=i)
+        )
+        raw.append(deal)
+    db.add_all(raw)
+    db.flush()
+
+    structured = []
+    for i, deal in enumerate(raw[: max(1, raw_count * 2 // 3)]):
+        structured.append(StructuredDeal(
+            raw_deal_id=deal.id,
+            merchant_name=deal.raw_merchant,
+            offer_title=deal.raw_title,
+            description=f"Offer description {i}",
+            discount_value=deal.raw_discount,
+            category=categories[i % 4],
+            created_at=now - timedelta(minutes=i)
+        ))
+    db.add_all(structured)
+    db.flush()
+
+    db.add_all([
+        Rating(deal_id=deal.id, quality_score=qualities[i % 3], llm_score=5)
+        for i, deal in enumerate(structured) if i % 2 == 0
+    ])
+
+    batch = ProcessingBatch(name="Check batch", status="created", deals_count=20)
+    db.add(batch)
+    db.flush()
+    db.add_all([BatchDeal(batch_id=batch.id, raw_deal_id=deal.id) for deal in raw[:20]])
+    db.add_all([ScrapeJob(source_id=sources[i % 3].id, status="completed") for i in range(10)])
+    db.commit()
+    rebuild_index(db)
+    rebuild_groups(db)
+    return {"source_id": sources[0].id, "raw_deal_id": raw[0].id, "deal_id": structured[0].id, "batch_id": batch.id, "group_id": db.query(StructuredDeal.offer_group_id).filter(StructuredDeal.id == structured[0].id).scalar()}
+
+def raw_cursor(db):
+    deal = db.query(RawDeal).order_by(RawDeal.scraped_at.desc(), RawDeal.id.desc()).offset(100).first()
+    return encode_cursor(deal.scraped_at, deal.id)
+
+def deals_cursor(db):
+    deal = db.query(StructuredDeal).order_by(StructuredDeal.created_at.desc(), StructuredDeal.id.desc()).offset(100).first()
+    return encode_cursor(deal.created_at, deal.id)
+
+def endpoint_calls(ids):
+    return [
+        ("dashboard.get_dashboard_summary", lambda db: dashboard.get_dashboard_summary(db=db)),
+        ("dashboard.get_dashboard_stats", lambda db: dashboard.get_dashboard_stats(db=db)),
+        ("dashboard.get_recent_activity", lambda db: dashboard.get_recent_activity(db=db)),
+        ("dashboard.get_sources_status", lambda db: dashboard.get_sources_status(db=db)),
+        ("scrapers.list_sources", lambda db: scrapers.list_sources(db=db)),
+        ("scrapers.list_jobs", lambda db: scrapers.list_jobs(limit=20, db=db)),
+        ("raw_deals.list_raw_deals", lambda db: raw_deals.list_raw_deals(source_id=None, status=None, limit=50, offset=0, db=db)),
+        ("raw_deals.list_raw_deals[status]", lambda db: raw_deals.list_raw_deals(source_id=None, status="new", limit=50, offset=0, db=db)),
+        ("raw_deals.list_raw_deals[source]", lambda db: raw_deals.list_raw_deals(source_id=ids["source_id"], status=None, limit=50, offset=0, db=db)),
+        ("raw_deals.list_raw_deals[cursor]", lambda db: raw_deals.list_raw_deals(source_id=None, status=None, limit=50, offset=0, cursor=raw_cursor(db), count="none", db=db)),
+        ("raw_deals.list_raw_deals[status,cursor]", lambda db: raw_deals.list_raw_deals(source_id=None, status="new", limit=20, offset=0, cursor=raw_cursor(db), count="estimated", db=db)),
+        ("raw_deals.list_near_duplicate_clusters", lambda db: raw_deals.list_near_duplicate_clusters(limit=50, offset=0, db=db)),
+        ("raw_deals.get_near_duplicates", lambda db: raw_deals.get_near_duplicates(ids["raw_deal_id"], threshold=None, db=db)),
+        ("raw_deals.get_raw_deal", lambda db: raw_deals.get_raw_deal(ids["raw_deal_id"], db=db)),
+        ("llm_processing.list_batches", lambda db: llm_processing.list_batches(db=db)),
+        ("llm_processing.get_batch", lambda db: llm_processing.get_batch(ids["batch_id"], db=db)),
+        ("llm_processing.get_cache_stats", lambda db: llm_processing.get_cache_stats(db=db)),
+        ("structured_deals.list_deals", lambda db: structured_deals.list_deals(category=None, search=None, limit=50, offset=0, db=db)),
+        ("structured_deals.list_deals[category]", lambda db: structured_deals.list_deals(category="dining", search=None, limit=50, offset=0, db=db)),
+        ("structured_deals.list_deals[search]", lambda db: structured_deals.list_deals(category=None, search="merch", limit=50, offset=0, db=db)),
+        ("structured_deals.list_deals[cursor]", lambda db: structured_deals.list_deals(category=None, search=None, limit=50, offset=0, cursor=deals_cursor(db), count="none", db=db)),
+        ("structured_deals.list_deals[category,cursor]", lambda db: structured_deals.list_deals(category="dining", search=None, limit=20, offset=0, cursor=deals_cursor(db), count="estimated", db=db)),
+        ("structured_deals.get_deal", lambda db: structured_deals.get_deal(ids["deal_id"], db=db)),
+        ("structured_deals.list_offer_groups", lambda db: structured_deals.list_offer_groups(category=None, merchant=None, min_banks=1, limit=50, offset=0, db=db)),
+        ("structured_deals.list_offer_groups[merchant,min_banks]", lambda db: structured_deals.list_offer_groups(category=None, merchant="merchant 1", min_banks=2, limit=50, offset=0, db=db)),
+        ("structured_deals.get_offer_group", lambda db: structured_deals.get_offer_group(ids["group_id"], db=db)),
+        ("structured_deals.export_deals", lambda db: structured_deals.export_deals(category=None, db=db)),
+        ("ratings.get_pending_ratings", lambda db: ratings.get_pending_ratings(limit=20, db=db)),
+        ("ratings.get_rating_stats", lambda db: ratings.get_rating_stats(db=db)),
+        ("ratings.get_deal_rating", lambda db: ratings.get_deal_rating(ids["deal_id"], db=db)),
+    ]
+
+def listing_calls(ids):
+    return [
+        ("scrapers.list_jobs", lambda db, size: scrapers.list_jobs(limit=size, db=db)),
+        ("raw_deals.list_raw_deals", lambda db, size: raw_deals.list_raw_deals(source_id=None, status=None, limit=size, offset=0, db=db)),
+        ("raw_deals.list_raw_deals[cursor]", lambda db, size: raw_deals.list_raw_deals(source_id=None, status=None, limit=size, offset=0, cursor=raw_cursor(db), count="none", db=db)),
+        ("structured_deals.list_deals", lambda db, size: structured_deals.list_deals(category=None, search=None, limit=size, offset=0, db=db)),
+        ("structured_deals.list_deals[search]", lambda db, size: structured_deals.list_deals(category=None, search="merch", limit=size, offset=0, db=db)),
+        ("structured_deals.list_offer_groups", lambda db, size: structured_deals.list_offer_groups(category=None, merchant=None, min_banks=1, limit=size, offset=0, db=db)),
+        ("ratings.get_pending_ratings", lambda db, size: ratings.get_pending_ratings(limit=size, db=db)),
+    ]
+
+def seeded_calls():
+    return [
+        ("dashboard.get_recent_activity", lambda db: dashboard.get_recent_activity(db=db)),
+    ]
+
+def call_endpoint(call, db):
+    stats_cache.invalidate()
+    result = call(db)
+    if asyncio.iscoroutine(result):
+        result = asyncio.run(result)
+    return result
+
+def capture_statements(engine, db, call):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call_endpoint(call, db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.rollback()
+    return statements
+
+def check_query_plans(engine, db, ids, verbose=False) -> int:
+    failures = 0
+    for name, call in endpoint_calls(ids):
+        allowed = SMALL_TABLES | ALLOWED_SCANS.get(name, set())
+        problems = []
+        plans = []
+        with engine.connect() as conn:
+            for statement, parameters in capture_statements(engine, db, call):
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()]
+                plans.append((statement, plan))
+                for detail in plan:
+                    match = FULL_SCAN.match(detail)
+                    if match and match.group(1) not in allowed:
+                        problems.append(f"{detail}  <-  {' '.join(statement.split())[:120]}")
+
+        print(f"{'FAIL' if problems else 'ok  '} {name}")
+        for problem in problems:
+            print(f"       {problem}")
+        if verbose:
+            for statement, plan in plans:
+                print(f"       {' '.join(statement.split())[:120]}")
+                for detail in plan:
+                    print(f"         {detail}")
+        failures += bool(problems)
+    return failures
+
+def check_query_counts(engine, db, ids) -> int:
+    failures = 0
+    for name, call in listing_calls(ids):
+        counts = [
+            len(capture_statements(engine, db, lambda db, size=size: call(db, size)))
+            for size in PAGE_SIZES
+        ]
+        failed = len(set(counts)) > 1
+        summary = ", ".join(f"limit={size}: {count}" for size, count in zip(PAGE_SIZES, counts))
+        print(f"{'FAIL' if failed else 'ok  '} {name} ({summary})")
+        failures += failed
+    return failures
+
+def check_seeded_counts() -> int:
+    failures = 0
+    for name, call in seeded_calls():
+        counts = []
+        for size in SEED_SIZES:
+            engine, db = create_scratch_session()
+            seed(db, raw_count=size)
+            counts.append(len(capture_statements(engine, db, call)))
+            db.close()
+        failed = len(set(counts)) > 1
+        summary = ", ".join(f"rows={size}: {count}" for size, count in zip(SEED_SIZES, counts))
+        print(f"{'FAIL' if failed else 'ok  '} {name} ({summary})")
+        failures += failed
+    return failures
+
+def main():
+    verbose = "-v" in sys.argv
+    engine, db = create_scratch_session()
+    ids = seed(db)
+
+    print("Query plans:")
+    failures = check_query_plans(engine, db, ids, verbose)
+
+    print("\nStatement counts:")
+    failures += check_query_counts(engine, db, ids)
+    failures += check_seeded_counts()
+
+    db.close()
+    if failures:
+        print(f"\n{failures} check(s) failed")
+        sys.exit(1)
+    print("\nAll checks passed")
+
+if __name__ == "__main__":
+    main()
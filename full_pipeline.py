@@ -6,10 +6,12 @@ import os
 sys.path.insert(0, '/home/anshad/deal-curation-platform')
 
 from datetime import datetime
-from playwright.sync_api import sync_playwright
-import time
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers import waits
 import hashlib
 from app.database import SessionLocal, RawDeal, StructuredDeal, Rating, Source
+from app.services.offer_groups import assign_groups
+from app.services.scoring import rating_fields
 
 def generate_hash(title, merchant, validity):
     normalized = f"{(title or '').lower().strip()}|{(merchant or '').lower().strip()}|{(validity or '').lower().strip()}"
@@ -35,184 +37,138 @@ def parse_date(date_str):
         pass
     return None
 
-def score_deal(merchant, offer, discount, category):
-    score = 5
-    reasons = []
-    
-    if discount:
-        try:
-            pct = int(discount.replace('%', '').replace('off', '').strip())
-            if pct >= 30:
-                score += 3
-                reasons.append(f"High discount ({pct}%)")
-            elif pct >= 20:
-                score += 2
-                reasons.append(f"Good discount ({pct}%)")
-            elif pct >= 10:
-                score += 1
-        except:
-            pass
-    
-    premium_merchants = ['roka', 'mr chow', 'ruya', 'black tap', 'anantara', 'raffles', 'turkish airline']
-    if any(p in merchant.lower() for p in premium_merchants):
-        score += 2
-        reasons.append("Premium brand")
-    
-    lifestyle_merchants = ['clinic', 'spa', 'salon', 'fitness', 'pilates', 'hotel', 'resort']
-    if any(l in merchant.lower() or l in category.lower() for l in lifestyle_merchants):
-        score += 1
-        reasons.append("Lifestyle deal")
-    
-    rare_categories = ['travel', 'health', 'automotive', 'education']
-    if category.lower() in rare_categories:
-        score += 1
-        reasons.append("Rare category")
-    
-    score = min(10, max(1, score))
-    quality = 'good' if score >= 7 else ('mediocre' if score >= 4 else 'bad')
-    
-    return score, quality, "; ".join(reasons) if reasons else "Standard deal"
-
 def scrape_alrajhi_full():
     print("Scraping Alrajhi Bank...")
+    return browser_pool.run(scrape_alrajhi_offers, source="Alrajhi Bank")
+
+def scrape_alrajhi_offers(context):
     deals = []
+    page = context.new_page()
+    waits.goto(page, "https://www.alrajhibank.com.sa/en/Personal/Offers/CardsOffers", "Alrajhi Bank")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto("https://www.alrajhibank.com.sa/en/Personal/Offers/CardsOffers", timeout=60000)
-        time.sleep(5)
-        page.wait_for_load_state('networkidle')
-        
-        body_text = page.inner_text('body')
-        lines = [l.strip() for l in body_text.split('\n') if l.strip()]
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if 'OFF' in line.upper() or '%' in line:
-                merchant = ""
-                offer_text = line
-                validity = ""
-                
-                for j in range(max(0, i-3), i):
-                    prev = lines[j]
-                    if prev and not any(x in prev.lower() for x in ['skip', 'sign', 'personal', 'business', 'accounts', 'cards', 'finance']):
-                        merchant = prev
-                        break
-                
-                for j in range(i+1, min(len(lines), i+5)):
-                    next_line = lines[j]
-                    if any(m in next_line.lower() for m in ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december']):
-                        validity = next_line
+    body_text = page.inner_text('body')
+    lines = [l.strip() for l in body_text.split('\n') if l.strip()]
+    
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if 'OFF' in line.upper() or '%' in line:
+            merchant = ""
+            offer_text = line
+            validity = ""
+            
+            for j in range(max(0, i-3), i):
+                prev = lines[j]
+                if prev and not any(x in prev.lower() for x in ['skip', 'sign', 'personal', 'business', 'accounts', 'cards', 'finance']):
+                    merchant = prev
+                    break
+            
+            for j in range(i+1, min(len(lines), i+5)):
+                next_line = lines[j]
+                if any(m in next_line.lower() for m in ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december']):
+                    validity = next_line
+                    break
+            
+            if not merchant:
+                merchant = line.split()[0] if line.split() else "Unknown"
+            
+            discount = ""
+            if '%' in line:
+                for word in line.split():
+                    if '%' in word:
+                        discount = word
                         break
-                
-                if not merchant:
-                    merchant = line.split()[0] if line.split() else "Unknown"
-                
-                discount = ""
-                if '%' in line:
-                    for word in line.split():
-                        if '%' in word:
-                            discount = word
-                            break
-                
-                deals.append({
-                    'merchant': merchant.strip(),
-                    'offer': offer_text.strip(),
-                    'discount': discount.strip(),
-                    'validity': validity.strip(),
-                    'category': 'dining',
-                    'source': 'Alrajhi Bank',
-                    'applicable_cards': 'Alrajhi Bank Cards'
-                })
-            i += 1
-        
-        browser.close()
+            
+            deals.append({
+                'merchant': merchant.strip(),
+                'offer': offer_text.strip(),
+                'discount': discount.strip(),
+                'validity': validity.strip(),
+                'category': 'dining',
+                'source': 'Alrajhi Bank',
+                'applicable_cards': 'Alrajhi Bank Cards'
+            })
+        i += 1
     
     return deals
 
 def scrape_sab_full():
     print("Scraping SAB Bank...")
+    return browser_pool.run(scrape_sab_offers, source="SAB Bank")
+
+def scrape_sab_offers(context):
     deals = []
+    page = context.new_page()
+    waits.goto(page, "https://www.sab.com/en/personal/compare-credit-cards/credit-card-special-offers/all-offers/", "SAB Bank")
+    
+    body_text = page.inner_text('body')
+    lines = [l.strip() for l in body_text.split('\n') if l.strip()]
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto("https://www.sab.com/en/personal/compare-credit-cards/credit-card-special-offers/all-offers/", timeout=60000)
-        time.sleep(5)
-        page.wait_for_load_state('networkidle')
+    current_category = ""
+    i = 0
+    while i < len(lines):
+        line = lines[i]
         
-        body_text = page.inner_text('body')
-        lines = [l.strip() for l in body_text.split('\n') if l.strip()]
+        if line.lower() in ['shopping', 'dining & groceries', 'travel', 'lifestyle', 'entertainment', 'health', 'automotive']:
+            current_category = line
+            i += 1
+            continue
         
-        current_category = ""
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            
-            if line.lower() in ['shopping', 'dining & groceries', 'travel', 'lifestyle', 'entertainment', 'health', 'automotive']:
-                current_category = line
-                i += 1
-                continue
+        if 'off' in line.lower() or '%' in line:
+            merchant = ""
+            offer_text = line
+            validity = ""
             
-            if 'off' in line.lower() or '%' in line:
-                merchant = ""
-                offer_text = line
-                validity = ""
-                
-                for j in range(max(0, i-3), i):
-                    prev = lines[j]
-                    if prev and prev.lower() not in ['all', 'dining & groceries', 'shopping', 'travel', 'lifestyle', 'browse by category', 'browse by country']:
-                        if '- KSA' in prev or any(c.isupper() for c in prev[:3]):
-                            merchant = prev.replace('- KSA', '').strip()
-                            break
-                
-                if not merchant:
-                    merchant = current_category
-                
-                for j in range(i+1, min(len(lines), i+8)):
-                    next_line = lines[j]
-                    if any(m in next_line.lower() for m in ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december']):
-                        validity = next_line
-                        break
-                
-                discount = ""
-                if '%' in line:
-                    import re
-                    match = re.search(r'(\d+%)', line)
-                    if match:
-                        discount = match.group(1)
-                
-                applicable = "SAB Credit Cards"
-                for j in range(i, min(len(lines), i+10)):
-                    if 'mada' in lines[j].lower():
-                        applicable = "SAB Credit Cards & Mada Cards"
+            for j in range(max(0, i-3), i):
+                prev = lines[j]
+                if prev and prev.lower() not in ['all', 'dining & groceries', 'shopping', 'travel', 'lifestyle', 'browse by category', 'browse by country']:
+                    if '- KSA' in prev or any(c.isupper() for c in prev[:3]):
+                        merchant = prev.replace('- KSA', '').strip()
                         break
-                
-                cat_map = {
-                    'dining & groceries': 'dining',
-                    'shopping': 'shopping',
-                    'travel': 'travel',
-                    'lifestyle': 'lifestyle',
-                    'entertainment': 'entertainment',
-                    'health': 'health',
-                    'automotive': 'automotive'
-                }
-                
-                deals.append({
-                    'merchant': merchant.strip(),
-                    'offer': offer_text.strip(),
-                    'discount': discount.strip(),
-                    'validity': validity.strip(),
-                    'category': cat_map.get(current_category.lower(), 'other'),
-                    'source': 'SAB Bank',
-                    'applicable_cards': applicable
-                })
             
-            i += 1
+            if not merchant:
+                merchant = current_category
+            
+            for j in range(i+1, min(len(lines), i+8)):
+                next_line = lines[j]
+                if any(m in next_line.lower() for m in ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december']):
+                    validity = next_line
+                    break
+            
+            discount = ""
+            if '%' in line:
+                import re
+                match = re.search(r'(\d+%)', line)
+                if match:
+                    discount = match.group(1)
+            
+            applicable = "SAB Credit Cards"
+            for j in range(i, min(len(lines), i+10)):
+                if 'mada' in lines[j].lower():
+                    applicable = "SAB Credit Cards & Mada Cards"
+                    break
+            
+            cat_map = {
+                'dining & groceries': 'dining',
+                'shopping': 'shopping',
+                'travel': 'travel',
+                'lifestyle': 'lifestyle',
+                'entertainment': 'entertainment',
+                'health': 'health',
+                'automotive': 'automotive'
+            }
+            
+            deals.append({
+                'merchant': merchant.strip(),
+                'offer': offer_text.strip(),
+                'discount': discount.strip(),
+                'validity': validity.strip(),
+                'category': cat_map.get(current_category.lower(), 'other'),
+                'source': 'SAB Bank',
+                'applicable_cards': applicable
+            })
         
-        browser.close()
+        i += 1
     
     return deals
 
@@ -235,6 +191,7 @@ def main():
         
         raw_count = 0
         structured_count = 0
+        structured_ids = []
         
         for i, deal in enumerate(all_deals, 1):
             content_hash = generate_hash(deal['merchant'], deal['merchant'], deal['validity'])
@@ -264,13 +221,6 @@ def main():
             
             discount_type = 'percentage' if '%' in deal.get('discount', '') else 'other'
             
-            score, quality, reason = score_deal(
-                deal['merchant'],
-                deal['offer'],
-                deal.get('discount', ''),
-                deal.get('category', 'other')
-            )
-            
             structured_deal = StructuredDeal(
                 raw_deal_id=raw_deal.id,
                 merchant_name=deal['merchant'],
@@ -286,19 +236,18 @@ def main():
             )
             db.add(structured_deal)
             db.flush()
+            structured_ids.append(structured_deal.id)
             structured_count += 1
             
             rating = Rating(
                 deal_id=structured_deal.id,
-                quality_score=quality,
-                reason=reason,
-                llm_score=score,
-                llm_reasoning=f"Auto-scored: {reason}"
+                **rating_fields(structured_deal.merchant_name, structured_deal.discount_value, structured_deal.category)
             )
             db.add(rating)
             
-            print(f"  [{i}/{len(all_deals)}] {deal['merchant'][:30]:30} | {deal.get('discount', 'N/A'):8} | Score: {score}/10 | {quality}")
+            print(f"  [{i}/{len(all_deals)}] {deal['merchant'][:30]:30} | {deal.get('discount', 'N/A'):8} | Score: {rating.llm_score}/10 | {rating.quality_score}")
         
+        assign_groups(db, structured_ids)
         db.commit()
         
         print("\n" + "=" * 60)
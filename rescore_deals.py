@@ -1,63 +1,33 @@
 """
-Re-score all existing deals with new popular-brand-focused logic
+Re-score deals whose rating is missing or stale: scored with an older
+SCORING_RULES version, or from merchant/discount/category values that have
+since changed. Manual ratings are kept; pass --full to rescore every deal,
+replacing them too.
 """
 import sys
+import time
 sys.path.insert(0, '/home/anshad/deal-curation-platform')
 
-from app.database import SessionLocal, StructuredDeal, Rating
-from app.config import score_deal
+from app.database import SessionLocal
+from app.services.scoring import rescore, RULE_VERSION
 
-def rescore_all():
+def rescore_all(full=False):
     db = SessionLocal()
+    started = time.monotonic()
+    print(f"Re-scoring {'all' if full else 'stale'} deals with rules v{RULE_VERSION}...")
     
-    deals = db.query(StructuredDeal).all()
-    print(f"Re-scoring {len(deals)} deals...")
-    
-    good_count = 0
-    mediocre_count = 0
-    bad_count = 0
-    
-    for deal in deals:
-        score, quality, reason = score_deal(
-            deal.merchant_name,
-            deal.discount_value,
-            deal.category
-        )
-        
-        rating = db.query(Rating).filter(Rating.deal_id == deal.id).first()
-        if rating:
-            rating.llm_score = score
-            rating.quality_score = quality
-            rating.reason = reason
-            rating.llm_reasoning = reason
-        else:
-            rating = Rating(
-                deal_id=deal.id,
-                quality_score=quality,
-                reason=reason,
-                llm_score=score,
-                llm_reasoning=reason
-            )
-            db.add(rating)
-        
-        if quality == 'good':
-            good_count += 1
-        elif quality == 'mediocre':
-            mediocre_count += 1
-        else:
-            bad_count += 1
-        
-        print(f"  {deal.merchant_name[:40]:<40} {deal.discount_value or 'N/A':<8} -> {score}/10 {quality}")
-    
-    db.commit()
-    db.close()
+    try:
+        totals = rescore(db, full=full, progress=lambda totals: print(f"  {totals['checked']} checked, {totals['rescored']} rescored"))
+    finally:
+        db.close()
     
     print(f"\n{'='*60}")
     print("RE-SCORING COMPLETE!")
     print(f"{'='*60}")
-    print(f"Good: {good_count}")
-    print(f"Mediocre: {mediocre_count}")
-    print(f"Bad: {bad_count}")
+    print(f"Deals: {totals['checked']} checked, {totals['rescored']} rescored ({totals['updated']} ratings updated, {totals['inserted']} added) in {time.monotonic() - started:.1f}s")
+    print(f"Good: {totals['good']}")
+    print(f"Mediocre: {totals['mediocre']}")
+    print(f"Bad: {totals['bad']}")
 
 if __name__ == "__main__":
-    rescore_all()
+    rescore_all(full="--full" in sys.argv)
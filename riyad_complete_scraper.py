@@ -5,12 +5,14 @@ import sys
 sys.path.insert(0, '/home/anshad/deal-curation-platform')
 
 from datetime import datetime, date
-from playwright.sync_api import sync_playwright
-import time
 import hashlib
 import re
-from app.database import SessionLocal, RawDeal, StructuredDeal, Rating, Source
-from app.config import score_deal
+from app.database import SessionLocal, StructuredDeal, Rating, Source
+from app.services.ingest import insert_raw_deals
+from app.services.offer_groups import assign_groups
+from app.services.scoring import rating_fields
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers import waits
 
 def generate_hash(title, merchant):
     normalized = f"{(title or '').lower().strip()}|{(merchant or '').lower().strip()}"
@@ -48,103 +50,100 @@ def parse_date(date_str):
         pass
     return None
 
-def scrape_riyad_all():
-    print("Scraping Riyad Bank - ALL OFFERS...")
+RIYAD_OFFERS_URL = "https://www.riyadbank.com/personal-banking/credit-cards/offers"
+
+def scrape_riyad_offers(context):
     all_deals = []
+    page = context.new_page()
     
-    base_url = "https://www.riyadbank.com/personal-banking/credit-cards/offers"
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = context.new_page()
+    try:
+        print(f"\n  Loading main page...")
+        waits.goto(page, RIYAD_OFFERS_URL, "Riyad Bank", timeout=120000)
         
-        try:
-            print(f"\n  Loading main page...")
-            page.goto(base_url, timeout=120000, wait_until="domcontentloaded")
-            time.sleep(8)
-            
-            body = page.inner_text('body')
-            print(f"  Page loaded, searching for offer links...")
-            
-            offer_links = page.query_selector_all('a')
-            
-            links = set()
-            for link in offer_links:
-                try:
-                    href = link.get_attribute('href')
-                    text = link.inner_text().strip() if link.inner_text() else ""
-                    if href and len(href) > 5 and len(href) < 80 and not any(x in href for x in ['personal-banking', 'credit-cards/offers', 'finance', 'accounts', 'contact', 'javascript', 'http']):
-                        if text and len(text) > 2:
-                            links.add((href, text))
-                except:
-                    pass
-            
-            print(f"  Found {len(links)} potential offer links")
-            
-            for i, (href, merchant) in enumerate(list(links)[:40], 1):
-                try:
-                    offer_url = f"https://www.riyadbank.com{href}" if href.startswith('/') else href
-                    page.goto(offer_url, timeout=20000)
-                    time.sleep(2)
-                    
-                    offer_body = page.inner_text('body')
-                    
-                    discount = ""
-                    disc_match = re.search(r'(\d+)\s*%', offer_body)
-                    if disc_match:
-                        discount = disc_match.group(1) + '%'
-                    
-                    offer_text = ""
-                    for line in offer_body.split('\n'):
-                        if 'off' in line.lower() or 'discount' in line.lower():
-                            if len(line) > 20:
-                                offer_text = line[:200]
-                                break
-                    
-                    if not offer_text:
-                        offer_text = f"Special offer at {merchant}"
-                    
-                    validity = ""
-                    for line in offer_body.split('\n'):
-                        if 'valid' in line.lower() and any(m in line.lower() for m in ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']):
-                            validity = line[:100]
+        body = page.inner_text('body')
+        print(f"  Page loaded, searching for offer links...")
+        
+        offer_links = page.query_selector_all('a')
+        
+        links = set()
+        for link in offer_links:
+            try:
+                href = link.get_attribute('href')
+                text = link.inner_text().strip() if link.inner_text() else ""
+                if href and len(href) > 5 and len(href) < 80 and not any(x in href for x in ['personal-banking', 'credit-cards/offers', 'finance', 'accounts', 'contact', 'javascript', 'http']):
+                    if text and len(text) > 2:
+                        links.add((href, text))
+            except:
+                pass
+        
+        print(f"  Found {len(links)} potential offer links")
+        
+        for i, (href, merchant) in enumerate(list(links)[:40], 1):
+            try:
+                offer_url = f"https://www.riyadbank.com{href}" if href.startswith('/') else href
+                waits.goto(page, offer_url, "Riyad Bank", "offer", timeout=20000)
+                
+                offer_body = page.inner_text('body')
+                
+                discount = ""
+                disc_match = re.search(r'(\d+)\s*%', offer_body)
+                if disc_match:
+                    discount = disc_match.group(1) + '%'
+                
+                offer_text = ""
+                for line in offer_body.split('\n'):
+                    if 'off' in line.lower() or 'discount' in line.lower():
+                        if len(line) > 20:
+                            offer_text = line[:200]
                             break
+                
+                if not offer_text:
+                    offer_text = f"Special offer at {merchant}"
+                
+                validity = ""
+                for line in offer_body.split('\n'):
+                    if 'valid' in line.lower() and any(m in line.lower() for m in ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']):
+                        validity = line[:100]
+                        break
+                
+                category = "other"
+                lower_text = offer_body.lower()
+                if any(x in lower_text for x in ['restaurant', 'cafe', 'coffee', 'food', 'kitchen', 'grill']):
+                    category = "dining"
+                elif any(x in lower_text for x in ['spa', 'beauty', 'salon', 'clinic']):
+                    category = "lifestyle"
+                elif any(x in lower_text for x in ['hotel', 'resort', 'travel', 'airline']):
+                    category = "travel"
+                elif any(x in lower_text for x in ['shop', 'store', 'fashion']):
+                    category = "shopping"
+                
+                all_deals.append({
+                    'merchant': merchant,
+                    'offer': offer_text,
+                    'discount': discount,
+                    'validity': validity,
+                    'category': category,
+                    'source': 'Riyad Bank',
+                    'applicable_cards': 'Riyad Bank Credit Cards',
+                    'url': offer_url
+                })
+                
+                if i % 5 == 0:
+                    print(f"    Processed {i}/{len(links)} offers...")
                     
-                    category = "other"
-                    lower_text = offer_body.lower()
-                    if any(x in lower_text for x in ['restaurant', 'cafe', 'coffee', 'food', 'kitchen', 'grill']):
-                        category = "dining"
-                    elif any(x in lower_text for x in ['spa', 'beauty', 'salon', 'clinic']):
-                        category = "lifestyle"
-                    elif any(x in lower_text for x in ['hotel', 'resort', 'travel', 'airline']):
-                        category = "travel"
-                    elif any(x in lower_text for x in ['shop', 'store', 'fashion']):
-                        category = "shopping"
-                    
-                    all_deals.append({
-                        'merchant': merchant,
-                        'offer': offer_text,
-                        'discount': discount,
-                        'validity': validity,
-                        'category': category,
-                        'source': 'Riyad Bank',
-                        'applicable_cards': 'Riyad Bank Credit Cards',
-                        'url': offer_url
-                    })
-                    
-                    if i % 5 == 0:
-                        print(f"    Processed {i}/{len(links)} offers...")
-                        
-                except Exception as e:
-                    pass
-            
-        except Exception as e:
-            print(f"  Error: {e}")
+            except Exception as e:
+                pass
         
-        browser.close()
+    except Exception as e:
+        print(f"  Error: {e}")
+    
+    return all_deals
+
+def scrape_riyad_all():
+    print("Scraping Riyad Bank - ALL OFFERS...")
+    all_deals = browser_pool.run(scrape_riyad_offers, source="Riyad Bank", context_options={
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    })
     
     # Deduplicate
     seen = set()
@@ -165,35 +164,34 @@ def save_to_db(deals, source_id):
     try:
         good_count = 0
         mediocre_count = 0
+        structured_ids = []
         
+        raw_rows = []
         for deal in deals:
-            content_hash = generate_hash(deal['offer'], deal['merchant'])
-            
-            raw_deal = RawDeal(
-                source_id=source_id,
-                raw_title=deal['offer'],
-                raw_description=deal['offer'],
-                raw_discount=deal.get('discount', ''),
-                raw_validity=deal.get('validity', ''),
-                raw_merchant=deal['merchant'],
-                content_hash=content_hash,
-                status='processed',
-                scraped_url=deal.get('url', '')
-            )
-            db.add(raw_deal)
-            db.flush()
+            raw_rows.append({
+                'raw_title': deal['offer'],
+                'raw_description': deal['offer'],
+                'raw_discount': deal.get('discount', ''),
+                'raw_validity': deal.get('validity', ''),
+                'raw_merchant': deal['merchant'],
+                'scraped_url': deal.get('url', ''),
+                'content_hash': generate_hash(deal['offer'], deal['merchant'])
+            })
+        
+        result = insert_raw_deals(db, source_id, raw_rows, status='processed')
+        inserted = result['inserted']
+        print(f"  {result['new_deals']} new, {result['duplicates']} duplicates")
+        
+        for deal, raw_row in zip(deals, raw_rows):
+            raw_deal_id = inserted.pop(raw_row['content_hash'], None)
+            if raw_deal_id is None:
+                continue
             
             valid_until = parse_date(deal.get('validity'))
             discount_type = 'percentage' if '%' in str(deal.get('discount', '')) else 'other'
             
-            score, quality, reason = score_deal(
-                deal['merchant'],
-                deal.get('discount', ''),
-                deal.get('category', 'other')
-            )
-            
             structured_deal = StructuredDeal(
-                raw_deal_id=raw_deal.id,
+                raw_deal_id=raw_deal_id,
                 merchant_name=deal['merchant'],
                 offer_title=deal['offer'][:200],
                 description=deal['offer'],
@@ -207,21 +205,20 @@ def save_to_db(deals, source_id):
             )
             db.add(structured_deal)
             db.flush()
+            structured_ids.append(structured_deal.id)
             
             rating = Rating(
                 deal_id=structured_deal.id,
-                quality_score=quality,
-                reason=reason,
-                llm_score=score,
-                llm_reasoning=reason
+                **rating_fields(structured_deal.merchant_name, structured_deal.discount_value, structured_deal.category)
             )
             db.add(rating)
             
-            if quality == 'good':
+            if rating.quality_score == 'good':
                 good_count += 1
             else:
                 mediocre_count += 1
         
+        assign_groups(db, structured_ids)
         db.commit()
         
         print(f"  ✓ Saved: {good_count} good, {mediocre_count} mediocre")
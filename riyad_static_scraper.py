@@ -5,12 +5,15 @@ import sys
 sys.path.insert(0, '/home/anshad/deal-curation-platform')
 
 from datetime import datetime, date
-import requests
 import re
 from bs4 import BeautifulSoup
 import hashlib
-from app.database import SessionLocal, RawDeal, StructuredDeal, Rating, Source
-from app.config import score_deal
+from app.scrapers.http_client import http_client
+from app.database import SessionLocal, StructuredDeal, Rating, Source
+from app.services.scoring import rating_fields
+from app.services.ingest import insert_raw_deals
+from app.services.offer_groups import assign_groups
+from app.services.keyword_matcher import infer_category
 
 def generate_hash(title, merchant):
     normalized = f"{(title or '').lower().strip()}|{(merchant or '').lower().strip()}"
@@ -51,16 +54,10 @@ def parse_date(date_str):
 def scrape_riyad_static():
     print("Fetching Riyad Bank offers from static HTML...")
     
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    })
-    
     url = "https://www.riyadbank.com/personal-banking/credit-cards/offers"
     
     try:
-        r = session.get(url, timeout=30)
+        r = http_client.fetch(url)
         print(f"  Status: {r.status_code}, Length: {len(r.text)}")
     except Exception as e:
         print(f"  Error fetching page: {e}")
@@ -115,19 +112,7 @@ def scrape_riyad_static():
                 if offer_url and not offer_url.startswith('http'):
                     offer_url = f"https://www.riyadbank.com{offer_url}"
         
-        # Determine category based on merchant name
-        category = "other"
-        lower_merchant = merchant.lower()
-        if any(x in lower_merchant for x in ['restaurant', 'cafe', 'coffee', 'food', 'kitchen', 'grill', 'burger', 'pizza', 'sushi', 'baretto', 'chow', 'ruya', 'crust', 'soul', 'assam', 'roastery', 'labate', 'key caf']):
-            category = "dining"
-        elif any(x in lower_merchant for x in ['spa', 'beauty', 'salon', 'clinic', 'medical', 'dental', 'savin']):
-            category = "lifestyle"
-        elif any(x in lower_merchant for x in ['hotel', 'resort', 'travel', 'flight', 'airline', 'anantara', 'vacation']):
-            category = "travel"
-        elif any(x in lower_merchant for x in ['shop', 'store', 'fashion', 'mall', 'glam', 'moda', 'boutique']):
-            category = "shopping"
-        elif any(x in lower_merchant for x in ['gym', 'fitness', 'sport', 'round', 'health', 'garden', 'preschool']):
-            category = "lifestyle"
+        category = infer_category(merchant)
         
         # Build offer description
         description = f"{discount} off at {merchant}" if '%' in discount else f"Special offer at {merchant}"
@@ -163,38 +148,33 @@ def save_to_db(deals, source_id):
         good_count = 0
         mediocre_count = 0
         
+        raw_rows = []
         for deal in deals:
-            content_hash = generate_hash(deal['offer'], deal['merchant'])
-            
-            existing = db.query(RawDeal).filter(RawDeal.content_hash == content_hash).first()
-            if existing:
+            raw_rows.append({
+                'raw_title': deal['offer'],
+                'raw_description': deal['offer'],
+                'raw_discount': deal.get('discount', ''),
+                'raw_validity': deal.get('validity', ''),
+                'raw_merchant': deal['merchant'],
+                'scraped_url': deal.get('url', ''),
+                'content_hash': generate_hash(deal['offer'], deal['merchant'])
+            })
+        
+        result = insert_raw_deals(db, source_id, raw_rows, status='processed')
+        inserted = result['inserted']
+        print(f"  {result['new_deals']} new, {result['duplicates']} duplicates")
+        
+        structured_deals = []
+        for deal, raw_row in zip(deals, raw_rows):
+            raw_deal_id = inserted.pop(raw_row['content_hash'], None)
+            if raw_deal_id is None:
                 continue
             
-            raw_deal = RawDeal(
-                source_id=source_id,
-                raw_title=deal['offer'],
-                raw_description=deal['offer'],
-                raw_discount=deal.get('discount', ''),
-                raw_validity=deal.get('validity', ''),
-                raw_merchant=deal['merchant'],
-                content_hash=content_hash,
-                status='processed',
-                scraped_url=deal.get('url', '')
-            )
-            db.add(raw_deal)
-            db.flush()
-            
             valid_until = parse_date(deal.get('validity'))
             discount_type = 'percentage' if '%' in str(deal.get('discount', '')) else 'other'
             
-            score, quality, reason = score_deal(
-                deal['merchant'],
-                deal.get('discount', ''),
-                deal.get('category', 'other')
-            )
-            
             structured_deal = StructuredDeal(
-                raw_deal_id=raw_deal.id,
+                raw_deal_id=raw_deal_id,
                 merchant_name=deal['merchant'],
                 offer_title=deal['offer'][:200],
                 description=deal['offer'],
@@ -207,22 +187,21 @@ def save_to_db(deals, source_id):
                 is_active=True
             )
             db.add(structured_deal)
-            db.flush()
+            structured_deals.append(structured_deal)
             
             rating = Rating(
-                deal_id=structured_deal.id,
-                quality_score=quality,
-                reason=reason,
-                llm_score=score,
-                llm_reasoning=reason
+                deal=structured_deal,
+                **rating_fields(structured_deal.merchant_name, structured_deal.discount_value, structured_deal.category)
             )
             db.add(rating)
             
-            if quality == 'good':
+            if rating.quality_score == 'good':
                 good_count += 1
             else:
                 mediocre_count += 1
         
+        db.flush()
+        assign_groups(db, [d.id for d in structured_deals])
         db.commit()
         print(f"  ✓ Saved: {good_count} good, {mediocre_count} mediocre")
         
@@ -6,11 +6,15 @@ sys.path.insert(0, '/home/anshad/deal-curation-platform')
 
 import hashlib
 from datetime import datetime, date
-from playwright.sync_api import sync_playwright
-import time
 import re
-from app.database import SessionLocal, RawDeal, StructuredDeal, Rating, Source
-from app.config import score_deal
+from app.database import SessionLocal, StructuredDeal, Rating, Source
+from app.services.scoring import rating_fields
+from app.services.ingest import insert_raw_deals
+from app.services.offer_groups import assign_groups
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers import waits
+from app.scrapers.sab import SABBankScraper
+from app.scrapers.api_capture import scrape_via_api, load_endpoint, store_endpoint
 
 def generate_hash(title, merchant):
     normalized = f"{(title or '').lower().strip()}|{(merchant or '').lower().strip()}"
@@ -48,136 +52,174 @@ def parse_date(date_str):
         pass
     return None
 
-def scrape_sab_all_pages():
-    """Scrape SAB Bank with pagination - ALL pages"""
-    print("\nScraping SAB Bank - ALL CATEGORIES & PAGES...")
-    all_deals = []
-    
-    base_url = "https://www.sab.com/en/personal/compare-credit-cards/credit-card-special-offers/all-offers/"
+SAB_OFFERS_URL = "https://www.sab.com/en/personal/compare-credit-cards/credit-card-special-offers/all-offers/"
+
+SAB_CATEGORIES = [
+    ('All', 'other'),
+    ('Dining & Groceries', 'dining'),
+    ('Travel', 'travel'),
+    ('Lifestyle', 'lifestyle'),
+    ('Shopping', 'shopping')
+]
+
+def scrape_sab_category(context, cat_name, cat_key):
+    deals = []
+    page = context.new_page()
+    print(f"\n  Category: {cat_name}")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    try:
+        waits.goto(page, SAB_OFFERS_URL, "SAB Bank")
+        
+        # Click category if not "All"
+        if cat_name != 'All':
+            try:
+                cat_btn = page.query_selector(f'text="{cat_name}"')
+                if cat_btn:
+                    waits.after(page, "SAB Bank", "category", cat_btn.click)
+            except:
+                pass
         
-        # Categories
-        categories = [
-            ('All', 'other'),
-            ('Dining & Groceries', 'dining'),
-            ('Travel', 'travel'),
-            ('Lifestyle', 'lifestyle'),
-            ('Shopping', 'shopping')
-        ]
+        # Paginate through all pages
+        page_num = 1
+        max_pages = 35  # Safety limit
         
-        for cat_name, cat_key in categories:
-            print(f"\n  Category: {cat_name}")
+        while page_num <= max_pages:
+            # Get deals on current page
+            body = page.inner_text('body')
+            lines = [l.strip() for l in body.split('\n') if l.strip()]
             
-            try:
-                page.goto(base_url, timeout=60000)
-                time.sleep(3)
-                
-                # Click category if not "All"
-                if cat_name != 'All':
-                    try:
-                        cat_btn = page.query_selector(f'text="{cat_name}"')
-                        if cat_btn:
-                            cat_btn.click()
-                            time.sleep(3)
-                    except:
-                        pass
-                
-                # Paginate through all pages
-                page_num = 1
-                max_pages = 35  # Safety limit
+            page_deals = 0
+            i = 0
+            
+            while i < len(lines):
+                line = lines[i]
                 
-                while page_num <= max_pages:
-                    # Wait for content
-                    time.sleep(2)
-                    page.wait_for_load_state('networkidle')
-                    
-                    # Get deals on current page
-                    body = page.inner_text('body')
-                    lines = [l.strip() for l in body.split('\n') if l.strip()]
+                # Look for merchant pattern
+                if '- KSA' in line or (line and line == line.upper() and 5 < len(line) < 60):
+                    merchant = line.replace('- KSA', '').strip()
                     
-                    page_deals = 0
-                    i = 0
+                    offer = ""
+                    discount = ""
+                    validity = ""
+                    applicable = "SAB Credit Cards"
                     
-                    while i < len(lines):
-                        line = lines[i]
-                        
-                        # Look for merchant pattern
-                        if '- KSA' in line or (line and line == line.upper() and 5 < len(line) < 60):
-                            merchant = line.replace('- KSA', '').strip()
-                            
-                            offer = ""
-                            discount = ""
-                            validity = ""
-                            applicable = "SAB Credit Cards"
-                            
-                            # Find offer text
-                            for j in range(i+1, min(len(lines), i+8)):
-                                check = lines[j]
-                                if 'off' in check.lower() or '%' in check:
-                                    offer = check
-                                    match = re.search(r'(\d+%)', check)
-                                    if match:
-                                        discount = match.group(1)
-                                    break
-                            
-                            # Find applicable cards
-                            for j in range(i+1, min(len(lines), i+12)):
-                                if 'mada' in lines[j].lower():
-                                    applicable = "SAB Credit Cards & Mada Cards"
-                                    break
-                            
-                            # Find validity
-                            for j in range(i+1, min(len(lines), i+12)):
-                                check = lines[j]
-                                if any(m in check.lower() for m in ['january', 'february', 'march', 'april', 
-                                                                    'may', 'june', 'july', 'august', 
-                                                                    'september', 'october', 'november', 'december']):
-                                    validity = check
-                                    break
-                            
-                            if merchant and offer:
-                                all_deals.append({
-                                    'merchant': merchant,
-                                    'offer': offer,
-                                    'discount': discount,
-                                    'validity': validity,
-                                    'category': cat_key,
-                                    'source': 'SAB Bank',
-                                    'applicable_cards': applicable,
-                                    'url': base_url
-                                })
-                                page_deals += 1
-                        
-                        i += 1
+                    # Find offer text
+                    for j in range(i+1, min(len(lines), i+8)):
+                        check = lines[j]
+                        if 'off' in check.lower() or '%' in check:
+                            offer = check
+                            match = re.search(r'(\d+%)', check)
+                            if match:
+                                discount = match.group(1)
+                            break
                     
-                    print(f"    Page {page_num}: {page_deals} deals (Total: {len(all_deals)})")
+                    # Find applicable cards
+                    for j in range(i+1, min(len(lines), i+12)):
+                        if 'mada' in lines[j].lower():
+                            applicable = "SAB Credit Cards & Mada Cards"
+                            break
                     
-                    # Try to go to next page
-                    try:
-                        next_btn = page.query_selector('text="Next"')
-                        if next_btn:
-                            # Check if it's disabled
-                            is_disabled = next_btn.evaluate('el => el.disabled || el.classList.contains("disabled")')
-                            if is_disabled:
-                                break
-                            next_btn.click()
-                            page_num += 1
-                        else:
+                    # Find validity
+                    for j in range(i+1, min(len(lines), i+12)):
+                        check = lines[j]
+                        if any(m in check.lower() for m in ['january', 'february', 'march', 'april', 
+                                                            'may', 'june', 'july', 'august', 
+                                                            'september', 'october', 'november', 'december']):
+                            validity = check
                             break
-                    except:
-                        break
                     
-                    if page_num > max_pages:
-                        print("    Reached max page limit")
+                    if merchant and offer:
+                        deals.append({
+                            'merchant': merchant,
+                            'offer': offer,
+                            'discount': discount,
+                            'validity': validity,
+                            'category': cat_key,
+                            'source': 'SAB Bank',
+                            'applicable_cards': applicable,
+                            'url': SAB_OFFERS_URL
+                        })
+                        page_deals += 1
+                
+                i += 1
+            
+            print(f"    {cat_name} page {page_num}: {page_deals} deals (Total: {len(deals)})")
+            
+            # Try to go to next page
+            try:
+                next_btn = page.query_selector('text="Next"')
+                if next_btn:
+                    # Check if it's disabled
+                    is_disabled = next_btn.evaluate('el => el.disabled || el.classList.contains("disabled")')
+                    if is_disabled:
                         break
-                        
-            except Exception as e:
-                print(f"    Error: {str(e)[:50]}")
-        
-        browser.close()
+                    waits.after(page, "SAB Bank", "next page", next_btn.click)
+                    page_num += 1
+                else:
+                    break
+            except:
+                break
+            
+            if page_num > max_pages:
+                print(f"    {cat_name}: reached max page limit")
+                break
+                
+    except Exception as e:
+        print(f"    {cat_name} error: {str(e)[:50]}")
+    
+    return deals
+
+def scrape_sab_api():
+    """SAB offers from its JSON API, or None if it can't be used"""
+    db = SessionLocal()
+    try:
+        sab_source = db.query(Source).filter(Source.name == "SAB Bank").first()
+        scraper = SABBankScraper(sab_source.id if sab_source else None)
+        scraper.api_endpoint = load_endpoint(sab_source) if sab_source else None
+        raw_deals = scrape_via_api(scraper)
+        # Also keeps the "no API" marker, so the next run skips the capture
+        if sab_source and scraper.api_endpoint_learned:
+            store_endpoint(sab_source, scraper.api_endpoint)
+            db.commit()
+    finally:
+        db.close()
+    
+    if not raw_deals:
+        return None
+    
+    categories = {cat_name.lower(): cat_key for cat_name, cat_key in SAB_CATEGORIES}
+    deals = []
+    for raw in raw_deals:
+        merchant = raw['raw_merchant'].replace('- KSA', '').strip()
+        offer = raw['raw_title'] if raw['raw_title'] != raw['raw_merchant'] else (raw.get('raw_discount') or raw.get('raw_description') or raw['raw_title'])
+        match = re.search(r'(\d+%)', raw.get('raw_discount') or offer)
+        details = f"{raw.get('raw_description', '')} {raw.get('raw_terms', '')}".lower()
+        deals.append({
+            'merchant': merchant,
+            'offer': offer,
+            'discount': match.group(1) if match else '',
+            'validity': raw.get('raw_validity', ''),
+            'category': categories.get(raw.get('category', '').lower(), 'other'),
+            'source': 'SAB Bank',
+            'applicable_cards': "SAB Credit Cards & Mada Cards" if 'mada' in details else "SAB Credit Cards",
+            'url': raw.get('scraped_url', SAB_OFFERS_URL)
+        })
+    return deals
+
+def scrape_sab_all_pages():
+    """Scrape SAB Bank with pagination - ALL pages"""
+    print("\nScraping SAB Bank - ALL CATEGORIES & PAGES...")
+    all_deals = scrape_sab_api()
+    
+    if all_deals:
+        print(f"  {len(all_deals)} offers from the JSON API")
+    else:
+        # Each category crawls in its own browser context, up to BROWSER_POOL_SIZE at once
+        all_deals = []
+        futures = [browser_pool.submit(scrape_sab_category, cat_name, cat_key, source="SAB Bank") for cat_name, cat_key in SAB_CATEGORIES]
+        for future in futures:
+            all_deals.extend(future.result())
+        print(f"\n  Waits: {waits.summary('SAB Bank')}")
     
     # Deduplicate
     seen = set()
@@ -201,35 +243,33 @@ def save_to_db(deals):
         good_count = 0
         mediocre_count = 0
         
+        raw_rows = []
         for deal in deals:
-            import hashlib
-            content_hash = hashlib.md5(f"{deal['offer']}|{deal['merchant']}".encode()).hexdigest()
-            
-            raw_deal = RawDeal(
-                source_id=sab_source.id,
-                raw_title=deal['offer'],
-                raw_description=deal['offer'],
-                raw_discount=deal.get('discount', ''),
-                raw_validity=deal.get('validity', ''),
-                raw_merchant=deal['merchant'],
-                content_hash=content_hash,
-                status='processed',
-                scraped_url=deal.get('url', '')
-            )
-            db.add(raw_deal)
-            db.flush()
+            raw_rows.append({
+                'raw_title': deal['offer'],
+                'raw_description': deal['offer'],
+                'raw_discount': deal.get('discount', ''),
+                'raw_validity': deal.get('validity', ''),
+                'raw_merchant': deal['merchant'],
+                'scraped_url': deal.get('url', ''),
+                'content_hash': hashlib.md5(f"{deal['offer']}|{deal['merchant']}".encode()).hexdigest()
+            })
+        
+        result = insert_raw_deals(db, sab_source.id, raw_rows, status='processed')
+        inserted = result['inserted']
+        print(f"  {result['new_deals']} new, {result['duplicates']} duplicates")
+        
+        structured_deals = []
+        for deal, raw_row in zip(deals, raw_rows):
+            raw_deal_id = inserted.pop(raw_row['content_hash'], None)
+            if raw_deal_id is None:
+                continue
             
             valid_until = parse_date(deal.get('validity'))
             discount_type = 'percentage' if '%' in str(deal.get('discount', '')) else 'other'
             
-            score, quality, reason = score_deal(
-                deal['merchant'],
-                deal.get('discount', ''),
-                deal.get('category', 'other')
-            )
-            
             structured_deal = StructuredDeal(
-                raw_deal_id=raw_deal.id,
+                raw_deal_id=raw_deal_id,
                 merchant_name=deal['merchant'],
                 offer_title=deal['offer'][:200],
                 description=deal['offer'],
@@ -242,22 +282,21 @@ def save_to_db(deals):
                 is_active=True
             )
             db.add(structured_deal)
-            db.flush()
+            structured_deals.append(structured_deal)
             
             rating = Rating(
-                deal_id=structured_deal.id,
-                quality_score=quality,
-                reason=reason,
-                llm_score=score,
-                llm_reasoning=reason
+                deal=structured_deal,
+                **rating_fields(structured_deal.merchant_name, structured_deal.discount_value, structured_deal.category)
             )
             db.add(rating)
             
-            if quality == 'good':
+            if rating.quality_score == 'good':
                 good_count += 1
             else:
                 mediocre_count += 1
         
+        db.flush()
+        assign_groups(db, [d.id for d in structured_deals])
         db.commit()
         
         print(f"✓ Saved: {good_count} good, {mediocre_count} mediocre")
@@ -4,11 +4,14 @@ Test scrapers and save raw output to files for manual LLM processing
 import json
 import os
 from datetime import datetime
-from playwright.sync_api import sync_playwright
-import time
+from app.scrapers.browser_pool import browser_pool
+from app.scrapers import waits
 
 OUTPUT_DIR = "/home/anshad/deal-curation-platform/scraped_output"
 
+# Screenshots are saved for manual review, so let images and fonts load
+SCREENSHOT_RESOURCES = ("image", "font")
+
 def save_output(filename, data):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     filepath = os.path.join(OUTPUT_DIR, filename)
@@ -22,14 +25,11 @@ def scrape_alrajhi():
     url = "https://www.alrajhibank.com.sa/en/Personal/Offers/CardsOffers"
     deals = []
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    def visit(context):
+        page = context.new_page()
         
         print(f"Navigating to {url}")
-        page.goto(url, timeout=60000)
-        time.sleep(5)
-        page.wait_for_load_state('networkidle')
+        waits.goto(page, url, "Alrajhi Bank")
         
         # Take screenshot
         screenshot_path = os.path.join(OUTPUT_DIR, "alrajhi_screenshot.png")
@@ -62,7 +62,9 @@ def scrape_alrajhi():
         cards = page.query_selector_all('[class*="offer"], [class*="card"], [class*="deal"]')
         print(f"Found {len(cards)} potential offer elements")
         
-        browser.close()
+        return body_text
+    
+    body_text = browser_pool.run(visit, source="Alrajhi Bank", allow=SCREENSHOT_RESOURCES)
     
     data = {
         'source': 'Alrajhi Bank',
@@ -80,14 +82,11 @@ def scrape_riyad():
     url = "https://www.riyadbank.com/personal-banking/credit-cards/offers"
     deals = []
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    def visit(context):
+        page = context.new_page()
         
         print(f"Navigating to {url}")
-        page.goto(url, timeout=60000)
-        time.sleep(5)
-        page.wait_for_load_state('networkidle')
+        waits.goto(page, url, "Riyad Bank")
         
         # Take screenshot
         screenshot_path = os.path.join(OUTPUT_DIR, "riyad_screenshot.png")
@@ -104,8 +103,7 @@ def scrape_riyad():
         
         for tab in tabs[:5]:  # Click first 5 tabs
             try:
-                tab.click()
-                time.sleep(2)
+                waits.after(page, "Riyad Bank", "tab", tab.click)
             except:
                 pass
         
@@ -127,7 +125,9 @@ def scrape_riyad():
             except:
                 pass
         
-        browser.close()
+        return body_text
+    
+    body_text = browser_pool.run(visit, source="Riyad Bank", allow=SCREENSHOT_RESOURCES)
     
     data = {
         'source': 'Riyad Bank',
@@ -145,14 +145,11 @@ def scrape_sab():
     url = "https://www.sab.com/en/personal/compare-credit-cards/credit-card-special-offers/all-offers/"
     deals = []
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    def visit(context):
+        page = context.new_page()
         
         print(f"Navigating to {url}")
-        page.goto(url, timeout=60000)
-        time.sleep(5)
-        page.wait_for_load_state('networkidle')
+        waits.goto(page, url, "SAB Bank")
         
         # Take screenshot
         screenshot_path = os.path.join(OUTPUT_DIR, "sab_screenshot.png")
@@ -191,7 +188,9 @@ def scrape_sab():
                     'alt': alt
                 })
         
-        browser.close()
+        return body_text, image_urls
+    
+    body_text, image_urls = browser_pool.run(visit, source="SAB Bank", allow=SCREENSHOT_RESOURCES)
     
     data = {
         'source': 'SAB Bank',